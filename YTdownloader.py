@@ -1,33 +1,60 @@
-import yt_dlp
+import startup  # first, so the startup clock includes loading tkinter
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
+import queue
+import threading
+from progress import ProgressBus
 
-# Force yt-dlp to use ffmpeg.exe from script folder
-ffmpeg_path = os.path.join(os.getcwd(), "ffmpeg.exe")
-ydl_base_opts = {
-    'ffmpeg_location': ffmpeg_path
-}
+# yt-dlp (via engine) loads in the background once the window is up; see startup.py
+startup.mark("imports")
+
+# Coalesces per-chunk progress; the Tk loop drains it at a fixed rate
+progress_bus = ProgressBus()
+UI_POLL_MS = int(progress_bus.interval * 1000)
 
 # Global vars for progress
 progress_var = None
 status_label = None
 
-# Progress hook for yt-dlp
-def progress_hook(d):
-    if d['status'] == 'downloading':
-        total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-        downloaded = d.get('downloaded_bytes', 0)
-        percent = int(downloaded / total * 100) if total else 0
-        speed = d.get('speed', 0)
-        eta = d.get('eta', 0)
-
-        progress_var.set(percent)
-        status_label.config(text=f"Downloading... {percent}% | {speed/1024:.1f} KB/s | ETA: {eta}s")
-        root.update_idletasks()
-    elif d['status'] == 'finished':
-        progress_var.set(100)
-        status_label.config(text="Processing...")
+# Finished jobs and status messages from other threads; only the Tk thread touches widgets
+ui_queue = queue.Queue()
+
+def download_done(job):
+    progress_bus.forget(job.id)
+    ui_queue.put(job)
+
+def show_progress(state):
+    if state.status in ('downloading', 'finished'):
+        progress_var.set(int(state.percent))
+        status_label.config(text=state.text())
+
+def show_done(job):
+    if isinstance(job, str):
+        status_label.config(text=job)
+        return
+    from engine import FINISHED, CANCELLED
+    if job.status == FINISHED:
+        status_label.config(text="Download completed!")
+        messagebox.showinfo("Success", "Download completed!")
+    elif job.status == CANCELLED:
+        status_label.config(text="Download cancelled.")
+    else:
+        status_label.config(text="Error occurred!")
+        messagebox.showerror("Error", f"Download failed:\n{job.error}")
+
+def poll_queue():
+    for state in progress_bus.drain():
+        show_progress(state)
+    finished = []
+    while True:
+        try:
+            finished.append(ui_queue.get_nowait())
+        except queue.Empty:
+            break
+    root.after(UI_POLL_MS, poll_queue)
+    for job in finished:
+        show_done(job)
 
 def download():
     url = url_entry.get().strip()
@@ -42,49 +69,36 @@ def download():
     if not save_path:
         save_path = os.getcwd()
 
-    # Build yt-dlp options
-    if download_type == "Video":
-        format_code = {
-            "360p": "bv*[vcodec^=avc1][height<=360]+ba/best[height<=360]/bestvideo[height<=360]+bestaudio/best",
-            "720p": "bv*[vcodec^=avc1][height<=720]+ba/best[height<=720]/bestvideo[height<=720]+bestaudio/best",
-            "1080p": "bv*[vcodec^=avc1][height<=1080]+ba/best[height<=1080]/bestvideo[height<=1080]+bestaudio/best",
-            "Best": "bv*[vcodec^=avc1]+ba/bestvideo+bestaudio/best"
-        }.get(quality, "bestvideo+bestaudio/best")
-
-        ydl_opts = {
-            'outtmpl': f'{save_path}/%(title)s.%(ext)s',
-            'format': format_code,
-            'merge_output_format': 'mp4',
-            'progress_hooks': [progress_hook],
-            'ignoreerrors': True,
-            'retries': 5,
-            'nocheckcertificate': True
-        }
-    else:  # Audio
-        ydl_opts = {
-            'outtmpl': f'{save_path}/%(title)s.%(ext)s',
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-            'progress_hooks': [progress_hook],
-            'ignoreerrors': True,
-            'retries': 5,
-            'nocheckcertificate': True
-        }
-
-    ydl_opts.update(ydl_base_opts)
+    # Retries come from the engine's shared policy; errors must reach it, not be ignored
+    extra_opts = {
+        'nocheckcertificate': True
+    }
 
+    progress_var.set(0)
+    status_label.config(text="Starting download...")
+    # Importing engine waits for the warm-up if it is still running; keep that off the Tk thread
+    threading.Thread(target=submit, args=(url, save_path, download_type, quality, extra_opts),
+                     name="ytdl-submit", daemon=True).start()
+
+def submit(url, save_path, download_type, quality, extra_opts):
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-        messagebox.showinfo("Success", "Download completed!")
-        status_label.config(text="Download completed!")
-    except Exception as e:
-        messagebox.showerror("Error", f"Download failed:\n{e}")
-        status_label.config(text="Error occurred!")
+        from engine import get_engine
+    except ImportError as e:
+        ui_queue.put(f"Error: {e}")
+        return
+    get_engine().submit(url, save_path, download_type, quality,
+                        on_progress=progress_bus.hook, on_done=download_done, extra_opts=extra_opts)
+
+def first_frame():
+    startup.mark("first frame")
+    startup.warm_up(callback=resume_unfinished)
+
+# Runs on the warm-up thread once yt-dlp is loaded
+def resume_unfinished():
+    from engine import get_engine
+    # Pick up downloads interrupted by a crash or by closing the window
+    if get_engine().resume_unfinished(on_progress=progress_bus.hook, on_done=download_done):
+        ui_queue.put("Resuming unfinished downloads...")
 
 def browse_folder():
     folder_selected = filedialog.askdirectory()
@@ -127,4 +141,6 @@ progress_bar.pack(pady=5)
 status_label = tk.Label(root, text="Idle", fg="blue")
 status_label.pack(pady=5)
 
+root.after(0, first_frame)
+root.after(UI_POLL_MS, poll_queue)
 root.mainloop()
@@ -1,13 +1,15 @@
-import yt_dlp
+import startup  # first, so the startup clock includes loading tkinter
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
+import queue
+import threading
 
-# Force yt-dlp to use ffmpeg.exe from script folder
-ffmpeg_path = os.path.join(os.getcwd(), "ffmpeg.exe")
-ydl_base_opts = {
-    'ffmpeg_location': ffmpeg_path
-}
+# yt-dlp (via engine) loads in the background once the window is up; see startup.py
+startup.mark("imports")
+
+POLL_MS = 200
+done_queue = queue.Queue()
 
 def download():
     url = url_entry.get().strip()
@@ -22,39 +24,38 @@ def download():
     if not save_path:
         save_path = os.getcwd()
 
-    # Build yt-dlp options
-    if download_type == "Video":
-        format_code = {
-            "360p": "bv*[vcodec^=avc1][height<=360]+ba/best[height<=360]",
-            "720p": "bv*[vcodec^=avc1][height<=720]+ba/best[height<=720]",
-            "1080p": "bv*[vcodec^=avc1][height<=1080]+ba/best[height<=1080]",
-            "Best": "bv*[vcodec^=avc1]+ba/best"
-        }.get(quality, "bv*[vcodec^=avc1]+ba/best")
-
-        ydl_opts = {
-            'outtmpl': f'{save_path}/%(title)s.%(ext)s',
-            'format': format_code,
-            'merge_output_format': 'mp4'
-        }
-    else:  # Audio
-        ydl_opts = {
-            'outtmpl': f'{save_path}/%(title)s.%(ext)s',
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }]
-        }
-
-    ydl_opts.update(ydl_base_opts)  # Add ffmpeg path
+    # Importing engine waits for the warm-up if it is still running; keep that off the Tk thread
+    threading.Thread(target=submit, args=(url, save_path, download_type, quality),
+                     name="ytdl-submit", daemon=True).start()
 
+def submit(url, save_path, download_type, quality):
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-        messagebox.showinfo("Success", "Download completed!")
-    except Exception as e:
-        messagebox.showerror("Error", f"Download failed:\n{e}")
+        from engine import get_engine
+    except ImportError as e:
+        done_queue.put(e)
+        return
+    # Options and format selection come from the shared engine; on_done fires
+    # after audio transcodes finish on the post-processing pool
+    get_engine().submit(url, save_path, download_type, quality, on_done=done_queue.put)
+
+def poll_done():
+    # Finished jobs arrive from engine threads; only the Tk thread shows dialogs
+    finished = []
+    while True:
+        try:
+            finished.append(done_queue.get_nowait())
+        except queue.Empty:
+            break
+    root.after(POLL_MS, poll_done)
+    for job in finished:
+        if isinstance(job, Exception):
+            messagebox.showerror("Error", f"Download failed:\n{job}")
+            continue
+        from engine import FINISHED, CANCELLED
+        if job.status == FINISHED:
+            messagebox.showinfo("Success", "Download completed!")
+        elif job.status != CANCELLED:
+            messagebox.showerror("Error", f"Download failed:\n{job.error}")
 
 def browse_folder():
     folder_selected = filedialog.askdirectory()
@@ -87,4 +88,6 @@ ttk.Combobox(root, textvariable=quality_var, values=["360p", "720p", "1080p", "B
 
 tk.Button(root, text="Download", command=download, bg="green", fg="white", font=("Arial", 12)).pack(pady=20)
 
+root.after(0, lambda: (startup.mark("first frame"), startup.warm_up()))
+root.after(POLL_MS, poll_done)
 root.mainloop()
@@ -0,0 +1,302 @@
+import sys
+import json
+import asyncio
+import argparse
+from urllib.parse import urlsplit, parse_qs
+from engine import get_engine, get_metrics, FINISHED, ERROR, CANCELLED
+from progress import ProgressBus
+from resilience import stats as retry_stats
+
+# Local HTTP/JSON job API.
+# Other programs queue downloads here instead of typing into the GUI:
+#
+#   POST   /jobs            {"url": ..., "type": "Video", "quality": "720p", "output": "/path"}
+#   GET    /jobs            all jobs
+#   GET    /jobs/<id>       one job
+#   DELETE /jobs/<id>       cancel
+#   GET    /events          server-sent events with progress of every job
+#   GET    /jobs/<id>/events  the same for one job
+#   GET    /retries         retry counters by error class
+#   GET    /metrics         stage timings and counters, Prometheus text format
+#   GET    /metrics.json    the same as JSON
+#
+# Everything runs on one asyncio loop: subscribers are coroutines, not
+# threads, and progress is drained from the shared ProgressBus at a fixed
+# rate and fanned out, so hundreds of clients cost one drain per tick.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+HEARTBEAT = 15  # seconds between SSE keep-alive comments
+MAX_BODY = 64 * 1024
+
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Subscriber:
+    # Keeps only the newest event per job, so a slow client skips
+    # intermediate progress instead of growing a queue
+    def __init__(self, job_id=None):
+        self.job_id = job_id
+        self.pending = {}
+        self.wakeup = asyncio.Event()
+
+    def publish(self, event):
+        if self.job_id is not None and event['id'] != self.job_id:
+            return
+        self.pending[event['id']] = event
+        self.wakeup.set()
+
+    def take(self):
+        events, self.pending = list(self.pending.values()), {}
+        self.wakeup.clear()
+        return events
+
+
+class JobServer:
+    def __init__(self, engine=None, host=DEFAULT_HOST, port=DEFAULT_PORT, bus=None):
+        self.engine = engine or get_engine()
+        self.host = host
+        self.port = port
+        self.bus = bus or ProgressBus()
+        self.subscribers = set()
+        self.loop = None
+        self._server = None
+        self._pump = None
+
+    def job_state(self, job):
+        state = {
+            'id': job.id,
+            'url': job.url,
+            'type': job.download_type,
+            'quality': job.quality,
+            'output': job.save_path,
+            'status': job.status,
+            'error': str(job.error) if job.error else None,
+            'filepath': job.filepath,
+            'skipped': job.skipped,
+        }
+        progress = self.bus.jobs.get(job.id)
+        if progress is not None and not job.done:
+            state.update(percent=round(progress.percent, 1), downloaded=progress.downloaded,
+                         total=progress.total, speed=progress.speed, eta=progress.eta)
+        elif job.status == FINISHED:
+            state['percent'] = 100.0
+        return state
+
+    # Engine callbacks run on worker threads and hand over to the loop
+
+    def _on_done(self, job):
+        self.loop.call_soon_threadsafe(self._job_done, job)
+
+    def _job_done(self, job):
+        self._publish(self.job_state(job))
+        self.bus.forget(job.id)
+
+    def _publish(self, event):
+        for subscriber in self.subscribers:
+            subscriber.publish(event)
+
+    async def _pump_progress(self):
+        while True:
+            await asyncio.sleep(self.bus.interval)
+            if not self.subscribers:
+                self.bus.drain()
+                continue
+            for progress in self.bus.drain():
+                job = self.engine.jobs.get(progress.job_id)
+                if job is not None and not job.done:
+                    self._publish(self.job_state(job))
+
+    # HTTP
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # The loop only keeps a weak reference to its tasks
+        self._pump = self.loop.create_task(self._pump_progress())
+        return self._server
+
+    async def close(self):
+        if self._pump is not None:
+            self._pump.cancel()
+            try:
+                await self._pump
+            except asyncio.CancelledError:
+                pass
+            self._pump = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self):
+        server = await self.start()
+        print(f"Job API on http://{self.host}:{self.port}", flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            await self.close()
+
+    async def _handle(self, reader, writer):
+        try:
+            method, path, query, body = await self._read_request(reader)
+            parts = [p for p in path.split("/") if p]
+            if parts == ["events"] or (len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events"):
+                job_id = self._job(parts[1]).id if len(parts) == 3 else None
+                await self._stream_events(writer, job_id)
+                return
+            if parts == ["metrics"] and method == "GET":
+                text = get_metrics().prometheus(retry_stats.snapshot())
+                self._respond(writer, 200, text, "text/plain; version=0.0.4")
+                return
+            status, payload = self._route(method, parts, query, body)
+            self._respond(writer, status, payload)
+        except HttpError as e:
+            self._respond(writer, e.status, {'error': str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader):
+        line = (await reader.readline()).decode("latin-1").split()
+        if len(line) != 3:
+            raise HttpError(400, "malformed request line")
+        method, target, _ = line
+        headers = {}
+        while True:
+            header = (await reader.readline()).decode("latin-1").strip()
+            if not header:
+                break
+            name, _, value = header.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = headers.get('content-length') or "0"
+        if not (length.isascii() and length.isdigit()):
+            raise HttpError(400, "invalid Content-Length")
+        length = int(length)
+        if length > MAX_BODY:
+            raise HttpError(413, "request body too large")
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        return method.upper(), url.path, parse_qs(url.query), body
+
+    def _respond(self, writer, status, payload, content_type="application/json"):
+        if isinstance(payload, str):
+            data = payload.encode("utf-8")
+        else:
+            data = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(data)}",
+                "Connection: close", "", ""]
+        writer.write("\r\n".join(head).encode("latin-1") + data)
+
+    def _job(self, job_id):
+        job = self.engine.get_job(int(job_id)) if job_id.isdigit() else None
+        if job is None:
+            raise HttpError(404, f"no job {job_id}")
+        return job
+
+    def _route(self, method, parts, query, body):
+        if parts == ["jobs"]:
+            if method == "GET":
+                jobs = self.engine.list_jobs()
+                status = query.get('status')
+                if status:
+                    jobs = [j for j in jobs if j.status in status]
+                return 200, [self.job_state(j) for j in jobs]
+            if method == "POST":
+                return 201, self.job_state(self._submit(body))
+            raise HttpError(405, "use GET or POST")
+        if len(parts) == 2 and parts[0] == "jobs":
+            job = self._job(parts[1])
+            if method == "GET":
+                return 200, self.job_state(job)
+            if method == "DELETE":
+                self.engine.cancel(job.id)
+                return 200, self.job_state(job)
+            raise HttpError(405, "use GET or DELETE")
+        if parts == ["retries"] and method == "GET":
+            return 200, retry_stats.snapshot()
+        if parts == ["metrics.json"] and method == "GET":
+            return 200, dict(get_metrics().snapshot(), retries=retry_stats.snapshot())
+        raise HttpError(404, "not found")
+
+    def _submit(self, body):
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise HttpError(400, "body must be JSON")
+        if not isinstance(request, dict) or not request.get('url'):
+            raise HttpError(400, "'url' is required")
+        # Anything else would only fail later on a worker
+        for key in ('url', 'output', 'quality'):
+            if request.get(key) is not None and not isinstance(request[key], str):
+                raise HttpError(400, f"'{key}' must be a string")
+        download_type = request.get('type', "Video")
+        if download_type not in ("Video", "Audio"):
+            raise HttpError(400, "'type' must be Video or Audio")
+        quality = request.get('quality') or ("Best" if download_type == "Video" else "192kbps")
+        return self.engine.submit(request['url'], request.get('output'), download_type, quality,
+                                  on_progress=self.bus.hook, on_done=self._on_done)
+
+    async def _stream_events(self, writer, job_id):
+        head = ["HTTP/1.1 200 OK", "Content-Type: text/event-stream",
+                "Cache-Control: no-cache", "Connection: keep-alive", "", ""]
+        writer.write("\r\n".join(head).encode("latin-1"))
+        subscriber = Subscriber(job_id)
+        # Current state first, then changes
+        jobs = [self.engine.get_job(job_id)] if job_id is not None else self.engine.list_jobs()
+        for job in jobs:
+            subscriber.publish(self.job_state(job))
+        self.subscribers.add(subscriber)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(subscriber.wakeup.wait(), HEARTBEAT)
+                except asyncio.TimeoutError:
+                    writer.write(b": keep-alive\n\n")
+                    await writer.drain()
+                    continue
+                ended = False
+                for event in subscriber.take():
+                    writer.write(f"event: job\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+                    ended = ended or event['status'] in (FINISHED, ERROR, CANCELLED)
+                await writer.drain()
+                # A single-job stream ends with the job
+                if job_id is not None and ended:
+                    return
+        finally:
+            self.subscribers.discard(subscriber)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP job API for the downloader")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-j", "--jobs", type=int, help="parallel downloads")
+    parser.add_argument("--metrics-file", help="append a JSON line with the timings of every finished job")
+    args = parser.parse_args(argv)
+    get_metrics().jsonl_path = args.metrics_file
+    engine = get_engine(args.jobs) if args.jobs else get_engine()
+    try:
+        asyncio.run(JobServer(engine, args.host, args.port).serve_forever())
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import os
+import time
+import shutil
+import sqlite3
+import threading
+from yt_dlp.postprocessor import PostProcessor
+from info_cache import video_id
+from postprocess import parse_audio_target
+
+# Download archive / dedup index.
+# Completed downloads are recorded by video ID and format (type + quality)
+# with their path and size; a multi-target audio request ("mp3:192+m4a") is
+# recorded per output file. Before a job extracts anything the engine looks it
+# up here; a hit is either skipped or hard-linked into the requested folder,
+# so re-running a playlist sync costs no network traffic.
+
+DEFAULT_ARCHIVE_PATH = os.path.join(os.path.expanduser("~"), ".yt_downloader", "archive.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    video_id TEXT NOT NULL,
+    format_key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT,  -- unused, kept so older archives open unchanged
+    completed_at REAL NOT NULL,
+    PRIMARY KEY (video_id, format_key)
+)
+"""
+
+
+def format_key(download_type, quality):
+    if download_type == "Video":
+        return f"Video:{quality}"
+    bitrate = quality.replace("kbps", "")
+    return f"Audio:{bitrate if bitrate.isdigit() else '192'}"
+
+
+def target_key(target):
+    codec, bitrate = parse_audio_target(target)
+    return f"Audio:{codec}:{bitrate or ''}"
+
+
+def format_keys(download_type, quality):
+    # One key per file the request produces, in output order
+    if download_type == "Audio" and ("+" in quality or ":" in quality):
+        return [target_key(target) for target in quality.split("+")]
+    return [format_key(download_type, quality)]
+
+
+class Archive:
+    def __init__(self, path=DEFAULT_ARCHIVE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def find(self, url, download_type, quality):
+        # Paths of an earlier download that still exist on disk, one per
+        # output file, or None when any of them is missing
+        paths = []
+        for key in format_keys(download_type, quality):
+            path = self._find(video_id(url), key)
+            if path is None:
+                return None
+            paths.append(path)
+        return paths
+
+    def _find(self, vid, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, size FROM downloads WHERE video_id = ? AND format_key = ?", (vid, key)).fetchone()
+        if row is None:
+            return None
+        path, size = row
+        try:
+            if os.path.getsize(path) == size:
+                return path
+        except OSError:
+            pass
+        # File was moved or deleted: forget it so the job downloads again
+        self.forget(vid, key)
+        return None
+
+    def record(self, url, download_type, quality, *paths):
+        # paths: the output files in the order of format_keys
+        for key, path in zip(format_keys(download_type, quality), paths):
+            size = os.path.getsize(path)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO downloads (video_id, format_key, path, size, completed_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (video_id(url), key, os.path.abspath(path), size, time.time()))
+                self._conn.commit()
+
+    def forget(self, vid, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM downloads WHERE video_id = ? AND format_key = ?", (vid, key))
+            self._conn.commit()
+
+    @staticmethod
+    def place(path, save_path, link=True):
+        # Make an archived file appear in save_path without downloading it again
+        target = os.path.join(save_path, os.path.basename(path))
+        if os.path.abspath(target) == os.path.abspath(path) or os.path.exists(target):
+            return target
+        if not link:
+            return path
+        os.makedirs(save_path, exist_ok=True)
+        try:
+            os.link(path, target)
+        except OSError:
+            # Different filesystem (or no hard links on this one): local copy
+            shutil.copy2(path, target)
+        return target
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ArchiveRecorder(PostProcessor):
+    # Runs after yt-dlp moved the final file into place
+    def __init__(self, archive, job):
+        super().__init__()
+        self.archive = archive
+        self.job = job
+
+    def run(self, info):
+        path = info.get('filepath')
+        if path and os.path.exists(path):
+            # Playlist jobs produce several entries: key each by its own page URL
+            url = info.get('webpage_url') or self.job.url
+            self.archive.record(url, self.job.download_type, self.job.quality, path)
+            self.job.filepath = path
+        return [], info
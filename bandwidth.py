@@ -0,0 +1,121 @@
+import time
+import datetime
+import threading
+
+# Global bandwidth scheduler.
+# One token bucket is shared by every running transfer. Jobs pay for the
+# bytes they report through their progress hook, which yt-dlp, the segmented
+# downloader and the streaming merge all call from the reading thread after
+# each chunk, so a thread that is over budget simply pauses before its next
+# read. When tokens run short, waiting interactive jobs are served before
+# batch ones, which get whatever capacity is left.
+
+# Priority classes, lower is served first
+INTERACTIVE = 0
+BATCH = 1
+
+MAX_WAIT = 0.25  # seconds a throttled thread sleeps before rechecking (cancel, schedule)
+
+UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_rate(text):
+    # "500K", "2M", "1.5M/s" -> bytes per second; "", "0", "none" and "off" -> unlimited
+    text = (text or "").strip().upper().replace("/S", "").replace("B", "")
+    if text in ("", "NONE", "OFF"):
+        return None
+    unit = text[-1] if text[-1] in UNITS else ''
+    rate = int(float(text[:len(text) - len(unit)]) * UNITS[unit])
+    return rate or None
+
+
+def parse_schedule(text):
+    # "01:00-07:00=off,09:00-18:00=1M" -> [(start, end, rate)]; times as minutes of the day
+    schedule = []
+    for item in (text or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        span, eq, rate = item.partition("=")
+        start, dash, end = span.partition("-")
+        if not (eq and dash):
+            raise ValueError(f"schedule entry {item!r} is not START-END=RATE")
+        schedule.append((_minutes(start), _minutes(end), parse_rate(rate)))
+    return schedule
+
+
+def _minutes(text):
+    hours, _, minutes = text.strip().partition(":")
+    return int(hours) * 60 + int(minutes or 0)
+
+
+class BandwidthLimiter:
+    def __init__(self, rate=None, burst=None, schedule=None):
+        # rate in bytes per second, None for unlimited; schedule entries override it
+        self.rate = rate
+        self.burst = burst
+        self.schedule = schedule or []
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._waiting = {}
+        self._cond = threading.Condition()
+
+    def current_rate(self, now=None):
+        now = now or datetime.datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end, rate in self.schedule:
+            # Spans may wrap past midnight, e.g. 22:00-06:00
+            if start <= minute < end or (end < start and (minute >= start or minute < end)):
+                return rate
+        return self.rate
+
+    def acquire(self, nbytes, priority=INTERACTIVE, cancelled=None):
+        # Blocks until nbytes may be spent. The bucket may go into debt so large
+        # chunks never wait forever; the next caller pays it back.
+        with self._cond:
+            self._waiting[priority] = self._waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    rate = self.current_rate()
+                    if not rate:
+                        return
+                    now = time.monotonic()
+                    burst = self.burst or rate
+                    self._tokens = min(burst, self._tokens + (now - self._updated) * rate)
+                    self._updated = now
+                    ahead = any(n for p, n in self._waiting.items() if p < priority)
+                    if self._tokens > 0 and not ahead:
+                        self._tokens -= nbytes
+                        return
+                    if cancelled is not None and cancelled():
+                        return
+                    wait = -self._tokens / rate if self._tokens <= 0 else MAX_WAIT
+                    self._cond.wait(min(max(wait, 0.01), MAX_WAIT))
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def meter(self, priority=INTERACTIVE, cancelled=None):
+        return Meter(self, priority, cancelled)
+
+
+class Meter:
+    # Turns progress-hook dicts of one job into byte deltas for the limiter.
+    # Streams are told apart by filename; the first report of a stream is only
+    # a baseline, so bytes resumed from a .part file are not charged again.
+    def __init__(self, limiter, priority=INTERACTIVE, cancelled=None):
+        self.limiter = limiter
+        self.priority = priority
+        self.cancelled = cancelled
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, d):
+        if d.get('status') != 'downloading':
+            return
+        downloaded = d.get('downloaded_bytes') or 0
+        with self._lock:
+            previous = self._seen.get(d.get('filename'))
+            self._seen[d.get('filename')] = max(downloaded, previous or 0)
+        if previous is not None and downloaded > previous:
+            self.limiter.acquire(downloaded - previous, self.priority, self.cancelled)
@@ -0,0 +1,257 @@
+import os
+import itertools
+import threading
+import yt_dlp
+from engine import get_engine, FINISHED
+from bandwidth import INTERACTIVE, BATCH
+
+# Playlist / batch mode.
+# Playlists are listed once with flat extraction (no per-video page requests),
+# then every entry becomes its own engine job so entries download in parallel
+# up to the shared pool's worker limit, or fewer when the batch sets its own
+# limit. In low-memory mode the listing is paged in lazily and only a few
+# entries per worker are queued at a time.
+
+WINDOW_PER_WORKER = 2  # low-memory mode: queued or running entries per worker
+
+
+def read_url_file(path):
+    # One URL per line, blank lines and "#" comments are skipped
+    urls = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                urls.append(line)
+    return urls
+
+
+def entry_url(entry):
+    # Page URL of a flat entry or of a fully extracted video
+    if entry.get('_type', 'video') == 'video' and entry.get('webpage_url'):
+        return entry['webpage_url']
+    url = entry.get('url') or entry.get('webpage_url')
+    if url and url.startswith("http"):
+        return url
+    if entry.get('ie_key') == 'Youtube' or entry.get('id'):
+        return f"https://www.youtube.com/watch?v={entry.get('id')}"
+    return url
+
+
+# URL shapes that point at more than one video
+PLAYLIST_MARKERS = ("list=", "/playlist", "/channel/", "/c/", "/user/", "/@")
+
+
+def looks_like_playlist(url):
+    return any(marker in url for marker in PLAYLIST_MARKERS)
+
+
+# Listings inside listings followed at most: a redirect, a channel's tabs
+# ("Videos", "Shorts", "Live"), and the playlists of a "Playlists" tab
+MAX_DEPTH = 3
+PLAYLIST_TYPES = ('playlist', 'multi_video')
+
+
+def is_listing(entry):
+    # A flat entry that is a playlist itself rather than a video
+    if entry.get('_type') in PLAYLIST_TYPES:
+        return True
+    url = entry.get('url') or ""
+    return entry.get('ie_key') == 'YoutubeTab' or (looks_like_playlist(url) and "v=" not in url)
+
+
+def _walk(ydl, info, depth):
+    if not info:
+        return
+    if info.get('_type') in ('url', 'url_transparent'):
+        if depth < MAX_DEPTH:
+            yield from _walk(ydl, ydl.extract_info(info['url'], download=False, process=False,
+                                                   ie_key=info.get('ie_key')), depth + 1)
+        return
+    if info.get('_type') not in PLAYLIST_TYPES:
+        yield info
+        return
+    for entry in info.get('entries') or []:
+        if entry and depth < MAX_DEPTH and is_listing(entry):
+            yield from _walk(ydl, entry, depth + 1)
+        elif entry and (yield entry):
+            return  # the caller is done with this listing
+
+
+def iter_entries(url, extra_opts=None):
+    # Flat entries (videos only) in listing order; further pages and nested
+    # listings are only requested while the caller keeps iterating.
+    # send(True) instead of next() skips the rest of the innermost listing,
+    # e.g. the older uploads of one channel tab, and goes on with the next
+    if not looks_like_playlist(url):
+        # Plain video links skip the listing request entirely
+        yield {'_type': 'url', 'url': url}
+        return
+    opts = {
+        'extract_flat': 'in_playlist',
+        'skip_download': True,
+        'quiet': True
+    }
+    if extra_opts:
+        opts.update(extra_opts)
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        yield from _walk(ydl, ydl.extract_info(url, download=False, process=False), 0)
+
+
+def expand_sources(sources):
+    # Sources may be video URLs, playlist URLs or paths to text files of URLs
+    for source in sources:
+        if os.path.isfile(source):
+            for url in read_url_file(source):
+                yield url
+        else:
+            yield source
+
+
+class Batch:
+    def __init__(self, sources, save_path, download_type="Video", quality="Best",
+                 parallel=None, engine=None, on_progress=None, on_entry_done=None,
+                 on_done=None, extra_opts=None, priority=None, sync=None, low_memory=None):
+        self.sources = list(sources)
+        self.save_path = save_path
+        self.download_type = download_type
+        self.quality = quality
+        self.on_progress = on_progress
+        self.on_entry_done = on_entry_done
+        self.on_done = on_done
+        self.extra_opts = extra_opts
+        # None: a single video is interactive, anything longer is background work
+        self.priority = priority
+        # sync.SyncStore: playlists and channels only yield entries not downloaded yet
+        self.sync = sync
+        self._synced = {}  # entry URL -> synced source it came from
+        self.engine = engine or get_engine()
+        # None: whatever the engine runs in
+        self.low_memory = self.engine.low_memory if low_memory is None else low_memory
+        # Entries of this batch in the engine (queued or running) at once;
+        # parallel caps the batch below the shared pool's worker count
+        window = None
+        if self.low_memory:
+            window = self.engine.workers * WINDOW_PER_WORKER
+        if parallel:
+            window = min(window or parallel, parallel)
+        self._window = threading.Semaphore(window) if window else None
+        self._cancelled = False
+        self.jobs = []
+        self.completed = 0
+        self.failed = 0
+        self.listed = False
+        self.error = None
+        self._fractions = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def total(self):
+        return len(self.jobs)
+
+    @property
+    def percent(self):
+        # Finished entries count fully, running ones by their current fraction
+        with self._lock:
+            if not self.jobs:
+                return 0.0
+            return sum(self._fractions.values()) / len(self.jobs) * 100
+
+    def start(self):
+        threading.Thread(target=self._run, name="ytdl-batch", daemon=True).start()
+        return self
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        self._cancelled = True
+        for job in list(self.jobs):
+            job.cancel()
+
+    def _urls(self):
+        for source in expand_sources(self.sources):
+            if self.sync is not None and looks_like_playlist(source):
+                self.sync.register(source, self.save_path, self.download_type, self.quality)
+                try:
+                    entries = self.sync.refresh(source, self.extra_opts)
+                except Exception as e:
+                    # One unreachable channel must not hold up the others
+                    self.error = e
+                    continue
+                self._synced.update(dict.fromkeys(entries, source))
+            else:
+                entries = (entry_url(e) for e in iter_entries(source, self.extra_opts))
+            yield from entries
+
+    def _run(self):
+        urls = self._urls()
+        first = []
+        try:
+            # Everything up front, or in low-memory mode just enough to see if the job is alone
+            for url in itertools.islice(urls, 2) if self.low_memory else urls:
+                first.append(url)
+        except Exception as e:
+            self.error = e
+            urls = iter(())
+
+        priority = self.priority
+        if priority is None:
+            priority = INTERACTIVE if len(first) == 1 else BATCH
+        try:
+            for url in itertools.chain(first, urls):
+                if self._window is not None:
+                    # Blocks while the window is full; finished entries make room
+                    self._window.acquire()
+                if self._cancelled:
+                    break
+                with self._lock:
+                    job = self.engine.submit(url, self.save_path, self.download_type, self.quality,
+                                             on_progress=self._progress, on_done=self._entry_done,
+                                             extra_opts=self.extra_opts, priority=priority)
+                    self.jobs.append(job)
+                    self._fractions[job.id] = 0.0
+        except Exception as e:
+            self.error = e
+        with self._lock:
+            self.listed = True
+            finished = self.completed + self.failed == len(self.jobs)
+        if finished:
+            self._finish()
+
+    def _progress(self, job, d):
+        total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+        if d['status'] == 'downloading' and total:
+            with self._lock:
+                # Video and audio streams of one entry are summed
+                streams = self._streams.setdefault(job.id, {})
+                streams[d.get('filename')] = ((d.get('downloaded_bytes') or 0), total)
+                done = sum(s[0] for s in streams.values())
+                self._fractions[job.id] = min(1.0, done / sum(s[1] for s in streams.values()))
+        if self.on_progress:
+            self.on_progress(job, d)
+
+    def _entry_done(self, job):
+        with self._lock:
+            self._fractions[job.id] = 1.0
+            self._streams.pop(job.id, None)
+            if job.status == FINISHED:
+                self.completed += 1
+            else:
+                self.failed += 1
+            finished = self.listed and self.completed + self.failed == len(self.jobs)
+        if self._window is not None:
+            self._window.release()
+        if job.status == FINISHED and job.url in self._synced:
+            self.sync.mark_done(self._synced[job.url], job.url)
+        if self.on_entry_done:
+            self.on_entry_done(job)
+        if finished:
+            self._finish()
+
+    def _finish(self):
+        self._done.set()
+        if self.on_done:
+            self.on_done(self)
@@ -0,0 +1,362 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Offline benchmark for the download pipeline.
+# A local HTTP server serves synthetic media with configurable latency,
+# per-connection bandwidth and Range support. Every scenario runs the real
+# DownloadEngine in a fresh child process (so CPU time and peak memory belong
+# to that scenario alone) against info dicts seeded into a private info cache,
+# which stands in for the extractor. Results are appended to a JSON lines
+# file and compared with the previous run that used the same settings.
+#
+#   python bench.py                          all scenarios, default settings
+#   python bench.py -s merge --connections 4 --latency 50 --bandwidth 5M
+#
+# Scenarios: single (one muxed file), batch (several muxed files at once),
+# merge (video + audio streams merged by ffmpeg), transcode (audio to mp3).
+# merge and transcode need ffmpeg on PATH and are skipped without it.
+
+SCENARIOS = ('single', 'batch', 'merge', 'transcode')
+DEFAULT_RESULTS = os.path.join(os.path.expanduser("~"), ".yt_downloader", "bench", "results.jsonl")
+DEFAULT_MEDIA_DIR = os.path.join(os.path.expanduser("~"), ".yt_downloader", "bench", "media")
+CHUNK = 64 * 1024
+
+
+# ---------- Synthetic media server ----------
+
+class MediaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as googlevideo does
+    media_dir = None
+    latency = 0.0  # seconds before every response
+    bandwidth = None  # bytes per second per connection
+    ranges = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        name = os.path.basename(self.path.split("?")[0])
+        path = os.path.join(self.media_dir, name)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        header = self.headers.get('Range')
+        if self.latency:
+            time.sleep(self.latency)
+        if header and self.ranges and header.startswith("bytes="):
+            first, _, last = header[6:].partition("-")
+            start = int(first or 0)
+            end = min(int(last), size - 1) if last else size - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+            if self.ranges:
+                self.send_header('Accept-Ranges', "bytes")
+        self.send_header('Content-Type', "application/octet-stream")
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        self._send(path, start, end - start + 1)
+
+    def _send(self, path, offset, length):
+        started = time.monotonic()
+        sent = 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while sent < length:
+                data = f.read(min(CHUNK, length - sent))
+                if not data:
+                    break
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                sent += len(data)
+                if self.bandwidth:
+                    # Pace the connection to the configured rate
+                    ahead = sent / self.bandwidth - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+
+def start_server(media_dir, latency=0.0, bandwidth=None, ranges=True):
+    handler = type("Handler", (MediaHandler,), {
+        'media_dir': media_dir, 'latency': latency, 'bandwidth': bandwidth, 'ranges': ranges})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    return server
+
+
+# ---------- Media files ----------
+
+def _random_file(path, size):
+    rng = random.Random(size)
+    with open(path, "wb") as f:
+        left = size
+        while left > 0:
+            n = min(left, 1024 * 1024)
+            f.write(rng.randbytes(n))
+            left -= n
+
+
+def prepare_media(media_dir, size_mb, duration, ffmpeg):
+    # Muxed file: random bytes are enough, nothing decodes it. The streams for
+    # merge and transcode must be real media, so ffmpeg generates them.
+    os.makedirs(media_dir, exist_ok=True)
+    muxed = os.path.join(media_dir, f"muxed-{size_mb}.mp4")
+    if not os.path.exists(muxed):
+        _random_file(muxed, size_mb * 1024 * 1024)
+    if ffmpeg is None:
+        return
+    video = os.path.join(media_dir, f"video-{duration}.mp4")
+    if not os.path.exists(video):
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "lavfi",
+                        "-i", f"testsrc=size=1280x720:rate=30:duration={duration}",
+                        "-c:v", "mpeg4", "-q:v", "4", "-an", video], check=True)
+    audio = os.path.join(media_dir, f"audio-{duration}.m4a")
+    if not os.path.exists(audio):
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "lavfi",
+                        "-i", f"sine=frequency=440:duration={duration}",
+                        "-c:a", "aac", "-b:a", "128k", "-vn", audio], check=True)
+
+
+def _format(base_url, media_dir, name, format_id, ext, **fields):
+    size = os.path.getsize(os.path.join(media_dir, name))
+    fmt = {'format_id': format_id, 'url': f"{base_url}/{name}", 'ext': ext, 'protocol': 'http',
+           'filesize': size, 'http_headers': {}}
+    fmt.update(fields)
+    return fmt
+
+
+def scenario_jobs(scenario, base_url, media_dir, size_mb, duration, batch_size):
+    # (page url, info dict, download type, quality) per job
+    def info(title, formats, length=duration):
+        page = f"{base_url}/watch/{title}"
+        return page, {
+            '_type': 'video', 'id': title, 'title': title, 'duration': length,
+            'webpage_url': page, 'webpage_url_basename': title, 'webpage_url_domain': "127.0.0.1",
+            'extractor': 'generic', 'extractor_key': 'Generic', 'formats': formats,
+        }
+
+    muxed = [_format(base_url, media_dir, f"muxed-{size_mb}.mp4", "18", "mp4",
+                     vcodec="avc1.4d401f", acodec="mp4a.40.2", width=1280, height=720, fps=30,
+                     tbr=size_mb * 8 * 1024 / duration)]
+    if scenario == 'single':
+        return [info("bench-single", muxed) + ("Video", "Best")]
+    if scenario == 'batch':
+        return [info(f"bench-batch-{i}", muxed) + ("Video", "Best") for i in range(batch_size)]
+    if scenario == 'merge':
+        formats = [
+            _format(base_url, media_dir, f"video-{duration}.mp4", "137", "mp4", vcodec="mp4v.20.9",
+                    acodec="none", width=1280, height=720, fps=30),
+            _format(base_url, media_dir, f"audio-{duration}.m4a", "140", "m4a", vcodec="none",
+                    acodec="mp4a.40.2", abr=128),
+        ]
+        return [info("bench-merge", formats) + ("Video", "Best")]
+    formats = [_format(base_url, media_dir, f"audio-{duration}.m4a", "140", "m4a", vcodec="none",
+                       acodec="mp4a.40.2", abr=128)]
+    return [info("bench-transcode", formats) + ("Audio", "192kbps")]
+
+
+# ---------- Child: one scenario in a fresh process ----------
+
+def run_child(args):
+    import resource
+    from engine import DownloadEngine
+    from info_cache import InfoCache
+    from postprocess import TranscodePool
+    from metrics import Metrics
+    from sessions import SessionPool
+
+    workdir = tempfile.mkdtemp(prefix="ytdl-bench-")
+    try:
+        cache = InfoCache(os.path.join(workdir, "cache"))
+        jobs = scenario_jobs(args.child, args.base_url, args.media_dir, args.size, args.duration,
+                             args.batch_size)
+        for page, info, _, _ in jobs:
+            cache.put(page, info)
+        metrics = Metrics()
+        engine = DownloadEngine(max(args.workers, 1), info_cache=cache, connections=args.connections,
+                                streaming_merge=args.streaming_merge, transcode_pool=TranscodePool(),
+                                metrics=metrics, session_pool=SessionPool(max(args.workers, 1)))
+        extra_opts = {'quiet': True, 'no_warnings': True}
+        if args.ffmpeg:
+            extra_opts['ffmpeg_location'] = args.ffmpeg
+        out = os.path.join(workdir, "out")
+
+        before = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+        started = time.monotonic()
+        submitted = [engine.submit(page, out, download_type, quality, extra_opts=extra_opts)
+                     for page, _, download_type, quality in jobs]
+        for job in submitted:
+            job.wait()
+        wall = time.monotonic() - started
+        after = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+        engine.shutdown(wait=False)
+
+        snap = metrics.snapshot()
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        peak = after[0].ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        result = {
+            'wall': round(wall, 3),
+            'bytes': snap['bytes'],
+            'throughput': round(snap['bytes'] / wall) if wall else None,
+            'cpu_user': round(sum(a.ru_utime - b.ru_utime for a, b in zip(after, before)), 3),
+            'cpu_sys': round(sum(a.ru_stime - b.ru_stime for a, b in zip(after, before)), 3),
+            'peak_rss': peak,
+            'jobs': len(submitted),
+            'failed': [str(job.error) for job in submitted if job.status != "finished"],
+            'stages': {k: v['sum'] for k, v in snap['stages'].items() if v['count']},
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(result))
+
+
+# ---------- Parent: server, children, storage ----------
+
+def options_of(args):
+    # Settings that must match for two runs to be comparable
+    return {
+        'connections': args.connections, 'streaming_merge': args.streaming_merge, 'workers': args.workers,
+        'latency_ms': args.latency, 'bandwidth': args.bandwidth, 'ranges': not args.no_ranges,
+        'size_mb': args.size, 'duration': args.duration, 'batch_size': args.batch_size,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def previous_results(path, options):
+    # Newest earlier result per scenario with identical options
+    latest = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('options') == options:
+                    latest[record['scenario']] = record
+    except OSError:
+        pass
+    return latest
+
+
+def change(new, old):
+    if not old or new is None:
+        return ""
+    return f" ({(new - old) / old * 100:+.1f}%)"
+
+
+def report(scenario, result, before):
+    if 'skipped' in result:
+        print(f"{scenario:10} skipped: {result['skipped']}")
+        return
+    before = before or {}
+    mib = (result['throughput'] or 0) / 1024 / 1024
+    old_mib = (before.get('throughput') or 0) / 1024 / 1024
+    cpu = result['cpu_user'] + result['cpu_sys']
+    old_cpu = before.get('cpu_user', 0) + before.get('cpu_sys', 0) if before else None
+    print(f"{scenario:10} {result['wall']:7.2f}s{change(result['wall'], before.get('wall'))}"
+          f"  {mib:7.1f} MiB/s{change(mib, old_mib)}"
+          f"  cpu {cpu:6.2f}s{change(cpu, old_cpu)}"
+          f"  peak {result['peak_rss'] / 1024 / 1024:6.1f} MiB{change(result['peak_rss'], before.get('peak_rss'))}")
+    for error in result['failed']:
+        print(f"{'':10} failed: {error}")
+
+
+def parse_args(argv=None):
+    from bandwidth import parse_rate
+    parser = argparse.ArgumentParser(description="Offline download pipeline benchmark")
+    parser.add_argument("-s", "--scenario", action="append", choices=SCENARIOS,
+                        help="scenario to run (repeatable); default all")
+    parser.add_argument("--connections", type=int, help="segmented download connections")
+    parser.add_argument("--streaming-merge", action="store_true")
+    parser.add_argument("-j", "--workers", type=int, default=3, help="engine workers")
+    parser.add_argument("--latency", type=int, default=0, help="server latency per request in ms")
+    parser.add_argument("--bandwidth", type=parse_rate, help="server bandwidth per connection, e.g. 5M")
+    parser.add_argument("--no-ranges", action="store_true", help="server ignores Range headers")
+    parser.add_argument("--size", type=int, default=64, help="muxed file size in MiB")
+    parser.add_argument("--duration", type=int, default=60, help="length of generated media in seconds")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--media-dir", default=DEFAULT_MEDIA_DIR)
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="JSON lines file results are appended to")
+    parser.add_argument("--no-save", action="store_true", help="do not store this run")
+    # Internal: run one scenario and print its result
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--ffmpeg", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        run_child(args)
+        return 0
+
+    ffmpeg = shutil.which("ffmpeg")
+    prepare_media(args.media_dir, args.size, args.duration, ffmpeg)
+    server = start_server(args.media_dir, args.latency / 1000, args.bandwidth, not args.no_ranges)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    options = options_of(args)
+    before = previous_results(args.results, options)
+    run = {'run_at': time.time(), 'commit': git_commit(), 'options': options}
+
+    records = []
+    try:
+        for scenario in args.scenario or SCENARIOS:
+            if scenario in ('merge', 'transcode') and ffmpeg is None:
+                report(scenario, {'skipped': "ffmpeg not found"}, None)
+                continue
+            cmd = [sys.executable, os.path.abspath(__file__), "--child", scenario, "--base-url", base_url,
+                   "--media-dir", args.media_dir, "--size", str(args.size), "--duration", str(args.duration),
+                   "--batch-size", str(args.batch_size), "-j", str(args.workers)]
+            if args.connections:
+                cmd += ["--connections", str(args.connections)]
+            if args.streaming_merge:
+                cmd.append("--streaming-merge")
+            if ffmpeg:
+                cmd += ["--ffmpeg", ffmpeg]
+            proc = subprocess.run(cmd, capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)))
+            lines = proc.stdout.strip().splitlines()
+            if proc.returncode != 0 or not lines:
+                report(scenario, {'skipped': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip()
+                                  else f"exit code {proc.returncode}"}, None)
+                continue
+            result = json.loads(lines[-1])
+            report(scenario, result, before.get(scenario))
+            records.append(dict(run, scenario=scenario, **result))
+    finally:
+        server.shutdown()
+
+    if records and not args.no_save:
+        os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+        with open(args.results, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
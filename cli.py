@@ -0,0 +1,218 @@
+import os
+import sys
+import time
+import argparse
+from engine import (get_engine, get_bandwidth_limiter, get_metrics, get_output_manager,
+                    DEFAULT_WORKERS, FINISHED)
+from bandwidth import parse_rate, parse_schedule
+from batch import Batch, expand_sources, looks_like_playlist
+from formats import QUALITY_HEIGHTS
+from prefetch import Prefetcher, DEFAULT_FANOUT
+from progress import ProgressBus
+from memory import peak_note
+from sync import get_sync_store
+
+# Headless command line / daemon entry point.
+# Uses the same engine, quality and type options as the GUIs but never imports
+# tkinter or kivy, so it starts fast and runs on display-less servers.
+#
+#   python cli.py URL [URL ...] -t Audio -q 192kbps -o ~/Music
+#   cat urls.txt | python cli.py -
+#   python cli.py --watch /srv/incoming -o /srv/videos
+#   python cli.py --sync-every 60 channels.txt -o /srv/mirror
+
+WATCH_INTERVAL = 5  # seconds between scans of the watch directory
+WATCH_EXTENSIONS = (".txt", ".urls")
+SYNC_POLL = 60  # seconds between checks for synced sources that are due
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="YouTube downloader (headless)")
+    parser.add_argument("urls", nargs="*",
+                        help="video/playlist URLs or .txt files of URLs; '-' reads URLs from stdin")
+    parser.add_argument("-t", "--type", default="Video", choices=["Video", "Audio"], help="download type")
+    parser.add_argument("-q", "--quality", default="Best",
+                        help=f"video: {', '.join(QUALITY_HEIGHTS)}; audio: e.g. 192kbps or mp3:192+m4a")
+    parser.add_argument("-o", "--output", default=os.getcwd(), help="save folder")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_WORKERS, help="parallel downloads")
+    parser.add_argument("--connections", type=int, help="segmented HTTP download with N connections per stream")
+    parser.add_argument("--stream-merge", action="store_true", help="pipe streams straight into ffmpeg")
+    parser.add_argument("--limit-rate", help="total bandwidth for all downloads, e.g. 500K or 2M")
+    parser.add_argument("--schedule", help="time-of-day limits overriding --limit-rate, e.g. 09:00-18:00=1M,22:00-06:00=off")
+    parser.add_argument("--scratch", help="write temp and fragment files here, move finished files to --output")
+    parser.add_argument("--min-free", default="200M", help="free space always left on every volume, e.g. 1G")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="small buffers, trimmed metadata, playlists paged in as jobs finish")
+    parser.add_argument("--metrics-file", help="append a JSON line with the timings of every finished job")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print titles, durations, resolutions and expected sizes only")
+    parser.add_argument("--fanout", type=int, default=DEFAULT_FANOUT, help="parallel extractions for --dry-run")
+    parser.add_argument("--watch", metavar="DIR", help="daemon mode: download URL files dropped into DIR")
+    parser.add_argument("--sync", action="store_true",
+                        help="mirror playlists/channels: only download entries not downloaded by an earlier sync")
+    parser.add_argument("--sync-every", type=float, metavar="MINUTES",
+                        help="keep running and re-sync every synced source at this interval (implies --sync)")
+    parser.add_argument("--resume", action="store_true", help="finish downloads interrupted in an earlier run")
+    parser.add_argument("--quiet", action="store_true", help="only print finished jobs and errors")
+    return parser.parse_args(argv)
+
+
+def read_stdin():
+    for line in sys.stdin:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def print_progress(bus):
+    for state in bus.drain():
+        if state.status == 'downloading':
+            print(f"[job {state.job_id}] {state.text()}", flush=True)
+
+
+def report_done(job):
+    if job.status == FINISHED:
+        note = " (already downloaded)" if job.skipped else ""
+        if get_engine().low_memory:
+            note += peak_note(job)
+        print(f"[job {job.id}] done{note}: {job.filepath or job.url}", flush=True)
+    else:
+        print(f"[job {job.id}] {job.status}: {job.url}: {job.error}", file=sys.stderr, flush=True)
+
+
+def report(sources, args):
+    # Printed in completion order while the other extractions keep running
+    failed = 0
+    total = 0
+    for preview in Prefetcher(args.fanout).run(sources, args.type, args.quality):
+        if preview.error is not None:
+            print(f"{preview.url}: {preview.describe()}", file=sys.stderr, flush=True)
+            failed += 1
+            continue
+        print(f"{preview.url}: {preview.describe()}", flush=True)
+        if preview.choice is not None and preview.choice.expected_bytes:
+            total += preview.choice.expected_bytes
+    print(f"Total: {total / 1024 / 1024:.1f} MiB", flush=True)
+    return 1 if failed else 0
+
+
+def run_batch(sources, args, bus, sync=None, save_path=None, download_type=None, quality=None):
+    def entry_done(job):
+        bus.forget(job.id)
+        report_done(job)
+
+    batch = Batch(sources, save_path or args.output, download_type or args.type, quality or args.quality,
+                  engine=get_engine(), on_progress=bus.hook, on_entry_done=entry_done, sync=sync).start()
+    while not batch.wait(bus.interval if not args.quiet else 1.0):
+        if not args.quiet:
+            print_progress(bus)
+    if batch.error is not None:
+        print(f"Error: {batch.error}", file=sys.stderr)
+    return batch
+
+
+def watch(directory, args, bus):
+    done_dir = os.path.join(directory, "done")
+    os.makedirs(done_dir, exist_ok=True)
+    print(f"Watching {directory} for URL files...", flush=True)
+    while True:
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not name.endswith(WATCH_EXTENSIONS) or not os.path.isfile(path):
+                continue
+            # Claim the file first so a second daemon on the same folder skips it
+            claimed = os.path.join(done_dir, name)
+            try:
+                os.replace(path, claimed)
+            except OSError:
+                continue
+            print(f"Processing {name}", flush=True)
+            run_batch([claimed], args, bus)
+        time.sleep(WATCH_INTERVAL)
+
+
+def sync_loop(args, bus, store):
+    scheduled = [s for s in store.sources() if s.interval]
+    print(f"Syncing {len(scheduled)} source(s) periodically...", flush=True)
+    while True:
+        # Sources registered with other folders or qualities keep their own settings
+        groups = {}
+        for source in store.due():
+            key = (source.save_path, source.download_type, source.quality)
+            groups.setdefault(key, []).append(source.url)
+        for (save_path, download_type, quality), urls in groups.items():
+            batch = run_batch(urls, args, bus, store, save_path, download_type, quality)
+            if batch.total and not args.quiet:
+                print(f"Synced {len(urls)} source(s): {batch.completed} new, {batch.failed} failed", flush=True)
+        time.sleep(SYNC_POLL)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sources = []
+    for url in args.urls:
+        if url == "-":
+            sources.extend(read_stdin())
+        else:
+            sources.append(url)
+    if not sources and not args.watch and not sys.stdin.isatty():
+        sources.extend(read_stdin())
+    if not sources and not args.watch and not args.resume and not args.sync_every:
+        print("No URLs given.", file=sys.stderr)
+        return 2
+
+    if args.dry_run:
+        return report(sources, args)
+
+    limiter = get_bandwidth_limiter()
+    try:
+        limiter.rate = parse_rate(args.limit_rate)
+        limiter.schedule = parse_schedule(args.schedule)
+        min_free = parse_rate(args.min_free) or 0
+    except ValueError:
+        print("Invalid --limit-rate, --schedule or --min-free", file=sys.stderr)
+        return 2
+    output = get_output_manager()
+    output.scratch_dir = args.scratch
+    output.min_free = min_free
+    get_metrics().jsonl_path = args.metrics_file
+    engine = get_engine(args.jobs, args.connections)
+    engine.streaming_merge = args.stream_merge
+    engine.low_memory = engine.low_memory or args.low_memory
+    bus = ProgressBus(max_rate=1)
+    store = None
+    if args.sync or args.sync_every:
+        store = get_sync_store()
+        if store is None:
+            print("Sync state is not writable", file=sys.stderr)
+            return 2
+        interval = args.sync_every * 60 if args.sync_every else None
+        for source in expand_sources(sources):
+            if looks_like_playlist(source):
+                store.register(source, args.output, args.type, args.quality, interval)
+
+    try:
+        if args.resume:
+            resumed = engine.resume_unfinished(on_progress=bus.hook, on_done=report_done)
+            if resumed:
+                print(f"Resuming {len(resumed)} unfinished download(s)", flush=True)
+            for job in resumed:
+                while not job.wait(bus.interval):
+                    if not args.quiet:
+                        print_progress(bus)
+        if sources:
+            batch = run_batch(sources, args, bus, store)
+            if not args.watch and not args.sync_every:
+                return 0 if batch.failed == 0 and batch.error is None else 1
+        if args.sync_every:
+            sync_loop(args, bus, store)
+        if not args.watch:
+            return 0
+        watch(args.watch, args, bus)
+    except KeyboardInterrupt:
+        # Unfinished jobs stay in the journal and resume next time
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
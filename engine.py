@@ -0,0 +1,626 @@
+import os
+import time
+import queue
+import itertools
+import collections
+import sqlite3
+import threading
+import yt_dlp
+from info_cache import InfoCache
+from journal import Journal, JournalRecorder
+from archive import Archive, ArchiveRecorder
+from segmented import SegmentedYoutubeDL
+from streams import ParallelStreamsMixin
+from pipeline import StreamingMergeMixin
+from postprocess import TranscodePool, FileCollector
+from formats import make_selector, DEFAULT_POLICY, VIDEO_CONTAINER
+from bandwidth import BandwidthLimiter, INTERACTIVE, BATCH
+from resilience import RetryPolicy, EXPIRED, ydl_retry_opts
+from metrics import Metrics, JobTimings
+from sessions import SessionPool
+from output import OutputManager, ReservePP, FinalizePP, finalize
+from memory import LOW_MEMORY, ydl_low_memory_opts, trim_info
+from yt_dlp.postprocessor import FFmpegExtractAudioPP
+from yt_dlp.postprocessor.ffmpeg import FFmpegPostProcessor
+
+# Shared download engine used by all front-ends.
+# Jobs go into one queue and a fixed number of worker threads download them,
+# so many URLs can run at once without starting an unbounded number of transfers.
+
+# Force yt-dlp to use ffmpeg.exe from script folder
+ffmpeg_path = os.path.join(os.getcwd(), "ffmpeg.exe")
+ydl_base_opts = {
+    'ffmpeg_location': ffmpeg_path
+}
+
+DEFAULT_WORKERS = 3
+# Low-memory mode: finished jobs that can still be looked up by id
+FINISHED_KEPT = 100
+
+
+
+# Video and audio streams of merged formats download at the same time,
+# or are piped straight into ffmpeg when streaming_merge is on
+class EngineYoutubeDL(StreamingMergeMixin, ParallelStreamsMixin, yt_dlp.YoutubeDL):
+    pass
+
+
+class SegmentedEngineYoutubeDL(StreamingMergeMixin, ParallelStreamsMixin, SegmentedYoutubeDL):
+    pass
+
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+POSTPROCESSING = "postprocessing"
+FINISHED = "finished"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+
+def audio_targets(quality):
+    # "mp3:192+mp3:320+m4a" asks for several outputs from one download
+    if "+" in quality or ":" in quality:
+        return quality.split("+")
+    return None
+
+
+def audio_bitrate(quality):
+    # "192kbps" -> "192", video qualities fall back to 192
+    targets = audio_targets(quality)
+    if targets:
+        quality = targets[0].partition(":")[2]
+    bitrate = quality.replace("kbps", "")
+    return bitrate if bitrate.isdigit() else "192"
+
+
+def audio_codec(quality):
+    targets = audio_targets(quality)
+    return targets[0].partition(":")[0] if targets else 'mp3'
+
+
+def build_ydl_opts(save_path, download_type, quality, progress_hooks=None, extra_opts=None,
+                   format_policy=None, pinned_format=None):
+    # Formats are ranked by formats.select instead of fixed format strings
+    if download_type == "Video":
+        ydl_opts = {
+            'outtmpl': os.path.join(save_path, '%(title)s.%(ext)s'),
+            'format': make_selector(download_type, quality, format_policy or DEFAULT_POLICY,
+                                    pinned_format, container=VIDEO_CONTAINER),
+            'merge_output_format': VIDEO_CONTAINER
+        }
+    else:  # Audio
+        ydl_opts = {
+            'outtmpl': os.path.join(save_path, '%(title)s.%(ext)s'),
+            'format': make_selector(download_type, quality, format_policy or DEFAULT_POLICY, pinned_format),
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': audio_codec(quality),
+                'preferredquality': audio_bitrate(quality),
+            }]
+        }
+
+    ydl_opts.update(ydl_retry_opts())
+    ydl_opts.update(ydl_base_opts)
+    if progress_hooks:
+        ydl_opts['progress_hooks'] = list(progress_hooks)
+    if extra_opts:
+        ydl_opts.update(extra_opts)
+    return ydl_opts
+
+
+class Job:
+    _ids = itertools.count(1)
+
+    def __init__(self, url, save_path, download_type="Video", quality="Best",
+                 on_progress=None, on_done=None, extra_opts=None, priority=INTERACTIVE):
+        self.id = next(Job._ids)
+        self.url = url
+        self.save_path = save_path or os.getcwd()
+        self.download_type = download_type
+        self.quality = quality
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.extra_opts = extra_opts
+        # bandwidth.INTERACTIVE jobs start and transfer ahead of bandwidth.BATCH ones
+        self.priority = priority
+        self.journal_id = None
+        self.pinned_format = None
+        self.filepath = None
+        self.skipped = False
+        self.timings = None
+        self.reservation = None
+        self.status = QUEUED
+        self.error = None
+        self.cancel_requested = False
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.status} {self.url}>"
+
+
+class DownloadEngine:
+    def __init__(self, workers=DEFAULT_WORKERS, info_cache=None, journal=None,
+                 archive=None, link_existing=True, connections=None, parallel_streams=True,
+                 streaming_merge=False, transcode_pool=None, format_policy=None, limiter=None,
+                 retry_policy=None, metrics=None, session_pool=None, output=None, low_memory=False):
+        self.workers = max(1, int(workers))
+        self.info_cache = info_cache
+        self.journal = journal
+        self.archive = archive
+        # Archive hits in another folder are hard-linked there instead of skipped
+        self.link_existing = link_existing
+        # Opt-in: fetch plain HTTP formats over this many parallel range requests
+        self.connections = connections
+        self.parallel_streams = parallel_streams
+        # Opt-in: merge without temp stream files (no .part resume for those jobs)
+        self.streaming_merge = streaming_merge
+        # Audio transcodes run here instead of on the download worker
+        self.transcode_pool = transcode_pool
+        # formats.FormatPolicy used to rank formats; None is formats.DEFAULT_POLICY
+        self.format_policy = format_policy
+        # bandwidth.BandwidthLimiter shared by all transfers; None is unlimited
+        self.limiter = limiter
+        # resilience.RetryPolicy for whole-job retries; None fails on the first error
+        self.retry_policy = retry_policy
+        # metrics.Metrics collecting per-job stage timings; None records nothing
+        self.metrics = metrics
+        # sessions.SessionPool lending long-lived YoutubeDL instances; None builds one per job
+        self.session_pool = session_pool
+        # output.OutputManager: free-space reservations and the scratch work directory
+        self.output = output
+        # Small read buffers, trimmed info dicts, finished jobs dropped from self.jobs
+        self.low_memory = low_memory
+        self.jobs = {}
+        # Low-memory mode: the latest finished jobs, oldest first
+        self.finished = collections.OrderedDict()
+        # (priority, submit order, job): interactive jobs overtake queued batch work
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+
+    def start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._worker, name=f"ytdl-worker-{len(self._threads) + 1}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, url, save_path, download_type="Video", quality="Best",
+               on_progress=None, on_done=None, extra_opts=None, journal_id=None, pinned_format=None,
+               priority=INTERACTIVE):
+        if self._closed:
+            raise RuntimeError("Engine is shut down")
+        job = Job(url, save_path, download_type, quality, on_progress, on_done, extra_opts, priority)
+        job.pinned_format = pinned_format
+        if self.journal is not None:
+            job.journal_id = journal_id or self.journal.add(job)
+        with self._lock:
+            self.jobs[job.id] = job
+        self.start()
+        self._queue.put((job.priority, next(self._order), job))
+        return job
+
+    def resume_unfinished(self, on_progress=None, on_done=None):
+        # Resubmit journaled jobs that never finished; yt-dlp picks up the .part files
+        if self.journal is None:
+            return []
+        with self._lock:
+            active = {job.journal_id for job in self.jobs.values() if not job.done}
+        jobs = []
+        for entry in self.journal.unfinished():
+            if entry.id in active or not self.journal.claim(entry):
+                continue
+            extra_opts = dict(entry.extra_opts or {})
+            pinned_format = None
+            if entry.format_id:
+                # Same streams as before so the .part files match, old selection as fallback
+                if extra_opts.get('format'):
+                    extra_opts['format'] = f"{entry.format_id}/{extra_opts['format']}"
+                else:
+                    pinned_format = entry.format_id
+            jobs.append(self.submit(entry.url, entry.save_path, entry.download_type, entry.quality,
+                                    on_progress=on_progress, on_done=on_done,
+                                    extra_opts=extra_opts or None, journal_id=entry.id,
+                                    pinned_format=pinned_format, priority=BATCH))
+        return jobs
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id) or self.finished.get(job_id)
+
+    def list_jobs(self):
+        with self._lock:
+            return sorted(itertools.chain(self.jobs.values(), self.finished.values()), key=lambda j: j.id)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def wait(self):
+        self._queue.join()
+        # Transcodes may still be finishing after the downloads
+        for job in list(self.jobs.values()):
+            job.wait()
+
+    def shutdown(self, wait=True):
+        self._closed = True
+        for _ in self._threads:
+            # Sorts after every queued job
+            self._queue.put((float("inf"), next(self._order), None))
+        if wait:
+            for t in self._threads:
+                t.join()
+        if self.session_pool is not None:
+            self.session_pool.close()
+
+    # ---------- Workers ----------
+    def _worker(self):
+        while True:
+            _, _, job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self.run(job)
+            finally:
+                self._queue.task_done()
+
+    def run(self, job):
+        if self.metrics is not None:
+            job.timings = JobTimings()
+            self.metrics.job_started()
+        if job.cancel_requested:
+            self._finish(job, CANCELLED)
+            return job
+
+        # Already downloaded in this format: no extraction, no transfer
+        if self.archive is not None:
+            existing = self.archive.find(job.url, job.download_type, job.quality)
+            if existing:
+                try:
+                    # Every output of a multi-target request is placed
+                    placed = [self.archive.place(path, job.save_path, self.link_existing) for path in existing]
+                    job.filepath = placed[0]
+                    job.skipped = True
+                    self._finish(job, FINISHED)
+                except OSError as e:
+                    self._finish(job, ERROR, e)
+                return job
+
+        meter = None
+        if self.limiter is not None:
+            meter = self.limiter.meter(job.priority, lambda: job.cancel_requested)
+
+        def progress_hook(d):
+            if job.cancel_requested:
+                raise yt_dlp.utils.DownloadCancelled()
+            if meter is not None:
+                # Pauses this transfer thread while the shared budget is spent
+                meter(d)
+            if job.timings is not None:
+                job.timings.progress(d)
+            if job.journal_id is not None:
+                self.journal.progress(job.journal_id, d)
+            if job.on_progress:
+                job.on_progress(job, d)
+
+        job.status = RUNNING
+        # With a scratch directory everything is written there and moved into save_path when done
+        work_dir = self.output.work_dir(job.save_path) if self.output is not None else job.save_path
+        ydl_opts = build_ydl_opts(work_dir, job.download_type, job.quality,
+                                  [progress_hook], job.extra_opts, self.format_policy, job.pinned_format)
+        if self.low_memory:
+            for key, value in ydl_low_memory_opts().items():
+                ydl_opts.setdefault(key, value)
+        if job.timings is not None:
+            ydl_opts['postprocessor_hooks'] = list(ydl_opts.get('postprocessor_hooks') or []) + [
+                job.timings.postprocess]
+        audio_pp = self._take_audio_pp(ydl_opts)
+        files = []
+        ffmpeg = None
+        try:
+            with self._session(ydl_opts) as ydl:
+                if audio_pp is not None:
+                    ffmpeg = FFmpegPostProcessor(ydl)
+                    if ffmpeg.available:
+                        ydl.add_post_processor(FileCollector(files), when='after_move')
+                    else:
+                        # No ffmpeg to hand the work to: let yt-dlp report it as before
+                        ydl.add_post_processor(FFmpegExtractAudioPP(ydl, **audio_pp))
+                        audio_pp = None
+                if job.journal_id is not None:
+                    ydl.add_post_processor(JournalRecorder(self.journal, job), when='before_dl')
+                if self.output is not None:
+                    ydl.add_post_processor(ReservePP(self.output, job), when='before_dl')
+                    if work_dir != job.save_path and audio_pp is None:
+                        ydl.add_post_processor(FinalizePP(job), when='after_move')
+                if self.archive is not None and audio_pp is None:
+                    ydl.add_post_processor(ArchiveRecorder(self.archive, job), when='after_move')
+                self._download_with_retries(ydl, job)
+            if audio_pp is not None and files:
+                self._transcode(job, ffmpeg.executable, files, audio_pp)
+            else:
+                self._finish(job, FINISHED)
+        except yt_dlp.utils.DownloadCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            self._finish(job, ERROR, e)
+        return job
+
+    def _take_audio_pp(self, ydl_opts):
+        # Pull FFmpegExtractAudio out of the options when the transcode pool takes it over
+        if self.transcode_pool is None:
+            return None
+        for pp in ydl_opts.get('postprocessors') or []:
+            if pp.get('key') == 'FFmpegExtractAudio':
+                ydl_opts['postprocessors'] = [p for p in ydl_opts['postprocessors'] if p is not pp]
+                return {k: v for k, v in pp.items() if k in ('preferredcodec', 'preferredquality')}
+        return None
+
+    def _transcode(self, job, ffmpeg, files, audio_pp):
+        job.status = POSTPROCESSING
+        if job.timings is not None:
+            # Includes waiting for a free slot in the pool
+            job.timings.begin('transcode')
+        # Several targets share one download and one decode
+        targets = audio_targets(job.quality) or [
+            (audio_pp.get('preferredcodec', 'mp3'), audio_pp.get('preferredquality', '192'))]
+        futures = [(self.transcode_pool.submit(ffmpeg, path, targets, acodec), page_url)
+                   for path, page_url, acodec in files]
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            if job.timings is not None:
+                job.timings.end('transcode')
+            error = None
+            for future, page_url in futures:
+                try:
+                    dests = future.result()
+                    if self.output is not None:
+                        # Transcoded in the work directory; no-op when that is save_path
+                        dests = [finalize(path, job.save_path) for path in dests]
+                    job.filepath = dests[0]
+                    if self.archive is not None:
+                        self.archive.record(page_url or job.url, job.download_type, job.quality, *dests)
+                except Exception as e:
+                    error = error or e
+            self._finish(job, ERROR if error else FINISHED, error)
+
+        for future, _ in futures:
+            future.add_done_callback(done)
+
+    def _session(self, ydl_opts):
+        if self.session_pool is None:
+            return self._open_ydl(ydl_opts)
+        # Engine settings baked into the instance are part of the profile
+        kind = f"{self.connections}:{self.parallel_streams}:{self.streaming_merge}:"
+        return self.session_pool.session(ydl_opts, self._open_ydl, kind)
+
+    def _open_ydl(self, ydl_opts):
+        if self.connections and self.connections > 1:
+            ydl = SegmentedEngineYoutubeDL(ydl_opts, connections=self.connections)
+        else:
+            ydl = EngineYoutubeDL(ydl_opts)
+        ydl.parallel_streams = self.parallel_streams
+        ydl.streaming_merge = self.streaming_merge
+        return ydl
+
+    def _download_with_retries(self, ydl, job):
+        if self.retry_policy is None:
+            self._download(ydl, job)
+            return
+        attempt = 0
+        kind = None
+        while True:
+            try:
+                self._download(ydl, job)
+                if kind is not None:
+                    self.retry_policy.recovered(kind)
+                return
+            except yt_dlp.utils.DownloadCancelled:
+                raise
+            except Exception as e:
+                if job.cancel_requested:
+                    raise yt_dlp.utils.DownloadCancelled()
+                kind, delay = self.retry_policy.next_delay(e, attempt)
+                if delay is None:
+                    raise
+            if kind == EXPIRED and self.info_cache is not None:
+                # Signed stream URLs ran out: the next attempt extracts again
+                self.info_cache.invalidate(job.url)
+            attempt += 1
+            # Sleep in small steps so a cancel does not wait out the backoff
+            deadline = time.monotonic() + delay
+            while time.monotonic() < deadline:
+                if job.cancel_requested:
+                    raise yt_dlp.utils.DownloadCancelled()
+                time.sleep(min(0.25, deadline - time.monotonic()))
+
+    def _download(self, ydl, job):
+        timings = job.timings
+        # Reuse a cached extraction; format selection still runs per job
+        info = self.info_cache.get(job.url) if self.info_cache is not None else None
+        if info is not None:
+            if timings is not None:
+                timings.begin('extract')
+                timings.end('extract')
+            if self.low_memory:
+                info = trim_info(info, ydl.params.get('format'))
+            try:
+                ydl.process_ie_result(info, download=True)
+                return
+            except yt_dlp.utils.DownloadError:
+                # Stream URLs went bad before their expiry: extract again
+                self.info_cache.invalidate(job.url)
+        # Extraction and download run separately so each can be timed
+        if timings is not None:
+            timings.begin('extract')
+        info = ydl.extract_info(job.url, download=False, process=False)
+        if timings is not None:
+            timings.end('extract')
+        if info is None:  # extraction error swallowed by ignoreerrors
+            return
+        if info.get('_type', 'video') != 'video':
+            # Playlists and redirects resolve entry by entry while downloading,
+            # so the first entry starts without waiting for the others
+            ignoreerrors = ydl.params.get('ignoreerrors')
+            if info.get('_type') in ('playlist', 'multi_video') and 'ignoreerrors' not in (job.extra_opts or {}):
+                # A private or removed entry is reported and skipped, not the end of the playlist
+                ydl.params['ignoreerrors'] = True
+            try:
+                ydl.process_ie_result(info, download=True)
+            finally:
+                ydl.params['ignoreerrors'] = ignoreerrors
+            return
+        if self.info_cache is not None:
+            info = ydl.sanitize_info(info)
+            self.info_cache.put(job.url, info)
+        if self.low_memory:
+            # The cache keeps the full copy for other qualities; this job needs its formats only
+            info = trim_info(info, ydl.params.get('format'))
+        ydl.process_ie_result(info, download=True)
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        if job.reservation is not None:
+            job.reservation.release()
+        if job.journal_id is not None:
+            self.journal.set_status(job.journal_id, status, error)
+        if self.metrics is not None:
+            self.metrics.job_finished(job)
+        if self.low_memory:
+            # Front-ends keep their own reference; a long playlist does not pile up
+            # here, only the last FINISHED_KEPT stay reachable by id
+            with self._lock:
+                self.jobs.pop(job.id, None)
+                self.finished[job.id] = job
+                while len(self.finished) > FINISHED_KEPT:
+                    self.finished.popitem(last=False)
+        job._done.set()
+        if job.on_done:
+            try:
+                job.on_done(job)
+            except Exception:
+                pass
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(workers=DEFAULT_WORKERS, connections=None):
+    # Process-wide engine shared by whichever front-end is running
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = DownloadEngine(workers, info_cache=get_info_cache(), journal=get_journal(),
+                                     archive=get_archive(), connections=connections,
+                                     transcode_pool=get_transcode_pool(),
+                                     limiter=get_bandwidth_limiter(), retry_policy=RetryPolicy(),
+                                     metrics=get_metrics(), session_pool=SessionPool(workers),
+                                     output=get_output_manager(), low_memory=LOW_MEMORY)
+        return _engine
+
+
+_info_cache = None
+
+
+def get_info_cache():
+    global _info_cache
+    if _info_cache is None:
+        try:
+            _info_cache = InfoCache()
+        except OSError:
+            return None  # read-only home: run without a cache
+    return _info_cache
+
+
+_journal = None
+
+
+def get_journal():
+    global _journal
+    if _journal is None:
+        try:
+            _journal = Journal()
+            _journal.prune()
+        except (OSError, sqlite3.Error):
+            return None  # no writable storage: jobs are not journaled
+    return _journal
+
+
+_archive = None
+
+
+def get_archive():
+    global _archive
+    if _archive is None:
+        try:
+            _archive = Archive()
+        except (OSError, sqlite3.Error):
+            return None  # no writable storage: no dedup
+    return _archive
+
+
+_transcode_pool = None
+
+
+def get_transcode_pool():
+    # One ffmpeg transcode per CPU core, shared by every engine in the process
+    global _transcode_pool
+    if _transcode_pool is None:
+        _transcode_pool = TranscodePool()
+    return _transcode_pool
+
+
+_bandwidth_limiter = None
+
+
+def get_bandwidth_limiter():
+    # Unlimited until a front-end sets rate or schedule on it
+    global _bandwidth_limiter
+    if _bandwidth_limiter is None:
+        _bandwidth_limiter = BandwidthLimiter()
+    return _bandwidth_limiter
+
+
+_metrics = None
+
+
+def get_metrics():
+    # Counters for every engine in the process; front-ends may set jsonl_path
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+_output_manager = None
+
+
+def get_output_manager():
+    # Free-space checks for every engine; front-ends may set scratch_dir
+    global _output_manager
+    if _output_manager is None:
+        _output_manager = OutputManager()
+    return _output_manager
@@ -0,0 +1,262 @@
+import yt_dlp
+
+# Format selection engine.
+# Replaces the hard-coded "bv*[vcodec^=avc1][height<=N]+ba/best[height<=N]"
+# strings. Formats are ranked on a configurable policy: the requested quality
+# caps the height, streams whose bits per pixel (adjusted for codec
+# efficiency) are far below the best candidate are dropped, and of the rest
+# the cheapest expected download wins, with a penalty for streams that cannot
+# be remuxed into mp4. When the merge goes into mp4, pairs mp4 cannot hold are
+# only used if nothing else is offered, and then merge into mkv instead.
+# A format without codec information (direct links, many non-YouTube
+# extractors) may hold both streams and counts as muxed; when nothing fits
+# the request at all, the best single format is used like yt-dlp's "best".
+
+QUALITY_HEIGHTS = {
+    "360p": 360,
+    "720p": 720,
+    "1080p": 1080,
+    "Best": None
+}
+
+# Bytes needed for the same picture relative to H.264
+CODEC_EFFICIENCY = {
+    'av01': 0.65,
+    'vp09': 0.75,
+    'vp9': 0.75,
+    'hev1': 0.7,
+    'hvc1': 0.7,
+    'avc1': 1.0,
+}
+# Codecs that go into an mp4 with "-c copy" everywhere
+MP4_CODECS = ('avc1', 'av01', 'hev1', 'hvc1', 'mp4a')
+VIDEO_CONTAINER = 'mp4'  # merge_output_format of Video downloads
+FALLBACK_CONTAINER = 'mkv'  # holds any codec pair
+
+
+def quality_height(quality):
+    # "720p" -> 720, also heights outside QUALITY_HEIGHTS such as "1440p"; "Best" -> None
+    if quality in QUALITY_HEIGHTS:
+        return QUALITY_HEIGHTS[quality]
+    digits = quality.rstrip("p")
+    return int(digits) if digits.isdigit() else None
+
+
+def codec_name(codec):
+    # None when the extractor did not say; "none" when the stream is absent
+    return codec.split(".")[0].lower() if codec else None
+
+
+def has_video(f):
+    # Unknown codecs count as present
+    return codec_name(f.get('vcodec')) != 'none'
+
+
+def has_audio(f):
+    return codec_name(f.get('acodec')) != 'none'
+
+
+def fits_container(f, container):
+    if container != 'mp4':
+        return True
+    return all(c in MP4_CODECS or c in ('none', None)
+               for c in (codec_name(f.get('vcodec')), codec_name(f.get('acodec'))))
+
+
+def expected_size(f, duration):
+    size = f.get('filesize') or f.get('filesize_approx')
+    if size:
+        return size
+    if f.get('tbr') and duration:
+        return f['tbr'] * 1000 / 8 * duration
+    return None
+
+
+class FormatPolicy:
+    def __init__(self, codecs=None, codec_efficiency=None, min_quality_ratio=0.6,
+                 remux_penalty=1.15, min_audio_abr=128, audio_headroom=0.75):
+        # Only these video codecs, e.g. ('avc1',) for old players; None allows all
+        self.codecs = codecs
+        self.codec_efficiency = dict(CODEC_EFFICIENCY, **(codec_efficiency or {}))
+        # Drop streams below this share of the best quality-adjusted bits per pixel
+        self.min_quality_ratio = min_quality_ratio
+        # Cost multiplier for streams that mp4 cannot hold as-is
+        self.remux_penalty = remux_penalty
+        self.min_audio_abr = min_audio_abr
+        # Source audio may be this much below the mp3 target (opus/aac are more efficient)
+        self.audio_headroom = audio_headroom
+
+    def efficiency(self, f):
+        return self.codec_efficiency.get(codec_name(f.get('vcodec')), 1.0)
+
+    def quality(self, f):
+        # Bits per pixel per frame, scaled to H.264-equivalent
+        pixels = (f.get('width') or 0) * (f.get('height') or 0) * (f.get('fps') or 30)
+        rate = f.get('vbr') or f.get('tbr')
+        if not pixels or not rate:
+            return 0
+        return rate * 1000 / pixels / self.efficiency(f)
+
+    def cost(self, f, duration=None):
+        # Bitrate stands in for size: every format of a video has the same duration
+        rate = f.get('tbr')
+        if not rate:
+            size = f.get('filesize') or f.get('filesize_approx')
+            rate = size * 8 / 1000 / duration if size and duration else float("inf")
+        codecs = [codec_name(f.get('vcodec')), codec_name(f.get('acodec'))]
+        if any(c not in MP4_CODECS and c not in ('none', None) for c in codecs):
+            rate *= self.remux_penalty
+        return rate
+
+
+DEFAULT_POLICY = FormatPolicy()
+
+
+class Choice:
+    def __init__(self, formats, duration):
+        self.formats = formats
+        self.duration = duration
+
+    @property
+    def format_id(self):
+        return "+".join(f['format_id'] for f in self.formats)
+
+    @property
+    def expected_bytes(self):
+        sizes = [expected_size(f, self.duration) for f in self.formats]
+        return None if None in sizes else int(sum(sizes))
+
+    def describe(self):
+        parts = []
+        for f in self.formats:
+            if has_video(f):
+                parts.append(f"{codec_name(f.get('vcodec')) or '?'} {f.get('height') or '?'}p")
+            if has_audio(f):
+                parts.append(f"{codec_name(f.get('acodec')) or '?'} {int(f.get('abr') or 0)}k")
+        size = self.expected_bytes
+        size = f"{size / 1024 / 1024:.1f} MiB" if size else "unknown size"
+        return f"{self.format_id} ({' + '.join(parts)}) ~ {size}"
+
+    def as_ydl_format(self, container=None):
+        # Shape yt-dlp expects back from a format-selector callable; container
+        # is the merge_output_format the pair is merged into
+        if len(self.formats) == 1:
+            return self.formats[0]
+        video, audio = self.formats
+        if container is None:
+            ext = video['ext']
+        elif all(fits_container(f, container) for f in self.formats):
+            ext = container
+        else:
+            ext = FALLBACK_CONTAINER
+        return {
+            'format_id': self.format_id,
+            'ext': ext,
+            'requested_formats': self.formats,
+            'protocol': f"{video['protocol']}+{audio['protocol']}",
+            'vcodec': video.get('vcodec'),
+            'acodec': audio.get('acodec'),
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'fps': video.get('fps'),
+            'tbr': (video.get('tbr') or 0) + (audio.get('tbr') or 0) or None,
+        }
+
+
+def pick_audio(formats, duration, min_abr, policy):
+    audio = [f for f in formats if has_audio(f) and not has_video(f)]
+    if not audio:
+        return None
+    good = [f for f in audio if (f.get('abr') or 0) >= min_abr]
+    if not good:
+        return max(audio, key=lambda f: f.get('abr') or 0)
+    return min(good, key=lambda f: policy.cost(f, duration))
+
+
+def pick_video(formats, max_height, duration, policy):
+    video = [f for f in formats if has_video(f) and not has_audio(f)
+             and (max_height is None or (f.get('height') or 0) <= max_height)]
+    if policy.codecs:
+        video = [f for f in video if codec_name(f.get('vcodec')) in policy.codecs] or video
+    if not video:
+        return None
+    # Requested quality = the tallest picture available under the cap
+    top = max(f.get('height') or 0 for f in video)
+    video = [f for f in video if (f.get('height') or 0) == top]
+    best = max(policy.quality(f) for f in video)
+    if best:
+        video = [f for f in video if policy.quality(f) >= best * policy.min_quality_ratio]
+    return min(video, key=lambda f: policy.cost(f, duration))
+
+
+def pick_muxed(formats, max_height, duration, policy):
+    muxed = [f for f in formats if has_video(f) and has_audio(f)
+             and (max_height is None or (f.get('height') or 0) <= max_height)]
+    if not muxed:
+        return None
+    top = max(f.get('height') or 0 for f in muxed)
+    return min((f for f in muxed if (f.get('height') or 0) == top), key=lambda f: policy.cost(f, duration))
+
+
+def best_single(formats, duration):
+    # yt-dlp lists formats worst to best
+    return Choice([formats[-1]], duration) if formats else None
+
+
+def select(formats, download_type, quality, duration=None, policy=DEFAULT_POLICY, container=None):
+    formats = [f for f in formats if f.get('format_id')]
+    if download_type == "Video":
+        max_height = quality_height(quality)
+        # Streams the merge container can hold first, any pair as a last resort
+        fitting = [f for f in formats if fits_container(f, container)]
+        for candidates in (fitting, formats):
+            video = pick_video(candidates, max_height, duration, policy)
+            audio = pick_audio(candidates, duration, policy.min_audio_abr, policy)
+            if video and audio:
+                return Choice([video, audio], duration)
+        muxed = pick_muxed(formats, max_height, duration, policy)
+        if muxed:
+            return Choice([muxed], duration)
+        return best_single(formats, duration)
+
+    # Highest requested bitrate, also for multi-target qualities like "mp3:128+mp3:320"
+    bitrates = [t.rpartition(":")[2] for t in quality.replace("kbps", "").split("+")]
+    bitrates = [int(b) for b in bitrates if b.isdigit()]
+    min_abr = max(bitrates) * policy.audio_headroom if bitrates else policy.min_audio_abr
+    audio = pick_audio(formats, duration, min_abr, policy)
+    if audio:
+        return Choice([audio], duration)
+    muxed = [f for f in formats if has_audio(f)]
+    if muxed:
+        return Choice([min(muxed, key=lambda f: policy.cost(f, duration))], duration)
+    return best_single(formats, duration)
+
+
+def make_selector(download_type, quality, policy=DEFAULT_POLICY, preferred=None, container=None):
+    # Callable for yt-dlp's 'format' option; preferred pins format IDs
+    # (e.g. "137+140" of a resumed job) as long as they are still offered;
+    # container is the merge_output_format
+    def selector(ctx):
+        formats = ctx.get('formats') or []
+        if preferred:
+            by_id = {f.get('format_id'): f for f in formats}
+            pinned = [by_id.get(format_id) for format_id in preferred.split("+")]
+            if all(pinned):
+                yield Choice(pinned, None).as_ydl_format(container)
+                return
+        choice = select(formats, download_type, quality, policy=policy, container=container)
+        if choice is not None:
+            yield choice.as_ydl_format(container)
+    return selector
+
+
+def dry_run(url, download_type="Video", quality="Best", policy=DEFAULT_POLICY, ydl_opts=None):
+    # Extract only and report what would be downloaded
+    opts = {'quiet': True, 'skip_download': True}
+    opts.update(ydl_opts or {})
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+    if not info:
+        return None
+    container = VIDEO_CONTAINER if download_type == "Video" else None
+    return select(info.get('formats') or [info], download_type, quality, info.get('duration'), policy, container)
@@ -0,0 +1,145 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlparse, parse_qs
+
+# On-disk cache of extracted info dicts, keyed by video ID.
+# A retry, a different quality or switching Video/Audio reuses the cached
+# formats list instead of running extraction again. Entries are dropped when
+# older than the TTL, when their stream URLs have expired, or when the cache
+# grows past max_bytes (oldest first).
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".yt_downloader", "info_cache")
+DEFAULT_TTL = 6 * 60 * 60  # seconds
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+# Treat stream URLs as expired a little early so a download doesn't start on a dying URL
+EXPIRY_MARGIN = 10 * 60
+
+YOUTUBE_ID_RE = re.compile(r'(?:v=|youtu\.be/|/shorts/|/embed/|/live/)([0-9A-Za-z_-]{11})')
+
+# Keys produced by format selection; they are recomputed for every download
+SELECTION_KEYS = ('requested_formats', 'requested_downloads', 'requested_subtitles')
+
+
+def video_id(url):
+    # "watch?v=X&list=PL..." is the playlist, not video X
+    match = YOUTUBE_ID_RE.search(url) if "list=" not in url else None
+    if match:
+        return match.group(1)
+    # Playlists and other sites: the URL itself is the key
+    return "url-" + hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def stream_expiry(info):
+    # Earliest "expire=" timestamp found in the format URLs, or None
+    expiry = None
+    for fmt in info.get('formats') or [info]:
+        url = fmt.get('url')
+        if not url:
+            continue
+        values = parse_qs(urlparse(url).query).get('expire')
+        if not values:
+            match = re.search(r'/expire/(\d+)', url)
+            values = [match.group(1)] if match else []
+        for value in values:
+            if value.isdigit():
+                expiry = int(value) if expiry is None else min(expiry, int(value))
+    return expiry
+
+
+class InfoCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, url):
+        path = self._path(video_id(url))
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        now = time.time()
+        expires = entry.get('expires')
+        if now - entry.get('cached_at', 0) > self.ttl or (expires and now > expires - EXPIRY_MARGIN):
+            # Stale: the caller re-extracts and put() replaces it
+            self._remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(path)  # keeps eviction least-recently-used
+        except OSError:
+            pass
+        return entry['info']
+
+    def put(self, url, info):
+        # Only single videos are cached; playlists change and are large
+        if not info or info.get('_type', 'video') != 'video':
+            return
+        info = {k: v for k, v in info.items() if k not in SELECTION_KEYS}
+        entry = {
+            'url': url,
+            'cached_at': time.time(),
+            'expires': stream_expiry(info),
+            'info': info
+        }
+        path = self._path(video_id(url))
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(entry, f)
+                os.replace(tmp, path)
+            except (OSError, TypeError, ValueError):
+                self._remove(tmp)
+                return
+            self._evict()
+
+    def invalidate(self, url):
+        self._remove(self._path(video_id(url)))
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                self._remove(os.path.join(self.cache_dir, name))
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
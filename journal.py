@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from yt_dlp.postprocessor import PostProcessor
+
+# Persistent job journal (SQLite).
+# Every submitted job is recorded with its options, resolved format, output
+# file and byte progress. Jobs that never reached a final state (the app was
+# closed or crashed) are resubmitted on the next start; yt-dlp then continues
+# from the existing .part files instead of starting from zero.
+# The journal is shared by the GUIs, the CLI and the API server: every
+# process owns the jobs it added and renews a lease while it runs, and only
+# jobs whose owner is gone are resumed (and claimed) by another process.
+
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.expanduser("~"), ".yt_downloader", "jobs.sqlite3")
+# Minimum seconds between progress writes for one job
+PROGRESS_INTERVAL = 2.0
+
+UNFINISHED = ("queued", "running")
+# An owner that has not renewed its lease for this long is considered dead
+LEASE = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    save_path TEXT NOT NULL,
+    download_type TEXT NOT NULL,
+    quality TEXT NOT NULL,
+    extra_opts TEXT,
+    format_id TEXT,
+    filename TEXT,
+    downloaded INTEGER DEFAULT 0,
+    total INTEGER DEFAULT 0,
+    status TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    owner TEXT
+);
+CREATE TABLE IF NOT EXISTS owners (
+    token TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+class JournalEntry:
+    def __init__(self, row):
+        (self.id, self.url, self.save_path, self.download_type, self.quality,
+         extra_opts, self.format_id, self.filename, self.downloaded, self.total,
+         self.status, self.error, self.created_at, self.updated_at, self.owner) = row
+        self.extra_opts = json.loads(extra_opts) if extra_opts else None
+
+
+def pid_alive(pid):
+    if os.name != "posix":
+        return True  # os.kill would terminate it on Windows; the lease decides
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # someone else's process
+    return True
+
+
+class Journal:
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, lease=LEASE):
+        self.path = path
+        self.lease = lease
+        # This process (and every engine in it) as the owner of its jobs
+        self.token = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if columns and "owner" not in columns:
+            # Journal written before ownership: those jobs have no live owner
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._last_write = {}
+        self._closed = threading.Event()
+        self.renew()
+        threading.Thread(target=self._keep_lease, name="ytdl-journal-lease", daemon=True).start()
+
+    def renew(self):
+        self._execute("INSERT OR REPLACE INTO owners (token, pid, heartbeat) VALUES (?, ?, ?)",
+                      (self.token, os.getpid(), time.time()))
+
+    def _keep_lease(self):
+        while not self._closed.wait(self.lease / 3):
+            try:
+                self.renew()
+            except sqlite3.Error:
+                pass  # locked or closed; the next round retries
+
+    def _live_owners(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT token, pid, heartbeat FROM owners").fetchall()
+        now = time.time()
+        live = set()
+        for token, pid, heartbeat in rows:
+            if token == self.token or (now - heartbeat < self.lease and pid_alive(pid)):
+                live.add(token)
+        return live
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cur
+
+    def add(self, job):
+        extra_opts = None
+        if job.extra_opts:
+            # Only JSON-friendly options survive a restart
+            try:
+                extra_opts = json.dumps(job.extra_opts)
+            except (TypeError, ValueError):
+                extra_opts = None
+        now = time.time()
+        cur = self._execute(
+            "INSERT INTO jobs (url, save_path, download_type, quality, extra_opts, status, created_at, updated_at,"
+            " owner) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job.url, job.save_path, job.download_type, job.quality, extra_opts, job.status, now, now, self.token))
+        return cur.lastrowid
+
+    def progress(self, journal_id, d):
+        # Throttled: called for every chunk, written every PROGRESS_INTERVAL
+        now = time.monotonic()
+        if d['status'] == 'downloading' and now - self._last_write.get(journal_id, 0) < PROGRESS_INTERVAL:
+            return
+        self._last_write[journal_id] = now
+        # Format and file come from JournalRecorder: the info dict of a hook
+        # call is a single stream of a merged download
+        self._execute(
+            "UPDATE jobs SET status = 'running', downloaded = ?, total = ?, updated_at = ? WHERE id = ?",
+            (d.get('downloaded_bytes') or 0, d.get('total_bytes') or d.get('total_bytes_estimate') or 0,
+             time.time(), journal_id))
+
+    def resolved(self, journal_id, format_id, filename):
+        self._execute("UPDATE jobs SET format_id = ?, filename = ?, updated_at = ? WHERE id = ?",
+                      (format_id, filename, time.time(), journal_id))
+
+    def set_status(self, journal_id, status, error=None):
+        self._last_write.pop(journal_id, None)
+        self._execute("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                      (status, str(error) if error is not None else None, time.time(), journal_id))
+
+    def unfinished(self):
+        # Unfinished jobs of owners that are gone; jobs of live processes,
+        # this one included, are left to them
+        live = self._live_owners()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY id", UNFINISHED).fetchall()
+        return [entry for entry in map(JournalEntry, rows) if entry.owner not in live]
+
+    def claim(self, entry):
+        # Compare-and-set: of several processes resuming at once, one wins
+        cur = self._execute(
+            "UPDATE jobs SET owner = ?, updated_at = ? WHERE id = ? AND owner IS ?",
+            (self.token, time.time(), entry.id, entry.owner))
+        return cur.rowcount == 1
+
+    def prune(self, older_than=7 * 24 * 60 * 60):
+        # Drop finished entries older than a week by default
+        cutoff = time.time() - older_than
+        self._execute("DELETE FROM jobs WHERE status NOT IN (?, ?) AND updated_at < ?",
+                      UNFINISHED + (cutoff,))
+        self._execute("DELETE FROM owners WHERE heartbeat < ?", (cutoff,))
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            # Jobs left unfinished become resumable by the next process right away
+            self._conn.execute("DELETE FROM owners WHERE token = ?", (self.token,))
+            self._conn.commit()
+            self._conn.close()
+
+
+class JournalRecorder(PostProcessor):
+    # Runs before the download on the whole selection ("137+140"), so a
+    # resumed job asks for the same streams and finds its .part files
+    def __init__(self, journal, job):
+        super().__init__()
+        self.journal = journal
+        self.job = job
+
+    def run(self, info):
+        requested = info.get('requested_formats')
+        format_id = "+".join(f['format_id'] for f in requested) if requested else info.get('format_id')
+        self.journal.resolved(self.job.journal_id, format_id, self._downloader.prepare_filename(info))
+        return [], info
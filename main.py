@@ -1,9 +1,10 @@
+import startup  # first, so the startup clock includes loading kivy
 import os
 os.environ["KIVY_GL_BACKEND"] = "angle_sdl2"
 
 import platform
 import threading
-import yt_dlp
+from progress import ProgressBus
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
@@ -15,6 +16,9 @@ from kivy.uix.progressbar import ProgressBar
 from kivy.core.window import Window
 from kivy.clock import Clock
 
+# yt-dlp (via engine) loads in the background after the first frame; see startup.py
+startup.mark("imports")
+
 # Window size for desktop testing
 Window.size = (360, 640)
 
@@ -24,9 +28,8 @@ if platform.system() == "Windows":
 else:
     default_path = "/storage/emulated/0/Download"
 
-# ffmpeg path (for Windows desktop)
-ffmpeg_path = os.path.join(os.getcwd(), "ffmpeg.exe")
-ydl_base_opts = {'ffmpeg_location': ffmpeg_path}
+# Videos of a playlist probed to fill the quality menu
+PREVIEW_ENTRIES = 5
 
 
 class DownloaderLayout(BoxLayout):
@@ -36,7 +39,9 @@ class DownloaderLayout(BoxLayout):
         # URL input
         self.add_widget(Label(text="YouTube URL:", size_hint=(1, None), height=30))
         self.url_input = TextInput(hint_text="Enter YouTube URL", size_hint=(1, None), height=40)
+        self.url_input.bind(focus=self.on_url_focus)
         self.add_widget(self.url_input)
+        self.previewed_url = None
 
         # Save location
         self.add_widget(Label(text="Save Location:", size_hint=(1, None), height=30))
@@ -76,6 +81,64 @@ class DownloaderLayout(BoxLayout):
         self.download_btn.bind(on_press=self.start_download)
         self.add_widget(self.download_btn)
 
+        # Progress is coalesced by the bus and redrawn at a fixed rate
+        self.progress_bus = ProgressBus()
+        Clock.schedule_interval(self.refresh_progress, self.progress_bus.interval)
+        # schedule_once fires after the first frame has been drawn
+        Clock.schedule_once(self.first_frame)
+
+    def first_frame(self, dt):
+        startup.mark("first frame")
+        startup.warm_up(callback=self.resume_unfinished)
+
+    # Runs on the warm-up thread once yt-dlp is loaded
+    def resume_unfinished(self):
+        from engine import get_engine
+        # Pick up downloads interrupted by a crash or by closing the window
+        if get_engine().resume_unfinished(on_progress=self.progress_bus.hook, on_done=self.download_done):
+            Clock.schedule_once(lambda dt: self.show_resuming())
+
+    def show_resuming(self):
+        self.progress_bar.opacity = 1
+        self.progress_label.opacity = 1
+        self.download_btn.disabled = True
+        self.update_status("Resuming unfinished downloads...")
+
+    # Quality menu from the formats the video actually offers
+    def on_url_focus(self, instance, focused):
+        url = self.url_input.text.strip()
+        if focused or not url.startswith("http") or url == self.previewed_url:
+            return
+        self.previewed_url = url
+        self.update_status("Fetching available qualities...")
+        threading.Thread(target=self.fetch_qualities, args=(url,), name="ytdl-preview", daemon=True).start()
+
+    def fetch_qualities(self, url):
+        try:
+            from prefetch import Prefetcher
+        except ImportError as e:
+            Clock.schedule_once(lambda dt, err=str(e): self.update_status(f"Error: {err}"))
+            return
+        previews = []
+        # Streamed: the menu grows as each playlist entry comes in
+        for preview in Prefetcher().run([url], max_entries=PREVIEW_ENTRIES):
+            previews.append(preview)
+            Clock.schedule_once(lambda dt, found=list(previews): self.show_qualities(url, found))
+
+    def show_qualities(self, url, previews):
+        from prefetch import quality_options
+        if url != self.url_input.text.strip():
+            return  # URL changed meanwhile
+        found = [p for p in previews if p.error is None]
+        if not found:
+            self.update_status(f"Error: {previews[-1].error}")
+            return
+        values = quality_options(found)
+        self.quality_spinner.values = values
+        if self.quality_spinner.text not in values:
+            self.quality_spinner.text = "Best"
+        self.update_status(found[0].title if len(found) == 1 else f"{len(found)} videos checked")
+
     # Folder chooser
     def open_filechooser(self, instance):
         chooser_layout = BoxLayout(orientation="vertical")
@@ -124,57 +187,44 @@ class DownloaderLayout(BoxLayout):
         # Disable button while downloading
         self.download_btn.disabled = True
 
-        # Run download in separate thread
-        threading.Thread(target=self.download_video, args=(url, save_path, quality, download_type)).start()
-
-    def download_video(self, url, save_path, quality, download_type):
-        def progress_hook(d):
-            if d['status'] == 'downloading':
-                downloaded = d.get('downloaded_bytes', 0)
-                total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-                if total > 0:
-                    percent_val = (downloaded / total) * 100
-                    Clock.schedule_once(lambda dt: self.update_progress(percent_val))
-            elif d['status'] == 'finished':
-                Clock.schedule_once(lambda dt: self.update_status("Downloading..."))
+        # Importing engine waits for the warm-up if it is still running; keep that off the UI thread
+        threading.Thread(target=self.submit, args=(url, save_path, download_type, quality),
+                         name="ytdl-submit", daemon=True).start()
 
+    def submit(self, url, save_path, download_type, quality):
         try:
-            if download_type == "Video":
-                format_code = {
-                    "360p": "bv*[vcodec^=avc1][height<=360]+ba/best[height<=360]",
-                    "720p": "bv*[vcodec^=avc1][height<=720]+ba/best[height<=720]",
-                    "1080p": "bv*[vcodec^=avc1][height<=1080]+ba/best[height<=1080]",
-                    "Best": "bv*[vcodec^=avc1]+ba/best"
-                }.get(quality, "bv*[vcodec^=avc1]+ba/best")
-
-                ydl_opts = {
-                    'outtmpl': f'{save_path}/%(title)s.%(ext)s',
-                    'format': format_code,
-                    'merge_output_format': 'mp4',
-                    'progress_hooks': [progress_hook]
-                }
-            else:
-                ydl_opts = {
-                    'outtmpl': f'{save_path}/%(title)s.%(ext)s',
-                    'format': 'bestaudio/best',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '192',
-                    }],
-                    'progress_hooks': [progress_hook]
-                }
-
-            ydl_opts.update(ydl_base_opts)
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-
-            Clock.schedule_once(lambda dt: self.update_status("Download completed!"))
-            Clock.schedule_once(lambda dt: self.update_progress(100))
-        except Exception as e:
-            Clock.schedule_once(lambda dt: self.update_status(f"Error: {e}"))
-        finally:
+            from engine import get_engine
+        except ImportError as e:
+            Clock.schedule_once(lambda dt, err=str(e): self.update_status(f"Error: {err}"))
             Clock.schedule_once(lambda dt: self.enable_button())
+            return
+        # Hand the job to the shared engine's worker pool
+        get_engine().submit(url, save_path, download_type, quality,
+                            on_progress=self.progress_bus.hook, on_done=self.download_done)
+
+    def refresh_progress(self, dt):
+        for state in self.progress_bus.drain():
+            if state.status == 'downloading':
+                if state.total > 0:
+                    self.update_progress(state.percent)
+            elif state.status == 'finished':
+                self.update_status("Downloading...")
+
+    # Called from engine worker threads
+    def download_done(self, job):
+        from engine import get_engine, FINISHED, CANCELLED
+        from memory import peak_note
+        self.progress_bus.forget(job.id)
+        if job.status == FINISHED:
+            # Low-memory mode (phones) also shows how much RAM the job needed
+            note = peak_note(job) if get_engine().low_memory else ""
+            Clock.schedule_once(lambda dt: self.update_status(f"Download completed!{note}"))
+            Clock.schedule_once(lambda dt: self.update_progress(100))
+        elif job.status == CANCELLED:
+            Clock.schedule_once(lambda dt: self.update_status("Download cancelled."))
+        else:
+            Clock.schedule_once(lambda dt, err=str(job.error): self.update_status(f"Error: {err}"))
+        Clock.schedule_once(lambda dt: self.enable_button())
 
     # UI updates
     def update_progress(self, value):
@@ -0,0 +1,65 @@
+import os
+import sys
+
+# Low-memory operation for phones.
+# Every running job holds a YoutubeDL with the full info dict (YouTube's
+# format list, thumbnails and the automatic captions of every language) plus
+# its read buffers, and a playlist used to be listed completely before its
+# first job started. In low-memory mode reads use a small fixed buffer with
+# one fragment in flight, the info dict is cut down to the selected formats
+# and the fields a download needs, playlist entries are paged in as jobs
+# finish, and each job records the peak RSS seen while it ran.
+# On by default on Android (python-for-android) or with YTDL_LOW_MEMORY=1.
+
+LOW_MEMORY = bool(os.environ.get("YTDL_LOW_MEMORY")) or "ANDROID_ARGUMENT" in os.environ
+
+BUFFER_SIZE = 16 * 1024  # bytes per read, never grown
+# Info dict fields nothing after format selection uses; the captions alone
+# are often larger than everything else together
+TRIM_KEYS = ('thumbnails', 'subtitles', 'automatic_captions', 'heatmap',
+             'description', 'tags', 'categories')
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def ydl_low_memory_opts():
+    return {
+        'buffersize': BUFFER_SIZE,
+        'noresizebuffer': True,
+        'concurrent_fragment_downloads': 1,
+    }
+
+
+def trim_info(info, selector):
+    # Copy of a single video's info with only the formats selector picks
+    if not info or info.get('_type', 'video') != 'video':
+        return info
+    trimmed = {k: v for k, v in info.items() if k not in TRIM_KEYS}
+    formats = info.get('formats')
+    if formats and callable(selector):
+        chosen = next(iter(selector({'formats': formats})), None)
+        if chosen is not None:
+            ids = {f.get('format_id') for f in chosen.get('requested_formats') or [chosen]}
+            trimmed['formats'] = [f for f in formats if f.get('format_id') in ids]
+    return trimmed
+
+
+def current_rss():
+    # Resident set size in bytes, None where it cannot be read
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    # No /proc (macOS): the process peak so far; ru_maxrss is bytes there, KiB elsewhere
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def peak_note(job):
+    # " (peak memory 85 MiB)" for status lines, "" when it was not measured
+    peak = job.timings.peak_rss if getattr(job, 'timings', None) is not None else None
+    return f" (peak memory {peak / 1024 / 1024:.0f} MiB)" if peak else ""
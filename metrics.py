@@ -0,0 +1,181 @@
+import json
+import time
+import threading
+from memory import current_rss
+
+# Per-job timing and aggregate counters.
+# Every job records how long each stage took: extraction, time to first
+# byte, throughput per stream, merge and transcode. Finished jobs are added
+# to process-wide counters that can be appended to a JSON lines file and
+# served in the Prometheus text format, so the slow stage shows up in
+# numbers instead of in a status label.
+
+STAGES = ('extract', 'ttfb', 'download', 'merge', 'transcode')
+RSS_INTERVAL = 1.0  # seconds between memory samples of a job
+
+
+class JobTimings:
+    def __init__(self):
+        self.created = time.time()
+        self.started = time.monotonic()
+        # stage -> seconds, for stages that ran
+        self.stages = {}
+        # filename -> {'first': t, 'last': t, 'base': bytes, 'bytes': bytes}
+        self.streams = {}
+        # Highest process RSS seen while this job ran (shared with concurrent jobs)
+        self.peak_rss = None
+        self._rss_sampled = 0.0
+        self._download_start = None
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def sample_rss(self, now=None):
+        now = now or time.monotonic()
+        if now - self._rss_sampled < RSS_INTERVAL:
+            return
+        self._rss_sampled = now
+        rss = current_rss()
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+
+    def begin(self, stage):
+        self._open[stage] = time.monotonic()
+        self.sample_rss()
+
+    def end(self, stage):
+        start = self._open.pop(stage, None)
+        if start is not None:
+            with self._lock:
+                self.stages[stage] = self.stages.get(stage, 0) + time.monotonic() - start
+            if stage == 'extract':
+                self._download_start = time.monotonic()
+        self._rss_sampled = 0.0  # the end of a stage is always sampled
+        self.sample_rss()
+
+    # Progress hook: one dict lookup per chunk
+    def progress(self, d):
+        now = time.monotonic()
+        downloaded = d.get('downloaded_bytes') or 0
+        with self._lock:
+            stream = self.streams.get(d.get('filename'))
+            if stream is None:
+                # Bytes already in a resumed .part file do not count as throughput
+                stream = self.streams[d.get('filename')] = {
+                    'first': now, 'last': now, 'base': downloaded, 'bytes': 0}
+                start = self._download_start or self.started
+                if 'ttfb' not in self.stages:
+                    self.stages['ttfb'] = now - start
+            stream['last'] = now
+            stream['bytes'] = max(stream['bytes'], downloaded - stream['base'])
+        self.sample_rss(now)
+
+    # yt-dlp postprocessor hook: the Merger run is the merge stage
+    def postprocess(self, d):
+        stage = 'merge' if d.get('postprocessor') == 'Merger' else None
+        if stage is None:
+            return
+        if d.get('status') == 'started':
+            self.begin(stage)
+        elif d.get('status') == 'finished':
+            self.end(stage)
+
+    def record(self):
+        self._rss_sampled = 0.0
+        self.sample_rss()
+        with self._lock:
+            streams = [{
+                'filename': name,
+                'bytes': s['bytes'],
+                'seconds': round(s['last'] - s['first'], 3),
+                'throughput': round(s['bytes'] / (s['last'] - s['first'])) if s['last'] > s['first'] else None,
+            } for name, s in self.streams.items()]
+            stages = {k: round(v, 3) for k, v in self.stages.items()}
+        if streams:
+            stages['download'] = max(s['seconds'] for s in streams)
+        return {
+            'started_at': self.created,
+            'seconds': round(time.monotonic() - self.started, 3),
+            'stages': stages,
+            'bytes': sum(s['bytes'] for s in streams),
+            'streams': streams,
+            'peak_rss': self.peak_rss,
+        }
+
+
+class Metrics:
+    def __init__(self, jsonl_path=None):
+        # Finished jobs are appended here as JSON lines when set
+        self.jsonl_path = jsonl_path
+        self.jobs = {}  # status -> count
+        self.bytes = 0
+        self.stage_sum = dict.fromkeys(STAGES, 0.0)
+        self.stage_count = dict.fromkeys(STAGES, 0)
+        self.in_flight = 0
+        self.peak_rss = 0  # highest per-job peak so far
+        self._lock = threading.Lock()
+
+    def job_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def job_finished(self, job):
+        timings = getattr(job, 'timings', None)
+        record = timings.record() if timings is not None else {'stages': {}, 'bytes': 0}
+        record.update(id=job.id, url=job.url, type=job.download_type, quality=job.quality,
+                      status=job.status, skipped=job.skipped,
+                      error=str(job.error) if job.error else None)
+        with self._lock:
+            self.in_flight -= 1
+            self.jobs[job.status] = self.jobs.get(job.status, 0) + 1
+            self.bytes += record['bytes']
+            self.peak_rss = max(self.peak_rss, record.get('peak_rss') or 0)
+            for stage, seconds in record['stages'].items():
+                self.stage_sum[stage] += seconds
+                self.stage_count[stage] += 1
+            if self.jsonl_path:
+                try:
+                    with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record) + "\n")
+                except OSError:
+                    pass  # metrics never fail a download
+        return record
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'jobs': dict(self.jobs),
+                'in_flight': self.in_flight,
+                'bytes': self.bytes,
+                'peak_rss': self.peak_rss,
+                'stages': {stage: {'sum': round(self.stage_sum[stage], 3), 'count': self.stage_count[stage]}
+                           for stage in STAGES},
+            }
+
+    def prometheus(self, retries=None):
+        # Prometheus text exposition format; retries is resilience.stats.snapshot()
+        snap = self.snapshot()
+        lines = ["# HELP ytdl_jobs_total Finished jobs by final status.",
+                 "# TYPE ytdl_jobs_total counter"]
+        for status, count in sorted(snap['jobs'].items()):
+            lines.append(f'ytdl_jobs_total{{status="{status}"}} {count}')
+        lines += ["# HELP ytdl_jobs_in_flight Jobs currently downloading or processing.",
+                  "# TYPE ytdl_jobs_in_flight gauge",
+                  f"ytdl_jobs_in_flight {snap['in_flight']}",
+                  "# HELP ytdl_downloaded_bytes_total Bytes transferred by finished jobs.",
+                  "# TYPE ytdl_downloaded_bytes_total counter",
+                  f"ytdl_downloaded_bytes_total {snap['bytes']}",
+                  "# HELP ytdl_job_peak_rss_bytes Highest resident memory seen during any finished job.",
+                  "# TYPE ytdl_job_peak_rss_bytes gauge",
+                  f"ytdl_job_peak_rss_bytes {snap['peak_rss']}",
+                  "# HELP ytdl_stage_seconds Time spent per job stage.",
+                  "# TYPE ytdl_stage_seconds summary"]
+        for stage, values in snap['stages'].items():
+            lines.append(f'ytdl_stage_seconds_sum{{stage="{stage}"}} {values["sum"]}')
+            lines.append(f'ytdl_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+        if retries:
+            lines += ["# HELP ytdl_retry_events_total Retry events by error class.",
+                      "# TYPE ytdl_retry_events_total counter"]
+            for kind, counts in sorted(retries.items()):
+                for event, count in sorted(counts.items()):
+                    lines.append(f'ytdl_retry_events_total{{kind="{kind}",event="{event}"}} {count}')
+        return "\n".join(lines) + "\n"
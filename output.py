@@ -0,0 +1,187 @@
+import os
+import shutil
+import hashlib
+import threading
+from yt_dlp.postprocessor import PostProcessor
+from formats import expected_size
+
+# Disk-space-aware output handling.
+# Before a job downloads anything, the expected size of the selected formats
+# is reserved against the free space of the volumes it will write to; a job
+# that cannot fit waits while other reservations on that volume are still
+# running, and fails with DiskFullError when nothing will ever free up.
+# Optionally all work (.part files, fragments, the streams and the merge)
+# happens on a fast scratch directory, and only the finished file is moved
+# into the save folder: a rename on the same volume, otherwise a copy to a
+# hidden temp name next to the target that is renamed once complete, so the
+# save folder never holds a half-written file.
+
+DEFAULT_MIN_FREE = 200 * 1024 * 1024  # always left free on every volume
+# Merged formats need room for the streams and the merged file at once
+MERGE_FACTOR = 2.0
+SLACK = 1.1  # container overhead and size estimates that run short
+WAIT_STEP = 5  # seconds between free-space rechecks while queued
+
+
+class DiskFullError(OSError):
+    pass
+
+
+def job_expected_bytes(info):
+    # Sum of the selected formats; unknown sizes count as 0
+    formats = info.get('requested_formats') or [info]
+    return int(sum(expected_size(f, info.get('duration')) or 0 for f in formats))
+
+
+def _volume(path):
+    # Nearest existing ancestor's device: the save folder may not exist yet
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return os.stat(path).st_dev, path
+
+
+def finalize(path, save_path):
+    # Move a finished file into save_path without ever exposing a partial file there
+    target = os.path.join(save_path, os.path.basename(path))
+    if os.path.abspath(target) == os.path.abspath(path):
+        return target
+    os.makedirs(save_path, exist_ok=True)
+    try:
+        os.replace(path, target)
+        return target
+    except OSError:
+        pass  # different volume
+    temp = os.path.join(save_path, f".{os.path.basename(path)}.partial")
+    try:
+        with open(path, "rb") as src, open(temp, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+            dst.flush()
+            os.fsync(dst.fileno())
+        shutil.copystat(path, temp)
+        os.replace(temp, target)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+    os.remove(path)
+    return target
+
+
+class Reservation:
+    def __init__(self, manager, amounts):
+        self.manager = manager
+        self.amounts = amounts  # device -> bytes
+
+    def absorb(self, other):
+        # Playlist jobs reserve once per entry and release everything at the end
+        for device, amount in other.amounts.items():
+            self.amounts[device] = self.amounts.get(device, 0) + amount
+        other.amounts = {}
+
+    def release(self):
+        if self.amounts:
+            self.manager._release(self.amounts)
+            self.amounts = {}
+
+
+class OutputManager:
+    def __init__(self, scratch_dir=None, min_free=DEFAULT_MIN_FREE, queue_when_full=True):
+        # Work directory for temp and fragment files; None writes in the save folder
+        self.scratch_dir = scratch_dir
+        self.min_free = min_free
+        # Wait for running jobs to free space instead of failing at once
+        self.queue_when_full = queue_when_full
+        self._reserved = {}  # device -> bytes promised to running jobs
+        self._cond = threading.Condition()
+
+    def work_dir(self, save_path):
+        # Stable per save folder, so a resumed job finds its .part files again
+        if not self.scratch_dir:
+            return save_path
+        key = hashlib.sha1(os.path.abspath(save_path).encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.scratch_dir, key)
+
+    def needs(self, save_path, expected, merged=False):
+        # device -> (bytes, path to report) this job will occupy at its peak
+        work = self.work_dir(save_path)
+        peak = int(expected * (MERGE_FACTOR if merged else 1) * SLACK)
+        needs = {}
+        for path, amount in ((work, peak), (save_path, int(expected * SLACK))):
+            device, existing = _volume(path)
+            total, _ = needs.get(device, (0, existing))
+            # Same volume: the final file is the merged output already counted in peak
+            needs[device] = (max(total, amount), existing)
+        return needs
+
+    def reserve(self, save_path, expected, merged=False, cancelled=None):
+        needs = self.needs(save_path, expected, merged)
+        with self._cond:
+            while True:
+                short = None
+                for device, (amount, path) in needs.items():
+                    free = shutil.disk_usage(path).free - self._reserved.get(device, 0) - self.min_free
+                    if amount > free:
+                        short = (device, amount, path, free)
+                        break
+                if short is None:
+                    for device, (amount, _) in needs.items():
+                        self._reserved[device] = self._reserved.get(device, 0) + amount
+                    return Reservation(self, {device: amount for device, (amount, _) in needs.items()})
+                if cancelled is not None and cancelled():
+                    # The job's progress hook reports the cancel on its first chunk
+                    return Reservation(self, {})
+                device, amount, path, free = short
+                if not self.queue_when_full or not self._reserved.get(device):
+                    raise DiskFullError(f"Not enough free space on {path}: "
+                                        f"need {amount / 1024 / 1024:.0f} MiB, "
+                                        f"have {max(free, 0) / 1024 / 1024:.0f} MiB")
+                # Running jobs on this volume will release their share
+                self._cond.wait(WAIT_STEP)
+
+    def _release(self, amounts):
+        with self._cond:
+            for device, amount in amounts.items():
+                self._reserved[device] = max(0, self._reserved.get(device, 0) - amount)
+            self._cond.notify_all()
+
+
+class ReservePP(PostProcessor):
+    # Runs before the download, once formats are selected and sizes are known
+    def __init__(self, manager, job):
+        super().__init__()
+        self.manager = manager
+        self.job = job
+        self._reserved = set()
+
+    def run(self, info):
+        # A retried download of the same video keeps its first reservation
+        if info.get('id') in self._reserved:
+            return [], info
+        self._reserved.add(info.get('id'))
+        merged = len(info.get('requested_formats') or []) > 1
+        reservation = self.manager.reserve(self.job.save_path, job_expected_bytes(info), merged,
+                                           lambda: self.job.cancel_requested)
+        if self.job.reservation is None:
+            self.job.reservation = reservation
+        else:
+            self.job.reservation.absorb(reservation)
+        return [], info
+
+
+class FinalizePP(PostProcessor):
+    # Moves the finished file from the work directory into the save folder
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+    def run(self, info):
+        path = info.get('filepath')
+        if path and os.path.exists(path):
+            info['filepath'] = self.job.filepath = finalize(path, self.job.save_path)
+        return [], info
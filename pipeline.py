@@ -0,0 +1,140 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+from yt_dlp.postprocessor.ffmpeg import FFmpegPostProcessor
+from segmented import HttpConnection, SegmentError, READ_SIZE
+
+# Streaming remux pipeline.
+# Instead of writing every stream to a .f*.mp4/.webm file and letting ffmpeg
+# read them back, the downloaded bytes go straight into an ffmpeg remux
+# process through FIFOs, and only the merged file ever touches the disk.
+# Needs os.mkfifo (Linux, macOS, Android); elsewhere the normal path is used.
+
+
+def available():
+    return hasattr(os, "mkfifo")
+
+
+def stream_merge(urlopen, ffmpeg, streams, output, progress=None):
+    # urlopen: YoutubeDL.urlopen; streams: list of (url, headers);
+    # progress(index, downloaded, total, finished)
+    tmpdir = tempfile.mkdtemp(prefix="ytdl-pipe-")
+    fifos = [os.path.join(tmpdir, f"input{i}") for i in range(len(streams))]
+    for fifo in fifos:
+        os.mkfifo(fifo)
+
+    cmd = [ffmpeg, "-y", "-loglevel", "error"]
+    for fifo in fifos:
+        cmd += ["-i", fifo]
+    for i in range(len(fifos)):
+        cmd += ["-map", str(i)]
+    cmd += ["-c", "copy", output]
+
+    errors = []
+    aborted = threading.Event()
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def feed(index, url, headers):
+        conn = HttpConnection(urlopen, url, headers)
+        try:
+            resp = conn.get()
+            if resp.status != 200:
+                raise SegmentError(f"HTTP Error {resp.status}: {resp.reason}")
+            length = resp.headers.get('Content-Length')
+            total = int(length) if length and length.isdigit() else None
+            downloaded = 0
+            # Blocks until ffmpeg (or the cleanup below) opens this input
+            with open(fifos[index], "wb") as pipe:
+                while not aborted.is_set():
+                    data = resp.read(READ_SIZE)
+                    if not data:
+                        break
+                    pipe.write(data)
+                    downloaded += len(data)
+                    if progress:
+                        progress(index, downloaded, total, False)
+            if progress:
+                progress(index, downloaded, total, True)
+        except BaseException as e:
+            if not aborted.is_set():
+                errors.append(e)
+            proc.kill()
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=feed, args=(i, url, headers), name=f"ytdl-pipe-{i + 1}", daemon=True)
+               for i, (url, headers) in enumerate(streams)]
+    for t in threads:
+        t.start()
+    readers = []
+    try:
+        _, stderr = proc.communicate()
+        if proc.returncode != 0 and not errors:
+            # ffmpeg died first: report its reason rather than the writers' broken pipes
+            errors.insert(0, SegmentError(stderr.decode("utf-8", "replace").strip() or "ffmpeg failed"))
+        # Writers still waiting for ffmpeg to open their FIFO are released and stop
+        aborted.set()
+        for fifo in fifos:
+            readers.append(os.open(fifo, os.O_RDONLY | os.O_NONBLOCK))
+        for t in threads:
+            t.join()
+    finally:
+        for fd in readers:
+            os.close(fd)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if errors:
+        try:
+            os.remove(output)
+        except OSError:
+            pass
+        raise errors[0]
+
+
+class StreamingMergeMixin:
+    streaming_merge = False
+
+    def process_info(self, info_dict):
+        formats = info_dict.get('requested_formats') or []
+        if (self.streaming_merge and available() and len(formats) > 1
+                and all(f.get('protocol') in ('http', 'https') and f.get('url') for f in formats)
+                and not self.params.get('simulate') and not self.params.get('skip_download')):
+            ffmpeg = FFmpegPostProcessor(self)
+            final = self.prepare_filename(info_dict)
+            if ffmpeg.available and final and not os.path.exists(final):
+                # The before-download postprocessors (free-space reservation,
+                # journal) run before any byte is fetched, as on the normal path
+                new_info, _ = super().pre_process(info_dict, 'before_dl')
+                info_dict.clear()
+                info_dict.update(new_info, __before_dl_done=True)
+                self._stream_merge(ffmpeg.executable, info_dict, formats, final)
+        # yt-dlp finds the merged file in place and goes straight to post-processing
+        return super().process_info(info_dict)
+
+    def pre_process(self, ie_info, key='pre_process', files_to_move=None):
+        # Already run by process_info above
+        if key == 'before_dl' and ie_info.pop('__before_dl_done', False):
+            return ie_info, files_to_move
+        return super().pre_process(ie_info, key, files_to_move)
+
+    def _stream_merge(self, ffmpeg, info_dict, formats, final):
+        base, ext = os.path.splitext(final)
+        temp = f"{base}.temp{ext}"
+        os.makedirs(os.path.dirname(final) or ".", exist_ok=True)
+        started = time.monotonic()
+        states = [{'filename': f"{base}.f{f['format_id']}{ext}", 'info_dict': dict(info_dict, **f)}
+                  for f in formats]
+
+        def progress(index, downloaded, total, finished):
+            d = dict(states[index], status='finished' if finished else 'downloading',
+                     downloaded_bytes=downloaded, total_bytes=total,
+                     elapsed=time.monotonic() - started)
+            for hook in self._progress_hooks:
+                hook(d)
+
+        streams = [(f['url'], self._calc_headers(f)) for f in formats]
+        stream_merge(self.urlopen, ffmpeg, streams, temp, progress)
+        os.replace(temp, final)
@@ -0,0 +1,139 @@
+import os
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from yt_dlp.postprocessor import PostProcessor
+
+# Post-processing stage for audio transcoding.
+# Audio jobs download the source stream only; the transcode to mp3 (or any
+# other codec) is queued here and the download worker moves on to the next
+# job. Each task is one ffmpeg process and at most one runs per CPU core, so
+# the network and the CPU are busy at the same time.
+
+# preferredcodec -> (ffmpeg encoder, file extension)
+AUDIO_CODECS = {
+    'mp3': ('libmp3lame', 'mp3'),
+    'aac': ('aac', 'm4a'),
+    'm4a': ('aac', 'm4a'),
+    'opus': ('libopus', 'opus'),
+    'vorbis': ('libvorbis', 'ogg'),
+    'flac': ('flac', 'flac'),
+    'wav': ('pcm_s16le', 'wav'),
+}
+
+# Target codec name -> codec actually stored in the file
+CODEC_FAMILY = {'m4a': 'aac'}
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def quality_args(quality):
+    # yt-dlp convention: below 10 is a VBR quality level, otherwise kbps
+    quality = str(quality or "").replace("kbps", "").replace("k", "")
+    if not quality.isdigit():
+        return []
+    if int(quality) < 10:
+        return ["-q:a", quality]
+    return ["-b:a", f"{quality}k"]
+
+
+def parse_audio_target(target):
+    # "mp3:320" -> ("mp3", "320"), "m4a" -> ("m4a", None), "192kbps" -> ("mp3", "192")
+    if isinstance(target, (tuple, list)):
+        return target[0], target[1]
+    codec, _, quality = target.partition(":")
+    if codec.replace("kbps", "").isdigit():
+        return 'mp3', codec.replace("kbps", "")
+    return codec, quality or None
+
+
+def source_codec(acodec):
+    # yt-dlp acodec ("mp4a.40.2", "opus", ...) -> AUDIO_CODECS key
+    acodec = (acodec or "").lower()
+    if acodec.startswith("mp4a"):
+        return 'aac'
+    for name in ('opus', 'vorbis', 'mp3', 'flac'):
+        if acodec.startswith(name):
+            return name
+    return None
+
+
+def output_paths(src, targets):
+    # Targets sharing an extension get the quality in the file name
+    base = os.path.splitext(src)[0]
+    exts = [AUDIO_CODECS.get(codec, (codec, codec))[1] for codec, _ in targets]
+    paths = []
+    for (codec, quality), ext in zip(targets, exts):
+        if exts.count(ext) > 1:
+            paths.append(f"{base}.{quality}k.{ext}" if quality else f"{base}.{ext}")
+        else:
+            paths.append(f"{base}.{ext}")
+    return paths
+
+
+def transcode_audio(ffmpeg, src, targets=(('mp3', '192'),), acodec=None, keep_source=False):
+    # One decode of src fanned out to every target in a single ffmpeg run;
+    # a target in the source's own codec without a quality is a stream copy
+    targets = [parse_audio_target(t) for t in targets]
+    dests = output_paths(src, targets)
+    src_codec = source_codec(acodec)
+    temps = []
+    cmd = [ffmpeg, "-y", "-loglevel", "error", "-i", src]
+    for (codec, quality), dest in zip(targets, dests):
+        if os.path.abspath(dest) == os.path.abspath(src):
+            temps.append(None)
+            continue
+        root, ext = os.path.splitext(dest)
+        temp = f"{root}.temp{ext}"
+        temps.append(temp)
+        encoder = AUDIO_CODECS.get(codec, (codec, codec))[0]
+        if quality is None and src_codec == CODEC_FAMILY.get(codec, codec):
+            cmd += ["-map", "0:a:0", "-vn", "-c:a", "copy", temp]
+        else:
+            cmd += ["-map", "0:a:0", "-vn", "-c:a", encoder] + quality_args(quality) + [temp]
+
+    if any(temps):
+        result = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            for temp in temps:
+                if temp:
+                    try:
+                        os.remove(temp)
+                    except OSError:
+                        pass
+            raise TranscodeError(result.stderr.decode("utf-8", "replace").strip() or "ffmpeg failed")
+        for temp, dest in zip(temps, dests):
+            if temp:
+                os.replace(temp, dest)
+    if not keep_source and src not in dests:
+        os.remove(src)
+    return dests
+
+
+class TranscodePool:
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ytdl-transcode")
+
+    def submit(self, ffmpeg, src, targets=(('mp3', '192'),), acodec=None, keep_source=False):
+        return self._executor.submit(transcode_audio, ffmpeg, src, targets, acodec, keep_source)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class FileCollector(PostProcessor):
+    # Collects (final path, page URL, audio codec) of every file a job produced
+    def __init__(self, files):
+        super().__init__()
+        self.files = files
+        self._lock = threading.Lock()
+
+    def run(self, info):
+        path = info.get('filepath')
+        if path:
+            with self._lock:
+                self.files.append((path, info.get('webpage_url'), info.get('acodec')))
+        return [], info
@@ -0,0 +1,139 @@
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import yt_dlp
+from batch import expand_sources, iter_entries, entry_url
+from engine import get_info_cache
+from formats import select, has_video, DEFAULT_POLICY, VIDEO_CONTAINER
+
+# Metadata-only prefetch for many URLs.
+# Playlists are listed and every video is extracted (no download) on a pool
+# of fan-out threads, each with its own YoutubeDL, and a Preview is yielded
+# as soon as each one completes. Extractions land in the info cache, so the
+# download started after looking at the previews skips extraction.
+
+DEFAULT_FANOUT = 8
+
+
+def format_duration(seconds):
+    if not seconds:
+        return "?:??"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def format_size(size):
+    return f"{size / 1024 / 1024:.1f} MiB" if size else "?"
+
+
+class Preview:
+    def __init__(self, url, info=None, download_type="Video", quality="Best",
+                 policy=DEFAULT_POLICY, error=None):
+        self.url = url
+        self.error = error
+        self.title = None
+        self.duration = None
+        self.heights = []  # distinct picture heights offered, ascending
+        self.sizes = {}  # quality label -> expected bytes (None when unknown)
+        self.choice = None  # what download_type/quality would download
+        if info is None:
+            return
+        self.title = info.get('title')
+        self.duration = info.get('duration')
+        formats = info.get('formats') or [info]
+        self.heights = sorted({f['height'] for f in formats if has_video(f) and f.get('height')})
+        for label in [f"{h}p" for h in self.heights] + ["Best"]:
+            choice = select(formats, "Video", label, self.duration, policy, VIDEO_CONTAINER)
+            self.sizes[label] = choice.expected_bytes if choice else None
+        container = VIDEO_CONTAINER if download_type == "Video" else None
+        self.choice = select(formats, download_type, quality, self.duration, policy, container)
+
+    def describe(self):
+        if self.error is not None:
+            return f"Error: {self.error}"
+        sizes = ", ".join(f"{label} {format_size(size)}" for label, size in self.sizes.items())
+        chosen = self.choice.describe() if self.choice else "no matching format"
+        return f"{self.title} [{format_duration(self.duration)}] {sizes} -> {chosen}"
+
+
+def quality_options(previews):
+    # Every height offered by any of the videos; select() caps per video
+    heights = sorted({h for p in previews if p.error is None for h in p.heights})
+    return [f"{h}p" for h in heights] + ["Best"]
+
+
+def list_urls(source, max_entries=None):
+    # Only the pages holding the first max_entries videos are requested
+    return [entry_url(e) for e in itertools.islice(iter_entries(source), max_entries)]
+
+
+class Prefetcher:
+    def __init__(self, fanout=DEFAULT_FANOUT, info_cache=None, ydl_opts=None, policy=DEFAULT_POLICY):
+        self.fanout = fanout
+        self.info_cache = info_cache if info_cache is not None else get_info_cache()
+        self.ydl_opts = {'quiet': True, 'no_warnings': True, 'skip_download': True}
+        self.ydl_opts.update(ydl_opts or {})
+        self.policy = policy
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def run(self, sources, download_type="Video", quality="Best", max_entries=None):
+        # Generator of Previews in completion order; max_entries caps the
+        # videos probed per playlist (the GUIs only need a sample for the menus)
+        pool = ThreadPoolExecutor(self.fanout, thread_name_prefix="ytdl-prefetch")
+        pending = {}  # future -> (listing?, source or URL)
+        seen = set()
+        try:
+            for source in expand_sources(sources):
+                pending[pool.submit(list_urls, source, max_entries)] = (True, source)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    listing, url = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        yield Preview(url, error=str(e))
+                        continue
+                    if not listing:
+                        yield result
+                        continue
+                    for entry in result:
+                        if entry and entry not in seen:
+                            seen.add(entry)
+                            pending[pool.submit(self.probe, entry, download_type, quality)] = (False, entry)
+        finally:
+            # Also reached when the caller stops iterating early; extractions
+            # still running finish on their own and their sessions are dropped
+            pool.shutdown(wait=False, cancel_futures=True)
+            if not pending:
+                self.close()
+
+    def probe(self, url, download_type="Video", quality="Best"):
+        info = self.info_cache.get(url) if self.info_cache is not None else None
+        if info is None:
+            ydl = self._ydl()
+            info = ydl.extract_info(url, download=False, process=False)
+            if not info:
+                return Preview(url, error="no information extracted")
+            if self.info_cache is not None:
+                info = ydl.sanitize_info(info)
+                self.info_cache.put(url, info)
+        return Preview(url, info, download_type, quality, self.policy)
+
+    def _ydl(self):
+        # One YoutubeDL per fan-out thread; instances are not thread-safe
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            ydl = self._local.ydl = yt_dlp.YoutubeDL(dict(self.ydl_opts))
+            with self._lock:
+                self._sessions.append(ydl)
+        return ydl
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for ydl in sessions:
+            ydl.close()
@@ -0,0 +1,122 @@
+import time
+import threading
+
+# Coalescing progress aggregator.
+# yt-dlp calls progress hooks for every chunk; the bus only keeps the newest
+# state per job and the UI pulls changed states at a fixed rate, so redraws
+# stay at max_rate per second no matter how many jobs or chunks there are.
+
+DEFAULT_MAX_RATE = 10  # UI updates per second
+SPEED_SMOOTHING = 0.3  # EMA weight of the newest speed sample
+SPEED_WINDOW = 0.5  # seconds of transfer per speed sample
+
+
+class JobProgress:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.status = "queued"
+        self.filename = None
+        self.downloaded = 0
+        self.total = 0
+        self.speed = None
+        self.eta = None
+        # filename -> [downloaded, total, finished]; video and audio may run at once
+        self.streams = {}
+        self._window_time = None
+        self._window_bytes = 0
+
+    @property
+    def percent(self):
+        if self.status == "finished":
+            return 100.0
+        return self.downloaded / self.total * 100 if self.total else 0.0
+
+    def update(self, d, now):
+        self.filename = d.get('filename')
+        stream = self.streams.setdefault(self.filename, [0, 0, False])
+        stream[0] = d.get('downloaded_bytes') or 0
+        stream[1] = d.get('total_bytes') or d.get('total_bytes_estimate') or stream[0]
+        stream[2] = d['status'] == 'finished'
+
+        self.status = "finished" if all(s[2] for s in self.streams.values()) else "downloading"
+        self.downloaded = sum(s[0] for s in self.streams.values())
+        self.total = sum(s[1] for s in self.streams.values())
+
+        # Speed samples over SPEED_WINDOW across all streams, smoothed with an EMA
+        if self._window_time is None:
+            self._window_time, self._window_bytes = now, self.downloaded
+        elif now - self._window_time >= SPEED_WINDOW:
+            raw = max(0, self.downloaded - self._window_bytes) / (now - self._window_time)
+            if self.speed is None:
+                self.speed = raw
+            else:
+                self.speed = SPEED_SMOOTHING * raw + (1 - SPEED_SMOOTHING) * self.speed
+            self._window_time, self._window_bytes = now, self.downloaded
+        if self.speed is None and d.get('speed') is not None:
+            self.speed = d['speed']
+
+        if self.speed and self.total:
+            self.eta = max(0, self.total - self.downloaded) / self.speed
+        else:
+            self.eta = d.get('eta')
+
+    def text(self):
+        if self.status == "downloading":
+            speed = (self.speed or 0) / 1024
+            eta = int(self.eta) if self.eta is not None else 0
+            return f"Downloading... {int(self.percent)}% | {speed:.1f} KB/s | ETA: {eta}s"
+        if self.status == "finished":
+            return "Processing..."
+        return self.status.capitalize()
+
+
+class ProgressBus:
+    def __init__(self, max_rate=DEFAULT_MAX_RATE):
+        self.max_rate = max_rate
+        self.jobs = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    @property
+    def interval(self):
+        # Seconds between UI drains
+        return 1.0 / self.max_rate
+
+    # Called from worker threads: cheap, never touches the UI
+    def hook(self, job, d):
+        now = time.monotonic()
+        with self._lock:
+            state = self.jobs.get(job.id)
+            if state is None:
+                state = self.jobs[job.id] = JobProgress(job.id)
+            state.update(d, now)
+            self._dirty.add(job.id)
+
+    def set_status(self, job, status):
+        with self._lock:
+            state = self.jobs.get(job.id)
+            if state is None:
+                state = self.jobs[job.id] = JobProgress(job.id)
+            state.status = status
+            self._dirty.add(job.id)
+
+    def forget(self, job_id):
+        with self._lock:
+            self.jobs.pop(job_id, None)
+            self._dirty.discard(job_id)
+
+    # Called from the UI thread: states changed since the last drain
+    def drain(self):
+        with self._lock:
+            changed = [self.jobs[job_id] for job_id in self._dirty if job_id in self.jobs]
+            self._dirty.clear()
+        return changed
+
+    def totals(self):
+        # Overall (downloaded, total, speed) across all tracked jobs
+        with self._lock:
+            states = list(self.jobs.values())
+        downloaded = sum(s.downloaded for s in states)
+        total = sum(s.total for s in states)
+        speed = sum(s.speed or 0 for s in states if s.status == "downloading")
+        return downloaded, total, speed
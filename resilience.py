@@ -0,0 +1,155 @@
+import re
+import random
+import socket
+import threading
+import http.client
+import yt_dlp
+
+# Shared retry policy.
+# Failures are sorted into classes that call for different handling:
+# throttling backs off for long, expired stream URLs are re-extracted right
+# away, network resets retry quickly, extractor breakage gets a couple of
+# slow attempts and everything else (private, removed, geo-blocked) fails at
+# once. Retries resume from the .part files, and yt-dlp's own HTTP and
+# fragment retries use the same jittered backoff, so a flaky link costs the
+# missing bytes, not the whole file. Every retry is counted in `stats`.
+
+THROTTLED = "throttled"
+EXPIRED = "expired"
+NETWORK = "network"
+EXTRACTOR = "extractor"
+FATAL = "fatal"
+
+# class -> (job-level attempts, base delay, max delay) in seconds
+POLICIES = {
+    THROTTLED: (5, 5.0, 120.0),
+    EXPIRED: (2, 0.5, 2.0),
+    NETWORK: (5, 1.0, 30.0),
+    EXTRACTOR: (2, 2.0, 20.0),
+    FATAL: (0, 0, 0),
+}
+
+# yt-dlp's in-download retries (per request / per fragment)
+HTTP_RETRIES = 10
+FRAGMENT_RETRIES = 10
+
+FATAL_PATTERNS = re.compile(
+    r"private video|video unavailable|not available|has been removed|copyright|"
+    r"sign in to confirm your age|members-only|unsupported url|is not a valid url|no video formats",
+    re.IGNORECASE)
+NETWORK_ERRORS = (ConnectionError, TimeoutError, socket.timeout, socket.gaierror, http.client.HTTPException)
+
+
+def http_status(error):
+    status = getattr(error, 'status', None) or getattr(error, 'code', None)
+    if isinstance(status, int):
+        return status
+    match = re.search(r"HTTP Error (\d{3})", str(error))
+    return int(match.group(1)) if match else None
+
+
+def _causes(error):
+    # The error and whatever it wraps; yt-dlp keeps the original in exc_info
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        exc_info = getattr(error, 'exc_info', None)
+        wrapped = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        error = wrapped or error.__cause__ or error.__context__
+
+
+def classify(error):
+    causes = list(_causes(error))
+    for cause in causes:
+        status = http_status(cause)
+        if status == 429:
+            return THROTTLED
+        if status in (403, 410):
+            # Signed googlevideo URLs answer 403 once they expire
+            return EXPIRED
+        if status is not None and status >= 500:
+            return NETWORK
+    for cause in causes:
+        if isinstance(cause, NETWORK_ERRORS):
+            return NETWORK
+    message = str(error)
+    if FATAL_PATTERNS.search(message):
+        return FATAL
+    if any(isinstance(c, yt_dlp.utils.ExtractorError) and not getattr(c, 'expected', False) for c in causes):
+        return EXTRACTOR
+    if re.search(r"timed out|connection (reset|refused|aborted)|temporary failure|incompleteread",
+                 message, re.IGNORECASE):
+        return NETWORK
+    if re.search(r"unable to (extract|download (webpage|api))", message, re.IGNORECASE):
+        return EXTRACTOR
+    return FATAL
+
+
+def backoff(attempt, base, cap):
+    # "Full jitter": uniform in [0, min(cap, base * 2^attempt)], so clients
+    # hit by the same outage do not retry in lockstep
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RetryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def add(self, kind, event, n=1):
+        # kind: an error class or a yt-dlp retry kind ('http', 'fragment', ...)
+        with self._lock:
+            counts = self.counters.setdefault(kind, {})
+            counts[event] = counts.get(event, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return {kind: dict(counts) for kind, counts in self.counters.items()}
+
+
+stats = RetryStats()
+
+
+class RetryPolicy:
+    def __init__(self, policies=None, stats=stats):
+        self.policies = dict(POLICIES, **(policies or {}))
+        self.stats = stats
+
+    def next_delay(self, error, attempt):
+        # (error class, seconds to wait) or (error class, None) to give up
+        kind = classify(error)
+        attempts, base, cap = self.policies[kind]
+        self.stats.add(kind, 'errors')
+        if attempt >= attempts:
+            self.stats.add(kind, 'gave_up')
+            return kind, None
+        self.stats.add(kind, 'retries')
+        return kind, backoff(attempt, base, cap)
+
+    def recovered(self, kind):
+        self.stats.add(kind, 'recovered')
+
+
+def _sleep_function(kind, base, cap):
+    def sleep(n):
+        # yt-dlp calls this once per retry with the retry number
+        stats.add(kind, 'retries')
+        return backoff(n, base, cap)
+    return sleep
+
+
+def ydl_retry_opts():
+    # In-download retries for yt-dlp: resume the request / refetch the fragment only
+    return {
+        'retries': HTTP_RETRIES,
+        'fragment_retries': FRAGMENT_RETRIES,
+        'extractor_retries': 2,
+        'skip_unavailable_fragments': False,
+        'continuedl': True,
+        'retry_sleep_functions': {
+            'http': _sleep_function('http', 1.0, 30.0),
+            'fragment': _sleep_function('fragment', 0.5, 10.0),
+            'extractor': _sleep_function('extractor', 2.0, 20.0),
+        },
+    }
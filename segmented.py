@@ -0,0 +1,310 @@
+import os
+import time
+import queue
+import threading
+import yt_dlp
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import RequestError
+from resilience import backoff, stats as retry_stats
+
+# Multi-connection segmented HTTP download.
+# The file is split into byte ranges that a small pool of connections
+# fetches concurrently; every range is written in place into a
+# preallocated .part file, which is renamed when all ranges are done.
+# Servers without Range support fall back to a single streamed request.
+# Requests go through YoutubeDL.urlopen, so proxy, certificate and cookie
+# options apply. Finished ranges are listed in a .segments file next to the
+# .part file; an interrupted download continues with the ranges still missing
+# (or, for a streamed .part file, from its size).
+
+DEFAULT_CONNECTIONS = 4
+MIN_SEGMENT = 1024 * 1024  # smaller files are not worth splitting
+READ_SIZE = 64 * 1024
+SEGMENT_RETRIES = 3
+SEGMENTS_SUFFIX = ".segments"
+
+
+class SegmentError(Exception):
+    pass
+
+
+class HttpConnection:
+    # Requests of one worker; the first redirect target is reused for later ranges
+    def __init__(self, urlopen, url, headers):
+        self.urlopen = urlopen
+        self.url = url
+        # Byte offsets must match the file, not a decompressed body
+        self.headers = dict({'Accept-Encoding': 'identity'}, **headers)
+        self.resp = None
+
+    def get(self, start=None, end=None):
+        self.close()
+        headers = dict(self.headers)
+        if start is not None:
+            headers['Range'] = f"bytes={start}-{end if end is not None else ''}"
+        self.resp = self.urlopen(Request(self.url, headers=headers))
+        self.url = self.resp.url or self.url
+        return self.resp
+
+    def close(self):
+        if self.resp is not None:
+            self.resp.close()
+            self.resp = None
+
+
+def probe(urlopen, url, headers=None):
+    # (total size or None, whether byte ranges are supported)
+    conn = HttpConnection(urlopen, url, headers or {})
+    try:
+        resp = conn.get(0, 0)
+        resp.read()
+        if resp.status == 206:
+            content_range = resp.headers.get('Content-Range') or ""
+            total = content_range.rpartition("/")[2]
+            return (int(total) if total.isdigit() else None), True
+        if resp.status == 200:
+            length = resp.headers.get('Content-Length')
+            return (int(length) if length and length.isdigit() else None), False
+        raise SegmentError(f"HTTP Error {resp.status}: {resp.reason}")
+    finally:
+        conn.close()
+
+
+def _done_ranges(part):
+    # (start, end) byte ranges already in the .part file
+    try:
+        size = os.path.getsize(part)
+    except OSError:
+        return []
+    try:
+        with open(part + SEGMENTS_SUFFIX) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        # Written front to back by a single stream
+        return [(0, size - 1)] if size else []
+    done = []
+    for line in lines:
+        fields = line.split()
+        # The last line may have been cut off by a crash
+        if len(fields) == 2 and all(field.isdigit() for field in fields):
+            done.append((int(fields[0]), int(fields[1])))
+    return sorted(done)
+
+
+def _missing(done, total, seg_size):
+    # Segments of at most seg_size covering every byte not in done
+    segments = []
+    offset = 0
+    for start, end in done + [(total, total)]:
+        while offset < min(start, total):
+            stop = min(offset + seg_size, start)
+            segments.append((offset, stop - 1))
+            offset = stop
+        offset = max(offset, end + 1)
+    return segments
+
+
+def _discard(part):
+    for name in (part, part + SEGMENTS_SUFFIX):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+
+
+def _preallocate(path, size):
+    # Keeps what an earlier attempt wrote; only grows the file
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        if os.fstat(f.fileno()).st_size < size:
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+            except (AttributeError, OSError):
+                f.truncate(size)
+
+
+def _single_stream(urlopen, url, part, headers, report, offset=0):
+    # offset: bytes at the start of part that are kept; needs Range support
+    conn = HttpConnection(urlopen, url, headers)
+    try:
+        resp = conn.get(offset) if offset else conn.get()
+        if resp.status not in (200, 206):
+            raise SegmentError(f"HTTP Error {resp.status}: {resp.reason}")
+        if resp.status == 200 and offset:
+            # The server sent the whole file after all; progress starts over
+            report(-offset)
+            offset = 0
+        with open(part, "r+b" if offset else "wb") as f:
+            f.seek(offset)
+            f.truncate()
+            while True:
+                data = resp.read(READ_SIZE)
+                if not data:
+                    break
+                f.write(data)
+                report(len(data))
+    finally:
+        conn.close()
+
+
+def segmented_download(urlopen, url, path, connections=DEFAULT_CONNECTIONS, headers=None, progress=None,
+                       min_segment=MIN_SEGMENT, resume=True):
+    # urlopen: YoutubeDL.urlopen. progress(downloaded, total) is called from
+    # the worker threads, first with the bytes a resumed .part file holds
+    headers = dict(headers or {})
+    headers.pop('Range', None)
+    total, ranges = probe(urlopen, url, headers)
+    part = path + ".part"
+    if not resume:
+        _discard(part)
+    done = _done_ranges(part)
+    if total and done and done[-1][1] >= total:
+        # Left over from a different file; start again
+        _discard(part)
+        done = []
+
+    lock = threading.Lock()
+    state = {'downloaded': sum(end - start + 1 for start, end in done) if ranges and total else 0}
+
+    def report(n):
+        with lock:
+            state['downloaded'] += n
+            downloaded = state['downloaded']
+        if progress:
+            progress(downloaded, total)
+
+    connections = max(1, int(connections))
+    if not ranges or not total or total < 2 * min_segment or connections == 1:
+        # Continues after the leading run of finished bytes, when the server allows it
+        offset = done[0][1] + 1 if ranges and total and done and done[0][0] == 0 else 0
+        state['downloaded'] = offset
+        report(0)
+        if offset < (total or 1):
+            # Single-stream files are resumed by size from here on
+            if os.path.exists(part + SEGMENTS_SUFFIX):
+                os.remove(part + SEGMENTS_SUFFIX)
+            _single_stream(urlopen, url, part, headers, report, offset)
+        os.replace(part, path)
+        return total or state['downloaded']
+
+    # Several ranges per connection so fast connections pick up more of the work
+    seg_size = max(min_segment, -(-total // (connections * 4)))
+    segments = queue.Queue()
+    for segment in _missing(done, total, seg_size):
+        segments.put(segment)
+
+    _preallocate(part, total)
+    errors = []
+    segments_file = open(part + SEGMENTS_SUFFIX, "a")
+    if not os.path.getsize(part + SEGMENTS_SUFFIX):
+        # A streamed .part file becomes a segmented one: keep its bytes listed
+        for start, end in done:
+            segments_file.write(f"{start} {end}\n")
+        segments_file.flush()
+    report(0)
+
+    def finished(start, end):
+        with lock:
+            segments_file.write(f"{start} {end}\n")
+            segments_file.flush()
+
+    def fetch(conn, fd, start, end):
+        offset = start
+        try:
+            for attempt in range(SEGMENT_RETRIES + 1):
+                try:
+                    resp = conn.get(offset, end)
+                    if resp.status != 206:
+                        raise SegmentError(f"HTTP Error {resp.status}: {resp.reason}")
+                    while offset <= end:
+                        if errors:
+                            return
+                        data = resp.read(min(READ_SIZE, end - offset + 1))
+                        if not data:
+                            raise SegmentError("Connection closed mid-range")
+                        os.lseek(fd, offset, os.SEEK_SET)
+                        os.write(fd, data)
+                        offset += len(data)
+                        report(len(data))
+                    return
+                except (OSError, RequestError, SegmentError):
+                    # Resume the range where it stopped on a fresh connection
+                    conn.close()
+                    if attempt == SEGMENT_RETRIES:
+                        raise
+                    retry_stats.add('segment', 'retries')
+                    time.sleep(backoff(attempt, 0.5, 10.0))
+        finally:
+            # Partly fetched ranges count too when the download is resumed
+            if offset > start:
+                finished(start, offset - 1)
+
+    def worker():
+        conn = HttpConnection(urlopen, url, headers)
+        fd = os.open(part, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+        try:
+            while not errors:
+                try:
+                    start, end = segments.get_nowait()
+                except queue.Empty:
+                    return
+                fetch(conn, fd, start, end)
+        except BaseException as e:
+            # Includes cancellation raised by progress hooks; stops the other workers too
+            errors.append(e)
+        finally:
+            os.close(fd)
+            conn.close()
+
+    threads = [threading.Thread(target=worker, name=f"ytdl-segment-{i + 1}", daemon=True)
+               for i in range(min(connections, segments.qsize()))]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        segments_file.close()
+
+    if errors:
+        raise errors[0]
+    os.replace(part, path)
+    os.remove(part + SEGMENTS_SUFFIX)
+    return total
+
+
+class SegmentedYoutubeDL(yt_dlp.YoutubeDL):
+    # YoutubeDL that fetches plain HTTP(S) formats with segmented_download;
+    # fragmented formats (DASH/HLS) keep yt-dlp's own downloaders
+    def __init__(self, params=None, connections=DEFAULT_CONNECTIONS, **kwargs):
+        super().__init__(params, **kwargs)
+        self.connections = connections
+
+    def dl(self, name, info, subtitle=False, test=False):
+        if test or subtitle or name == "-" or info.get('protocol') not in ('http', 'https') or not info.get('url'):
+            return super().dl(name, info, subtitle, test)
+        if os.path.exists(name) and self.params.get('continuedl', True):
+            return True, False
+
+        started = time.monotonic()
+        status = {'filename': name, 'info_dict': info}
+
+        resumed = []
+
+        def progress(downloaded, total):
+            if not resumed:
+                resumed.append(downloaded)  # already in the .part file
+            elapsed = time.monotonic() - started
+            speed = (downloaded - resumed[0]) / elapsed if elapsed > 0 else None
+            self._report_progress(dict(status, status='downloading', downloaded_bytes=downloaded,
+                                       total_bytes=total, speed=speed, elapsed=elapsed,
+                                       eta=(total - downloaded) / speed if speed and total else None))
+
+        total = segmented_download(self.urlopen, info['url'], name, self.connections, self._calc_headers(info),
+                                   progress, resume=self.params.get('continuedl', True))
+        self._report_progress(dict(status, status='finished', downloaded_bytes=total,
+                                   total_bytes=total, elapsed=time.monotonic() - started))
+        return True, True
+
+    def _report_progress(self, d):
+        for hook in self._progress_hooks:
+            hook(d)
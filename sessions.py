@@ -0,0 +1,112 @@
+import json
+import threading
+import contextlib
+from collections import OrderedDict
+
+# Pool of long-lived YoutubeDL sessions.
+# Building a YoutubeDL per job throws away the extractor instances (and with
+# them YouTube's cached player JS / signature functions), the HTTP keep-alive
+# connections, TLS sessions and cookies. Sessions are kept per option profile
+# (everything except the per-job output template, format selector and hooks)
+# and lent to one job at a time; before each job those per-job fields are
+# swapped in and the post-processors added by the previous job are dropped.
+
+# Options that differ from job to job and are swapped on a borrowed session
+PER_JOB_KEYS = ('outtmpl', 'format', 'progress_hooks', 'postprocessor_hooks')
+MAX_PROFILES = 8
+
+
+def _describe(value):
+    # Functions (retry sleeps, hooks) compare by name: a new closure per job
+    # must not make every job a new profile
+    return getattr(value, '__qualname__', None) or repr(value)
+
+
+def profile_key(ydl_opts, kind=""):
+    opts = {k: v for k, v in ydl_opts.items() if k not in PER_JOB_KEYS}
+    return kind + json.dumps(opts, sort_keys=True, default=_describe)
+
+
+class SessionPool:
+    def __init__(self, max_idle=4, max_profiles=MAX_PROFILES):
+        # Idle sessions kept per profile; usually the number of workers
+        self.max_idle = max_idle
+        self.max_profiles = max_profiles
+        self.created = 0
+        self.reused = 0
+        self._idle = OrderedDict()  # profile key -> [(ydl, post-processors it was built with)]
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def session(self, ydl_opts, factory, kind=""):
+        # factory(ydl_opts) builds a new YoutubeDL when no idle one fits
+        key = profile_key(ydl_opts, kind)
+        entry = None
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                entry = idle.pop()
+                self._idle.move_to_end(key)
+                self.reused += 1
+        if entry is None:
+            ydl = factory(ydl_opts)
+            entry = (ydl, {when: list(pps) for when, pps in ydl._pps.items()})
+            with self._lock:
+                self.created += 1
+        else:
+            self._prepare(entry, ydl_opts)
+        try:
+            yield entry[0]
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                # Interrupted mid-job: state unknown, do not lend it out again
+                entry[0].close()
+                raise
+            self._give_back(key, entry)
+            raise
+        self._give_back(key, entry)
+
+    @staticmethod
+    def _prepare(entry, ydl_opts):
+        ydl, pps = entry
+        fmt = ydl_opts.get('format')
+        ydl.params['format'] = fmt
+        # YoutubeDL builds its selector once in __init__ and only uses that copy
+        if fmt in (None, '-') or callable(fmt):
+            ydl.format_selector = fmt
+        else:
+            ydl.format_selector = ydl.build_format_selector(fmt)
+        outtmpl = ydl_opts.get('outtmpl')
+        ydl.params['outtmpl'] = dict(outtmpl) if isinstance(outtmpl, dict) else {'default': outtmpl}
+        if hasattr(ydl, '_parse_outtmpl'):
+            ydl._parse_outtmpl()  # fills in the other template types
+        ydl._progress_hooks = list(ydl_opts.get('progress_hooks') or [])
+        ydl._postprocessor_hooks = list(ydl_opts.get('postprocessor_hooks') or [])
+        # Back to the profile's own post-processors, reporting to this job's hooks
+        ydl._pps = {when: list(items) for when, items in pps.items()}
+        for items in ydl._pps.values():
+            for pp in items:
+                pp._progress_hooks = list(ydl._postprocessor_hooks)
+        ydl._download_retcode = 0
+
+    def _give_back(self, key, entry):
+        evicted = []
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) < self.max_idle:
+                idle.append(entry)
+            else:
+                evicted.append(entry)
+            while len(self._idle) > self.max_profiles:
+                _, old = self._idle.popitem(last=False)
+                evicted.extend(old)
+        for ydl, _ in evicted:
+            ydl.close()
+
+    def close(self):
+        with self._lock:
+            entries = [e for idle in self._idle.values() for e in idle]
+            self._idle.clear()
+        for ydl, _ in entries:
+            ydl.close()  # also saves the cookie jar
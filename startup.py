@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import threading
+import importlib
+
+# Startup timing and background loading of the download stack.
+# The GUIs draw their first frame without importing yt-dlp (engine, batch
+# and friends pull it in); warm_up() loads it on a background thread right
+# after, and a download started before that simply waits for the import.
+# Set YTDL_STARTUP_TRACE=1 to print the milestones to stderr:
+#
+#   [startup] imports: 412 ms
+#   [startup] first frame: 655 ms
+#   [startup] download stack ready: 1840 ms
+
+STARTED = time.perf_counter()
+TRACE = bool(os.environ.get("YTDL_STARTUP_TRACE"))
+
+# (milestone, seconds since this module was imported)
+marks = []
+
+# Modules that import yt-dlp; engine first, it is what everything else needs
+DOWNLOAD_STACK = ("engine", "batch")
+
+
+def mark(name):
+    elapsed = time.perf_counter() - STARTED
+    marks.append((name, elapsed))
+    if TRACE:
+        print(f"[startup] {name}: {elapsed * 1000:.0f} ms", file=sys.stderr, flush=True)
+    return elapsed
+
+
+def warm_up(modules=DOWNLOAD_STACK, callback=None):
+    # Import on a daemon thread; the import lock makes a concurrent
+    # "from engine import ..." on the UI thread wait instead of importing twice
+    def run():
+        try:
+            for name in modules:
+                importlib.import_module(name)
+        except ImportError as e:
+            # The first download reports it; nothing to show yet
+            mark(f"download stack failed: {e}")
+            return
+        mark("download stack ready")
+        if callback is not None:
+            callback()
+
+    thread = threading.Thread(target=run, name="ytdl-warm-up", daemon=True)
+    thread.start()
+    return thread
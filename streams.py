@@ -0,0 +1,64 @@
+import threading
+import yt_dlp
+
+# Concurrent fetching of the video and audio streams of a merged format.
+# yt-dlp downloads requested formats one after another; this mixin runs each
+# plain HTTP stream download on its own thread and waits for all of them just
+# before post-processing, so the merge starts as soon as both are complete.
+
+
+class ParallelStreamsMixin:
+    parallel_streams = True
+
+    def process_info(self, info_dict):
+        formats = info_dict.get('requested_formats') or []
+        if self.parallel_streams and len(formats) > 1 and all(
+                f.get('protocol') in ('http', 'https') for f in formats):
+            self._pending_streams = []
+        try:
+            return super().process_info(info_dict)
+        finally:
+            # Also reached when yt-dlp bails out before post-processing
+            pending = getattr(self, '_pending_streams', None)
+            self._pending_streams = None
+            if pending:
+                self._join_streams(pending, raise_errors=False)
+
+    def dl(self, name, info, subtitle=False, test=False):
+        pending = getattr(self, '_pending_streams', None)
+        if pending is None or test or subtitle:
+            return super().dl(name, info, subtitle, test)
+
+        result = {}
+
+        def run():
+            try:
+                result['value'] = super(ParallelStreamsMixin, self).dl(name, info, subtitle, test)
+            except BaseException as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=run, name="ytdl-stream", daemon=True)
+        thread.start()
+        pending.append((thread, result))
+        # Success is only known later; post_process checks the real outcome
+        return True, True
+
+    def post_process(self, filename, info, *args, **kwargs):
+        pending = getattr(self, '_pending_streams', None)
+        if pending:
+            self._pending_streams = []
+            self._join_streams(pending)
+        return super().post_process(filename, info, *args, **kwargs)
+
+    @staticmethod
+    def _join_streams(pending, raise_errors=True):
+        error = None
+        for thread, result in pending:
+            thread.join()
+            if error is None:
+                if 'error' in result:
+                    error = result['error']
+                elif not result.get('value', (False,))[0]:
+                    error = yt_dlp.utils.DownloadError("Stream download failed")
+        if error is not None and raise_errors:
+            raise error
@@ -0,0 +1,183 @@
+import os
+import time
+import sqlite3
+import threading
+from batch import entry_url, iter_entries
+from info_cache import video_id
+
+# Incremental channel / playlist sync.
+# Every synced source keeps the IDs of the entries listed so far (and which
+# of them finished downloading) plus a last-checked marker: the newest entry
+# of the previous listing. A re-sync pages through the flat listing lazily
+# and, for channels (newest first), leaves each tab as soon as it reaches the
+# marker or a run of known entries, so an unchanged channel costs one page
+# request per tab.
+# Playlists append at the end and are always listed in full, but only their
+# new entries become jobs. Entries whose download failed stay pending and are
+# retried on the next sync.
+
+DEFAULT_SYNC_PATH = os.path.join(os.path.expanduser("~"), ".yt_downloader", "sync.sqlite3")
+# Consecutive known entries that end a listing when the marker was deleted
+KNOWN_STREAK = 5
+# Listing shapes that put the newest upload first
+NEWEST_FIRST_MARKERS = ("/channel/", "/c/", "/user/", "/@")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    url TEXT PRIMARY KEY,
+    save_path TEXT NOT NULL,
+    download_type TEXT NOT NULL,
+    quality TEXT NOT NULL,
+    interval REAL,
+    marker TEXT,
+    complete INTEGER DEFAULT 0,
+    last_checked REAL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    source TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    done INTEGER DEFAULT 0,
+    first_seen REAL NOT NULL,
+    PRIMARY KEY (source, video_id)
+);
+"""
+
+
+def newest_first(url):
+    return any(marker in url for marker in NEWEST_FIRST_MARKERS) and "list=" not in url
+
+
+class SyncSource:
+    def __init__(self, row):
+        (self.url, self.save_path, self.download_type, self.quality, self.interval,
+         self.marker, complete, self.last_checked) = row
+        self.complete = bool(complete)
+
+    def due(self, now=None):
+        if not self.interval:
+            return False
+        return self.last_checked is None or (now or time.time()) >= self.last_checked + self.interval
+
+
+class SyncStore:
+    def __init__(self, path=DEFAULT_SYNC_PATH, known_streak=KNOWN_STREAK):
+        self.path = path
+        self.known_streak = known_streak
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cur
+
+    def register(self, url, save_path, download_type="Video", quality="Best", interval=None):
+        # Keeps the sync state; settings and interval follow the latest request
+        self._execute(
+            "INSERT INTO sources (url, save_path, download_type, quality, interval) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(url) DO UPDATE SET save_path = excluded.save_path,"
+            " download_type = excluded.download_type, quality = excluded.quality,"
+            " interval = COALESCE(excluded.interval, interval)",
+            (url, save_path, download_type, quality, interval))
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM sources WHERE url = ?", (url,)).fetchone()
+        return SyncSource(row) if row else None
+
+    def sources(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM sources ORDER BY url").fetchall()
+        return [SyncSource(row) for row in rows]
+
+    def due(self, now=None):
+        return [s for s in self.sources() if s.due(now)]
+
+    def remove(self, url):
+        self._execute("DELETE FROM entries WHERE source = ?", (url,))
+        self._execute("DELETE FROM sources WHERE url = ?", (url,))
+
+    def refresh(self, url, extra_opts=None):
+        # Lists only what is new since the last sync; returns every entry URL
+        # still to download (new ones and earlier failures)
+        source = self.get(url)
+        if source is None:
+            raise KeyError(f"not a synced source: {url}")
+        with self._lock:
+            known = {row[0] for row in self._conn.execute(
+                "SELECT video_id FROM entries WHERE source = ?", (url,))}
+        # Early stop is only safe once a listing has gone all the way down
+        stop_early = source.complete and newest_first(url)
+        marker = None
+        new = []
+        streak = 0
+        complete = False
+        entries = iter_entries(url, extra_opts)
+        skip = None
+        try:
+            while True:
+                try:
+                    # skip ends the current listing; a channel goes on with its next tab
+                    entry = entries.send(skip)
+                except StopIteration:
+                    complete = True
+                    break
+                skip = None
+                target = entry_url(entry)
+                vid = entry.get('id') or video_id(target)
+                if marker is None:
+                    marker = vid
+                if vid in known:
+                    streak += 1
+                    if stop_early and (vid == source.marker or streak >= self.known_streak):
+                        skip = True
+                        streak = 0
+                    continue
+                streak = 0
+                known.add(vid)
+                new.append((url, vid, target, time.time()))
+        finally:
+            # A listing that failed half-way keeps the pages it got, but the
+            # next sync lists everything again to close the gap
+            self._save(url, new, marker if complete else None, complete)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url FROM entries WHERE source = ? AND done = 0 ORDER BY first_seen", (url,)).fetchall()
+        return [row[0] for row in rows]
+
+    def _save(self, url, new, marker, complete):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO entries (source, video_id, url, first_seen) VALUES (?, ?, ?, ?)", new)
+            self._conn.execute(
+                "UPDATE sources SET marker = COALESCE(?, marker), complete = ?, last_checked = ? WHERE url = ?",
+                (marker, int(complete), time.time(), url))
+            self._conn.commit()
+
+    def mark_done(self, url, entry):
+        self._execute("UPDATE entries SET done = 1 WHERE source = ? AND url = ?", (url, entry))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_sync_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = SyncStore()
+            except (OSError, sqlite3.Error):
+                return None  # no writable storage: sync falls back to full listings
+        return _store
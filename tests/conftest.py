@@ -0,0 +1,26 @@
+import os
+import sys
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def fmt(format_id, ext, vcodec="none", acodec="none", height=None, tbr=None, abr=None):
+    return {'format_id': format_id, 'ext': ext, 'vcodec': vcodec, 'acodec': acodec,
+            'height': height, 'width': height and height * 16 // 9, 'fps': 30,
+            'tbr': tbr, 'abr': abr, 'protocol': 'https', 'url': f"https://x/{format_id}"}
+
+
+@pytest.fixture
+def formats():
+    # A YouTube-like list where vp9 is the cheapest video at every height
+    return [
+        fmt('18', 'mp4', 'avc1.42001E', 'mp4a.40.2', 360, 600),
+        fmt('134', 'mp4', 'avc1.4d401e', height=360, tbr=300),
+        fmt('243', 'webm', 'vp9', height=360, tbr=220),
+        fmt('137', 'mp4', 'avc1.640028', height=1080, tbr=4000),
+        fmt('248', 'webm', 'vp9', height=1080, tbr=2600),
+        fmt('140', 'm4a', acodec='mp4a.40.2', tbr=130, abr=130),
+        fmt('251', 'webm', acodec='opus', tbr=140, abr=140),
+    ]
@@ -0,0 +1,155 @@
+import json
+import asyncio
+import threading
+from api import JobServer
+from engine import DownloadEngine, FINISHED, CANCELLED, RUNNING
+
+
+class HeldEngine(DownloadEngine):
+    # Jobs stay running until released, then finish without downloading
+    def __init__(self):
+        super().__init__(1)
+        self.release = threading.Event()
+
+    def run(self, job):
+        job.status = RUNNING
+        self.release.wait(5)
+        self._finish(job, CANCELLED if job.cancel_requested else FINISHED)
+        return job
+
+
+async def request(port, method, path, body=None, headers=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    if isinstance(body, (dict, list, int)):
+        body = json.dumps(body)
+    body = (body or "").encode("utf-8")
+    head = [f"{method} {path} HTTP/1.1", "Host: localhost"]
+    head += [f"{name}: {value}" for name, value in (headers or {'Content-Length': len(body)}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    head, _, payload = data.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    return status, json.loads(payload) if payload else None
+
+
+def serve(test, engine=None):
+    # Runs test(server) against a server on a free port
+    async def run():
+        server = JobServer(engine or HeldEngine(), port=0)
+        await server.start()
+        server.port = server._server.sockets[0].getsockname()[1]
+        try:
+            return await test(server)
+        finally:
+            if isinstance(server.engine, HeldEngine):
+                server.engine.release.set()
+            await server.close()
+    return asyncio.run(run())
+
+
+def test_close_cancels_progress_pump():
+    async def run():
+        server = JobServer(DownloadEngine(1), port=0)
+        await server.start()
+        pump = server._pump
+        assert not pump.done()
+        await server.close()
+        return pump
+
+    assert asyncio.run(run()).cancelled()
+
+
+def test_invalid_content_length_is_rejected():
+    async def test(server):
+        for length in ("abc", "-5", "1e3"):
+            status, payload = await request(server.port, "POST", "/jobs", "{}", {'Content-Length': length})
+            assert status == 400, length
+            assert payload == {'error': "invalid Content-Length"}
+
+    serve(test)
+
+
+def test_submit_validation():
+    async def test(server):
+        bad = [
+            ("not json", "body must be JSON"),
+            ([], "'url' is required"),
+            ({}, "'url' is required"),
+            ({'url': 5}, "'url' must be a string"),
+            ({'url': "https://x/v", 'output': ["/tmp"]}, "'output' must be a string"),
+            ({'url': "https://x/v", 'quality': 720}, "'quality' must be a string"),
+            ({'url': "https://x/v", 'type': "Image"}, "'type' must be Video or Audio"),
+        ]
+        for body, error in bad:
+            status, payload = await request(server.port, "POST", "/jobs", body)
+            assert (status, payload) == (400, {'error': error}), body
+        assert server.engine.list_jobs() == []
+
+        status, payload = await request(server.port, "POST", "/jobs", {'url': "https://x/v", 'type': "Audio"})
+        assert status == 201
+        assert (payload['type'], payload['quality']) == ("Audio", "192kbps")
+
+    serve(test)
+
+
+def test_get_and_delete_jobs():
+    async def test(server):
+        for method in ("GET", "DELETE"):
+            for path in ("/jobs/999", "/jobs/abc"):
+                status, payload = await request(server.port, method, path)
+                assert status == 404, (method, path)
+        _, first = await request(server.port, "POST", "/jobs", {'url': "https://x/1"})
+        _, second = await request(server.port, "POST", "/jobs", {'url': "https://x/2"})
+
+        status, payload = await request(server.port, "GET", f"/jobs/{first['id']}")
+        assert status == 200
+        assert payload['url'] == "https://x/1"
+        status, payload = await request(server.port, "GET", "/jobs")
+        assert [job['id'] for job in payload] == [first['id'], second['id']]
+
+        status, payload = await request(server.port, "DELETE", f"/jobs/{second['id']}")
+        assert status == 200
+        assert server.engine.get_job(second['id']).cancel_requested
+        server.engine.release.set()
+        server.engine.wait()
+        assert server.engine.get_job(second['id']).status == CANCELLED
+
+    serve(test)
+
+
+def test_status_filter():
+    async def test(server):
+        _, first = await request(server.port, "POST", "/jobs", {'url': "https://x/1"})
+        _, second = await request(server.port, "POST", "/jobs", {'url': "https://x/2"})
+        while server.engine.get_job(first['id']).status != RUNNING:
+            await asyncio.sleep(0.01)
+        _, queued = await request(server.port, "GET", "/jobs?status=queued")
+        assert [job['id'] for job in queued] == [second['id']]
+        _, both = await request(server.port, "GET", "/jobs?status=queued&status=running")
+        assert len(both) == 2
+        _, none = await request(server.port, "GET", "/jobs?status=finished")
+        assert none == []
+
+    serve(test)
+
+
+def test_job_event_stream_ends_with_the_job():
+    async def test(server):
+        _, job = await request(server.port, "POST", "/jobs", {'url': "https://x/1"})
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(f"GET /jobs/{job['id']}/events HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        assert (await reader.readline()).startswith(b"HTTP/1.1 200")
+        await asyncio.sleep(0.1)
+        server.engine.release.set()
+        # The server closes the stream after the terminal event
+        data = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        events = [json.loads(line[len(b"data: "):]) for line in data.splitlines() if line.startswith(b"data: ")]
+        assert events[0]['status'] in ("queued", RUNNING)
+        assert events[-1]['status'] == FINISHED
+        assert {event['id'] for event in events} == {job['id']}
+
+    serve(test)
@@ -0,0 +1,40 @@
+import os
+from archive import Archive, format_keys
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+def write(path, data=b"audio"):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_multi_target_outputs_are_archived_per_file(tmp_path):
+    archive = Archive(str(tmp_path / "archive.sqlite3"))
+    quality = "mp3:192+mp3:320+m4a"
+    paths = [write(tmp_path / "a.192k.mp3"), write(tmp_path / "a.320k.mp3"), write(tmp_path / "a.m4a")]
+    archive.record(URL, "Audio", quality, *paths)
+    assert archive.find(URL, "Audio", quality) == paths
+    # Each output also serves a request for just that target
+    assert archive.find(URL, "Audio", "m4a+mp3:320") == [paths[2], paths[1]]
+    # A single-target request is not an output of the multi-target one
+    assert archive.find(URL, "Audio", "192kbps") is None
+
+    os.remove(paths[1])
+    assert archive.find(URL, "Audio", quality) is None
+    assert archive.find(URL, "Audio", "mp3:192") == [paths[0]]
+    archive.close()
+
+
+def test_format_keys():
+    assert format_keys("Video", "720p") == ["Video:720p"]
+    assert format_keys("Audio", "192kbps") == ["Audio:192"]
+    assert format_keys("Audio", "192kbps+m4a") == ["Audio:mp3:192", "Audio:m4a:"]
+
+
+def test_playlist_url_does_not_hit_its_video(tmp_path):
+    archive = Archive(str(tmp_path / "archive.sqlite3"))
+    archive.record(URL, "Video", "Best", write(tmp_path / "a.mp4"))
+    assert archive.find(URL + "&list=PL0123456789", "Video", "Best") is None
+    archive.close()
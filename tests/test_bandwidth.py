@@ -0,0 +1,88 @@
+import time
+import datetime
+import threading
+import pytest
+from bandwidth import BandwidthLimiter, Meter, parse_rate, parse_schedule, INTERACTIVE, BATCH
+
+
+def test_parse_rate():
+    assert parse_rate("500K") == 500 * 1024
+    assert parse_rate("1.5M/s") == int(1.5 * 1024 ** 2)
+    assert parse_rate("2mb") == 2 * 1024 ** 2
+    assert parse_rate("1000") == 1000
+    for unlimited in ("", None, "0", "none", "off"):
+        assert parse_rate(unlimited) is None
+    with pytest.raises(ValueError):
+        parse_rate("fast")
+
+
+def test_parse_schedule():
+    assert parse_schedule("01:00-07:00=off, 09:00-18:30=1M,") == [(60, 420, None), (540, 1110, 1024 ** 2)]
+    assert parse_schedule("") == []
+    for bad in ("9-17", "09:00=1M", "9-17=fast", "nine-17=1M"):
+        with pytest.raises(ValueError):
+            parse_schedule(bad)
+
+
+def test_schedule_overrides_the_rate():
+    limiter = BandwidthLimiter(1000, schedule=parse_schedule("22:00-06:00=off,09:00-17:00=5K"))
+    at = lambda hour: datetime.datetime(2026, 1, 1, hour, 30)
+    assert limiter.current_rate(at(12)) == 5 * 1024
+    assert limiter.current_rate(at(23)) is None
+    assert limiter.current_rate(at(2)) is None
+    assert limiter.current_rate(at(7)) == 1000
+
+
+def test_rate_limits_throughput():
+    limiter = BandwidthLimiter(300_000)
+    start = time.monotonic()
+    for _ in range(31):
+        limiter.acquire(10_000)
+    # 310 KB at 300 KB/s, less the first chunk taken on credit
+    assert 0.9 <= time.monotonic() - start < 2
+
+
+def test_unlimited_never_waits():
+    limiter = BandwidthLimiter()
+    start = time.monotonic()
+    for _ in range(1000):
+        limiter.acquire(1 << 20)
+    assert time.monotonic() - start < 0.5
+
+
+def test_interactive_is_served_before_batch():
+    limiter = BandwidthLimiter(50_000)
+    limiter.acquire(100_000)  # two seconds of debt
+    served = []
+
+    def take(name, priority):
+        limiter.acquire(1000, priority)
+        served.append(name)
+
+    batch = threading.Thread(target=take, args=("batch", BATCH))
+    batch.start()
+    time.sleep(0.2)
+    interactive = threading.Thread(target=take, args=("interactive", INTERACTIVE))
+    interactive.start()
+    batch.join(5)
+    interactive.join(5)
+    assert served == ["interactive", "batch"]
+
+
+def test_meter_charges_new_bytes_only():
+    class Recorder:
+        def __init__(self):
+            self.charged = []
+
+        def acquire(self, nbytes, priority, cancelled):
+            self.charged.append((nbytes, priority))
+
+    limiter = Recorder()
+    meter = Meter(limiter, BATCH)
+    # Resumed from a .part file at 5000 bytes: only the baseline
+    meter({'status': 'downloading', 'filename': "v.mp4", 'downloaded_bytes': 5000})
+    meter({'status': 'downloading', 'filename': "v.mp4", 'downloaded_bytes': 8000})
+    meter({'status': 'downloading', 'filename': "a.m4a", 'downloaded_bytes': 100})
+    meter({'status': 'downloading', 'filename': "a.m4a", 'downloaded_bytes': 600})
+    meter({'status': 'finished', 'filename': "v.mp4", 'downloaded_bytes': 9000})
+    assert limiter.charged == [(3000, BATCH), (500, BATCH)]
@@ -0,0 +1,61 @@
+import batch
+from batch import iter_entries, entry_url
+
+CHANNEL = "https://www.youtube.com/@name"
+
+
+def video(vid):
+    return {'_type': 'url', 'ie_key': 'Youtube', 'id': vid, 'url': f"https://www.youtube.com/watch?v={vid}"}
+
+
+def tab(name):
+    return {'_type': 'url', 'ie_key': 'YoutubeTab', 'url': f"{CHANNEL}/{name}"}
+
+
+def listing(url):
+    # What flat extraction returns for url, without processing
+    return {
+        CHANNEL: {'_type': 'playlist', 'id': 'UCchannel', 'entries': iter([tab('videos'), tab('shorts')])},
+        f"{CHANNEL}/videos": {'_type': 'playlist', 'id': 'UCchannel-videos', 'entries': iter([video('a'), video('b')])},
+        f"{CHANNEL}/shorts": {'_type': 'playlist', 'id': 'UCchannel-shorts', 'entries': iter([video('c')])},
+        "https://www.youtube.com/c/old": {'_type': 'url', 'url': f"{CHANNEL}/shorts", 'ie_key': 'YoutubeTab'},
+    }[url]
+
+
+class FakeYoutubeDL:
+    requested = []
+
+    def __init__(self, opts):
+        FakeYoutubeDL.requested = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def extract_info(self, url, download=True, process=True, ie_key=None):
+        assert not download and not process
+        self.requested.append(url)
+        return listing(url)
+
+
+def test_channel_tabs_are_listed_video_by_video(monkeypatch):
+    monkeypatch.setattr(batch.yt_dlp, "YoutubeDL", FakeYoutubeDL)
+    entries = iter_entries(CHANNEL)
+    assert next(entries)['id'] == 'a'
+    # Later tabs are only requested when the caller gets that far
+    assert FakeYoutubeDL.requested == [CHANNEL, f"{CHANNEL}/videos"]
+    assert [e['id'] for e in entries] == ['b', 'c']
+
+
+def test_redirects_are_followed(monkeypatch):
+    monkeypatch.setattr(batch.yt_dlp, "YoutubeDL", FakeYoutubeDL)
+    assert [entry_url(e) for e in iter_entries("https://www.youtube.com/c/old")] == [
+        "https://www.youtube.com/watch?v=c"]
+
+
+def test_plain_video_links_are_not_listed(monkeypatch):
+    monkeypatch.setattr(batch.yt_dlp, "YoutubeDL", None)
+    url = "https://www.youtube.com/watch?v=abcdefghijk"
+    assert [entry_url(e) for e in iter_entries(url)] == [url]
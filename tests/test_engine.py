@@ -0,0 +1,121 @@
+import time
+import threading
+from archive import Archive
+from bandwidth import INTERACTIVE, BATCH
+from batch import Batch
+from engine import DownloadEngine, FINISHED
+import engine
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+def archived(tmp_path):
+    # An archive hit finishes a job without touching the network
+    archive = Archive(str(tmp_path / "archive.sqlite3"))
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"video")
+    archive.record(URL, "Video", "Best", str(path))
+    return archive
+
+
+def test_low_memory_keeps_recent_finished_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "FINISHED_KEPT", 2)
+    pool = DownloadEngine(1, archive=archived(tmp_path), low_memory=True)
+    jobs = [pool.submit(URL, str(tmp_path), "Video", "Best") for _ in range(3)]
+    pool.wait()
+    assert all(job.status == FINISHED for job in jobs)
+    assert pool.jobs == {}
+    assert pool.get_job(jobs[0].id) is None
+    assert pool.get_job(jobs[2].id) is jobs[2]
+    assert pool.list_jobs() == jobs[1:]
+    pool.shutdown()
+
+
+class RecordingEngine(DownloadEngine):
+    # Jobs block until released and record the order and overlap they ran in
+    def __init__(self, workers):
+        super().__init__(workers)
+        self.release = threading.Event()
+        self.started = []
+        self.running = 0
+        self.peak = 0
+        self._count_lock = threading.Lock()
+
+    def run(self, job):
+        with self._count_lock:
+            self.started.append(job.url)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        self.release.wait(5)
+        with self._count_lock:
+            self.running -= 1
+        self._finish(job, FINISHED)
+        return job
+
+
+def test_pool_runs_at_most_workers_jobs_at_once(tmp_path):
+    pool = RecordingEngine(2)
+    jobs = [pool.submit(f"{URL}&n={i}", str(tmp_path)) for i in range(6)]
+    deadline = time.monotonic() + 5
+    while len(pool.started) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert len(pool.started) == 2
+    pool.release.set()
+    pool.wait()
+    assert pool.peak == 2
+    assert all(job.status == FINISHED for job in jobs)
+    pool.shutdown()
+
+
+def test_interactive_jobs_overtake_queued_batch_work(tmp_path):
+    pool = RecordingEngine(1)
+    pool.submit("first", str(tmp_path), priority=BATCH)
+    while not pool.started:
+        time.sleep(0.01)
+    # Queued behind the running job
+    for url, priority in [("batch-1", BATCH), ("batch-2", BATCH), ("interactive", INTERACTIVE)]:
+        pool.submit(url, str(tmp_path), priority=priority)
+    pool.release.set()
+    pool.wait()
+    assert pool.started == ["first", "interactive", "batch-1", "batch-2"]
+    pool.shutdown()
+
+
+def test_batch_parallel_limits_its_jobs_in_the_shared_pool(tmp_path):
+    pool = RecordingEngine(3)
+    pool.release.set()
+    urls = [f"{URL}&n={i}" for i in range(5)]
+    batch = Batch(urls, str(tmp_path), parallel=1, engine=pool).start()
+    assert batch.wait(5)
+    assert pool.peak == 1
+    assert pool.started == urls
+    assert batch.completed == 5
+    pool.shutdown()
+
+
+class FakeYoutubeDL:
+    def __init__(self, info):
+        self.info = info
+        self.params = {}
+        self.calls = []
+
+    def extract_info(self, url, download=True, process=True):
+        self.calls.append(('extract', download, process))
+        return self.info
+
+    def process_ie_result(self, info, download=True):
+        self.calls.append(('process', info['_type'], download, self.params.get('ignoreerrors')))
+
+    def sanitize_info(self, info):
+        return info
+
+
+def test_playlist_entries_are_resolved_while_downloading(tmp_path):
+    pool = DownloadEngine(1)
+    job = engine.Job("https://www.youtube.com/playlist?list=PL123", str(tmp_path))
+    ydl = FakeYoutubeDL({'_type': 'playlist', 'entries': iter([])})
+    pool._download(ydl, job)
+    # No up-front extraction of every entry, and one broken entry does not end the playlist
+    assert ydl.calls == [('extract', False, False), ('process', 'playlist', True, True)]
+    assert ydl.params['ignoreerrors'] is None
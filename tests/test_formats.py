@@ -0,0 +1,74 @@
+from formats import select, make_selector, Choice, quality_height
+
+DURATION = 100
+
+
+def test_quality_height():
+    assert quality_height("720p") == 720
+    assert quality_height("1440p") == 1440
+    assert quality_height("Best") is None
+
+
+def test_height_cap(formats):
+    choice = select(formats, "Video", "360p", DURATION)
+    assert max(f.get('height') or 0 for f in choice.formats) == 360
+
+
+def test_mp4_merge_only_uses_codecs_mp4_holds(formats):
+    choice = select(formats, "Video", "Best", DURATION, container='mp4')
+    assert choice.format_id == "137+140"
+    merged = choice.as_ydl_format('mp4')
+    assert merged['ext'] == 'mp4'
+    assert [f['format_id'] for f in merged['requested_formats']] == ['137', '140']
+
+
+def test_without_container_the_cheapest_pair_wins(formats):
+    choice = select(formats, "Video", "Best", DURATION)
+    assert choice.formats[0]['format_id'] == '248'
+
+
+def test_pair_mp4_cannot_hold_merges_into_mkv(formats):
+    webm_only = [f for f in formats if f['ext'] == 'webm']
+    choice = select(webm_only, "Video", "Best", DURATION, container='mp4')
+    assert choice.format_id == "248+251"
+    assert choice.as_ydl_format('mp4')['ext'] == 'mkv'
+
+
+def test_selector_keeps_pinned_formats(formats):
+    selector = make_selector("Video", "Best", preferred="248+251", container='mp4')
+    (merged,) = selector({'formats': formats})
+    assert merged['format_id'] == "248+251"
+    assert merged['ext'] == 'mkv'
+
+
+def test_audio_picks_audio_only_stream(formats):
+    choice = select(formats, "Audio", "128kbps", DURATION)
+    assert len(choice.formats) == 1 and choice.formats[0]['vcodec'] == 'none'
+
+
+def test_expected_bytes(formats):
+    choice = Choice([formats[3], formats[5]], DURATION)
+    assert choice.expected_bytes == int((4000 + 130) * 1000 / 8 * DURATION)
+
+
+def direct(format_id, ext="mp4", height=None):
+    # Generic extractor: no codec information at all
+    return {'format_id': format_id, 'ext': ext, 'url': f"http://127.0.0.1/{format_id}.{ext}",
+            'protocol': 'http', 'height': height}
+
+
+def test_codecless_format_counts_as_muxed():
+    formats = [direct('0')]
+    for download_type, quality in [("Video", "Best"), ("Video", "720p"), ("Audio", "192kbps")]:
+        choice = select(formats, download_type, quality, container='mp4')
+        assert choice.format_id == '0'
+    (picked,) = make_selector("Video", "Best", container='mp4')({'formats': formats})
+    assert picked['format_id'] == '0'
+
+
+def test_falls_back_to_best_single_format(formats):
+    # Nothing under the cap and no audio stream: like yt-dlp's "best"
+    unknown = [direct('sd', height=480), direct('hd', height=1080)]
+    assert select(unknown, "Video", "360p").format_id == 'hd'
+    video_only = [f for f in formats if f['format_id'] == '137']
+    assert select(video_only, "Audio", "192kbps").format_id == '137'
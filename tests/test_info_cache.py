@@ -0,0 +1,14 @@
+from info_cache import video_id
+
+
+def test_video_id():
+    assert video_id("https://www.youtube.com/watch?v=abcdefghijk") == "abcdefghijk"
+    assert video_id("https://youtu.be/abcdefghijk?t=10") == "abcdefghijk"
+    assert video_id("https://www.youtube.com/shorts/abcdefghijk") == "abcdefghijk"
+
+
+def test_playlist_urls_are_not_keyed_by_their_video():
+    playlist = "https://www.youtube.com/watch?v=abcdefghijk&list=PL0123456789"
+    assert video_id(playlist) != "abcdefghijk"
+    assert video_id(playlist) == video_id(playlist)
+    assert video_id(playlist) != video_id("https://www.youtube.com/watch?v=abcdefghijk&list=PL9876543210")
@@ -0,0 +1,81 @@
+import os
+import time
+import yt_dlp
+from engine import build_ydl_opts, Job
+from journal import Journal, JournalRecorder
+
+
+def make_info(formats):
+    return {'id': 'x', 'title': 'x', 'extractor': 'test', 'extractor_key': 'Test',
+            'webpage_url': 'https://example.com/x', 'duration': 100,
+            'formats': formats}
+
+
+def test_merged_job_records_whole_selection(tmp_path, formats):
+    journal = Journal(str(tmp_path / "jobs.sqlite3"))
+    job = Job("https://example.com/x", str(tmp_path), "Video", "Best")
+    job.journal_id = journal.add(job)
+    opts = build_ydl_opts(str(tmp_path), "Video", "Best")
+    opts.update(quiet=True, skip_download=True)
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        ydl.add_post_processor(JournalRecorder(journal, job), when='before_dl')
+        ydl.process_ie_result(make_info(formats), download=True)
+    # Progress of one stream must not replace the selection
+    journal.progress(job.journal_id, {'status': 'finished', 'filename': str(tmp_path / "x.f137.mp4"),
+                                      'downloaded_bytes': 10, 'total_bytes': 10,
+                                      'info_dict': {'format_id': '137'}})
+    journal.close()
+    # As the next start sees it
+    journal = Journal(str(tmp_path / "jobs.sqlite3"))
+    (entry,) = journal.unfinished()
+    assert entry.format_id == "137+140"
+    assert entry.filename == os.path.join(str(tmp_path), "x.mp4")
+    assert entry.downloaded == 10
+    journal.close()
+
+
+def test_jobs_of_a_live_process_are_not_resumed_by_another(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first, second = Journal(path), Journal(path)
+    job = Job("https://example.com/x", str(tmp_path))
+    job.journal_id = first.add(job)
+    assert first.unfinished() == []
+    assert second.unfinished() == []
+
+    # Lease ran out (process hung or killed without cleanup)
+    first._closed.set()
+    second._execute("UPDATE owners SET heartbeat = 0 WHERE token = ?", (first.token,))
+    (entry,) = second.unfinished()
+    assert entry.id == job.journal_id
+
+    third = Journal(path)
+    (stale,) = third.unfinished()
+    # Both see it; only one may resume it
+    assert second.claim(entry)
+    assert not third.claim(stale)
+    assert third.unfinished() == []
+    for journal in (first, second, third):
+        journal.close()
+
+
+def test_closed_owner_releases_its_jobs_at_once(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first = Journal(path)
+    job = Job("https://example.com/x", str(tmp_path))
+    job.journal_id = first.add(job)
+    first.close()
+    second = Journal(path)
+    assert [entry.id for entry in second.unfinished()] == [job.journal_id]
+    second.close()
+
+
+def test_dead_pid_is_not_an_owner(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    journal = Journal(path)
+    journal._execute("INSERT INTO owners (token, pid, heartbeat) VALUES ('gone', 2147483646, ?)",
+                     (time.time(),))
+    job = Job("https://example.com/x", str(tmp_path))
+    job.journal_id = journal.add(job)
+    journal._execute("UPDATE jobs SET owner = 'gone' WHERE id = ?", (job.journal_id,))
+    assert [entry.owner for entry in journal.unfinished()] == ['gone']
+    journal.close()
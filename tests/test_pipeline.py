@@ -0,0 +1,60 @@
+import yt_dlp
+import pytest
+from yt_dlp.postprocessor import PostProcessor
+import pipeline
+from pipeline import StreamingMergeMixin
+
+
+class StreamingYoutubeDL(StreamingMergeMixin, yt_dlp.YoutubeDL):
+    streaming_merge = True
+
+    def _stream_merge(self, ffmpeg, info_dict, formats, final):
+        self.events.append('merge')
+        raise KeyboardInterrupt  # stop before yt-dlp's own download
+
+
+class Recorder(PostProcessor):
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+
+    def run(self, info):
+        self.events.append('before_dl')
+        return [], info
+
+
+class FakeFFmpeg:
+    available = True
+    executable = "ffmpeg"
+
+    def __init__(self, downloader):
+        pass
+
+
+def video():
+    formats = [{'format_id': '137', 'url': 'http://127.0.0.1/v', 'protocol': 'https', 'ext': 'mp4'},
+               {'format_id': '140', 'url': 'http://127.0.0.1/a', 'protocol': 'https', 'ext': 'm4a'}]
+    return {'id': 'abcdefghijk', 'title': 'T', 'ext': 'mp4', 'extractor': 'youtube', 'extractor_key': 'Youtube',
+            'webpage_url': 'https://www.youtube.com/watch?v=abcdefghijk', 'requested_formats': formats,
+            'format_id': '137+140'}
+
+
+def test_before_dl_postprocessors_run_before_streaming_merge(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "FFmpegPostProcessor", FakeFFmpeg)
+    monkeypatch.setattr(pipeline, "available", lambda: True)
+    ydl = StreamingYoutubeDL({'quiet': True, 'outtmpl': str(tmp_path / "%(title)s.%(ext)s")})
+    ydl.events = []
+    ydl.add_post_processor(Recorder(ydl.events), when='before_dl')
+    with pytest.raises(KeyboardInterrupt):
+        ydl.process_info(video())
+    assert ydl.events == ['before_dl', 'merge']
+
+
+def test_before_dl_postprocessors_run_once(tmp_path):
+    ydl = StreamingYoutubeDL({'quiet': True})
+    ydl.events = []
+    ydl.add_post_processor(Recorder(ydl.events), when='before_dl')
+    info, _ = ydl.pre_process(dict(video(), __before_dl_done=True), 'before_dl')
+    assert '__before_dl_done' not in info
+    ydl.pre_process(info, 'before_dl')
+    assert ydl.events == ['before_dl']
@@ -0,0 +1,56 @@
+import pytest
+from yt_dlp.utils import DownloadError, ExtractorError
+from resilience import (RetryPolicy, RetryStats, classify, THROTTLED, EXPIRED, NETWORK, EXTRACTOR, FATAL,
+                        POLICIES)
+
+
+def wrapped(error):
+    # What YoutubeDL raises: a DownloadError carrying the original in exc_info
+    return DownloadError(f"ERROR: {error}", exc_info=(type(error), error, None))
+
+
+class StatusError(Exception):
+    def __init__(self, status):
+        super().__init__(f"status {status}")
+        self.status = status
+
+
+@pytest.mark.parametrize("error, kind", [
+    (DownloadError("ERROR: unable to download video data: HTTP Error 429: Too Many Requests"), THROTTLED),
+    (wrapped(StatusError(429)), THROTTLED),
+    (DownloadError("ERROR: unable to download video data: HTTP Error 403: Forbidden"), EXPIRED),
+    (wrapped(StatusError(410)), EXPIRED),
+    (wrapped(StatusError(503)), NETWORK),
+    (wrapped(ConnectionResetError("reset by peer")), NETWORK),
+    (TimeoutError(), NETWORK),
+    (DownloadError("ERROR: [youtube] abcdefghijk: Private video. Sign in if you've been granted access"), FATAL),
+    (wrapped(ExtractorError("Video unavailable", expected=True)), FATAL),
+    (wrapped(ExtractorError("Unable to parse player response")), EXTRACTOR),
+    (ValueError("something else"), FATAL),
+])
+def test_classify(error, kind):
+    assert classify(error) == kind
+
+
+def test_retries_until_the_attempts_run_out():
+    stats = RetryStats()
+    policy = RetryPolicy({NETWORK: (3, 1.0, 4.0)}, stats)
+    error = ConnectionResetError()
+    delays = [policy.next_delay(error, attempt) for attempt in range(4)]
+    assert [kind for kind, _ in delays] == [NETWORK] * 4
+    assert all(0 <= delay <= min(4.0, 2 ** attempt) for attempt, (_, delay) in enumerate(delays[:3]))
+    assert delays[3][1] is None
+    assert stats.snapshot() == {NETWORK: {'errors': 4, 'retries': 3, 'gave_up': 1}}
+
+
+def test_fatal_errors_give_up_at_once():
+    stats = RetryStats()
+    policy = RetryPolicy(stats=stats)
+    assert policy.next_delay(DownloadError("ERROR: Private video"), 0) == (FATAL, None)
+    assert stats.snapshot() == {FATAL: {'errors': 1, 'gave_up': 1}}
+
+
+def test_overrides_keep_the_other_policies():
+    policy = RetryPolicy({THROTTLED: (1, 0, 0)})
+    assert policy.policies[THROTTLED] == (1, 0, 0)
+    assert policy.policies[EXPIRED] == POLICIES[EXPIRED]
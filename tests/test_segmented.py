@@ -0,0 +1,125 @@
+import os
+import re
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from segmented import segmented_download, SegmentedYoutubeDL, SEGMENTS_SUFFIX
+
+DATA = random.Random(7).randbytes(300 * 1024)
+MIN_SEGMENT = 16 * 1024
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    ranges = True
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(dict(self.headers))
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get('Range') or "")
+        if self.ranges and match:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(DATA) - 1
+            body = DATA[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{len(DATA)}")
+        else:
+            body = DATA
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(params=[True, False], ids=["ranges", "no-ranges"])
+def server(request):
+    handler = type("Handler", (Handler,), {'ranges': request.param, 'requests': []})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}/video.mp4", handler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def ydl():
+    # No proxy from the environment for the local server
+    with SegmentedYoutubeDL({'quiet': True, 'proxy': '', 'http_headers': {'X-Test': 'yes'}}) as ydl:
+        yield ydl
+
+
+def served(handler):
+    # Body bytes the server sent, from the requested ranges
+    total = 0
+    for headers in handler.requests:
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", headers.get('Range') or "")
+        if not handler.ranges or not match:
+            total += len(DATA)
+        else:
+            end = int(match.group(2)) if match.group(2) else len(DATA) - 1
+            total += end - int(match.group(1)) + 1
+    return total
+
+
+@pytest.mark.parametrize("connections", [1, 4])
+def test_download_is_byte_identical(server, ydl, tmp_path, connections):
+    url, handler = server
+    path = str(tmp_path / "video.mp4")
+    seen = []
+    total = segmented_download(ydl.urlopen, url, path, connections, progress=lambda d, t: seen.append(d),
+                               min_segment=MIN_SEGMENT)
+    with open(path, "rb") as f:
+        assert f.read() == DATA
+    assert total == len(DATA)
+    assert max(seen) == len(DATA)
+    assert not os.path.exists(path + ".part")
+    assert not os.path.exists(path + ".part" + SEGMENTS_SUFFIX)
+
+
+def test_resumes_streamed_part_file(server, ydl, tmp_path):
+    url, handler = server
+    path = str(tmp_path / "video.mp4")
+    with open(path + ".part", "wb") as f:
+        f.write(DATA[:100 * 1024])
+    segmented_download(ydl.urlopen, url, path, 1, min_segment=MIN_SEGMENT)
+    with open(path, "rb") as f:
+        assert f.read() == DATA
+    if handler.ranges:
+        assert handler.requests[-1]['Range'] == f"bytes={100 * 1024}-"
+
+
+def test_resumes_missing_segments(server, ydl, tmp_path):
+    url, handler = server
+    path = str(tmp_path / "video.mp4")
+    part = path + ".part"
+    # Preallocated file of an interrupted run with two finished ranges
+    with open(part, "wb") as f:
+        f.write(bytes(len(DATA)))
+        f.seek(0)
+        f.write(DATA[:64 * 1024])
+        f.seek(200 * 1024)
+        f.write(DATA[200 * 1024:250 * 1024])
+    with open(part + SEGMENTS_SUFFIX, "w") as f:
+        f.write(f"0 {64 * 1024 - 1}\n{200 * 1024} {250 * 1024 - 1}\n12")
+    segmented_download(ydl.urlopen, url, path, 4, min_segment=MIN_SEGMENT)
+    with open(path, "rb") as f:
+        assert f.read() == DATA
+    if handler.ranges:
+        # Probe byte plus the 186 KiB still missing
+        assert served(handler) == 1 + len(DATA) - 114 * 1024
+
+
+def test_dl_sends_ydl_headers(server, ydl, tmp_path):
+    url, handler = server
+    ydl.connections = 4
+    path = str(tmp_path / "video.mp4")
+    assert ydl.dl(path, {'url': url, 'protocol': 'http', 'http_headers': {'Referer': url}}) == (True, True)
+    with open(path, "rb") as f:
+        assert f.read() == DATA
+    for headers in handler.requests:
+        assert headers['X-Test'] == "yes"
+        assert headers['Referer'] == url
@@ -0,0 +1,44 @@
+import yt_dlp
+from sessions import SessionPool
+
+
+def make_selector():
+    # A new closure per job, like formats.make_selector
+    def selector(ctx):
+        yield from ()
+    return selector
+
+
+def make_opts(fmt, outtmpl="/tmp/%(title)s.%(ext)s"):
+    return {'quiet': True, 'format': fmt, 'outtmpl': outtmpl}
+
+
+def test_borrowed_session_uses_the_new_jobs_selector():
+    selector_a, selector_b = make_selector(), make_selector()
+    pool = SessionPool(max_idle=1)
+    with pool.session(make_opts(selector_a), yt_dlp.YoutubeDL) as first:
+        assert first.format_selector is selector_a
+    with pool.session(make_opts(selector_b, "/tmp/other/%(title)s.%(ext)s"), yt_dlp.YoutubeDL) as second:
+        assert second is first
+        assert second.format_selector is selector_b
+        assert second.params['outtmpl']['default'] == "/tmp/other/%(title)s.%(ext)s"
+    assert pool.created == 1 and pool.reused == 1
+    pool.close()
+
+
+def test_string_format_replaces_selector_on_shared_profile():
+    pool = SessionPool(max_idle=1)
+    with pool.session(make_opts("18"), yt_dlp.YoutubeDL) as first:
+        pass
+    with pool.session(make_opts("137+140"), yt_dlp.YoutubeDL) as second:
+        assert second is first
+        assert second.params['format'] == "137+140"
+        formats = [
+            {'format_id': '18', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'mp4a', 'url': 'http://x/18'},
+            {'format_id': '137', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'none', 'url': 'http://x/137'},
+            {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a', 'url': 'http://x/140'},
+        ]
+        ctx = {'formats': formats, 'incomplete_formats': False, 'has_merged_format': False}
+        chosen = list(second.format_selector(ctx))
+        assert [f['format_id'] for f in chosen] == ['137+140']
+    pool.close()
@@ -0,0 +1,93 @@
+import pytest
+import sync
+from sync import SyncStore
+
+CHANNEL = "https://www.youtube.com/@name"
+PLAYLIST = "https://www.youtube.com/playlist?list=PL0123456789"
+
+
+class Listing:
+    # Stands in for batch.iter_entries: tabs of video IDs, newest first,
+    # honouring send(True) and optionally failing before an entry
+    def __init__(self, *tabs, fail_at=None):
+        self.tabs = tabs
+        self.fail_at = fail_at
+        self.listed = []
+
+    def __call__(self, url, extra_opts=None):
+        for tab in self.tabs:
+            for vid in tab:
+                if vid == self.fail_at:
+                    raise OSError("connection reset")
+                self.listed.append(vid)
+                if (yield {'_type': 'url', 'id': vid, 'url': f"https://www.youtube.com/watch?v={vid}"}):
+                    break
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SyncStore(str(tmp_path / "sync.sqlite3"), known_streak=3)
+    store.register(CHANNEL, str(tmp_path))
+    store.register(PLAYLIST, str(tmp_path))
+    yield store
+    store.close()
+
+
+def refresh(store, monkeypatch, url, listing):
+    monkeypatch.setattr(sync, "iter_entries", listing)
+    return [u.rpartition("=")[2] for u in store.refresh(url)]
+
+
+def test_unchanged_channel_stops_at_the_marker(store, monkeypatch):
+    assert refresh(store, monkeypatch, CHANNEL, Listing(["e", "d", "c", "b", "a"])) == ["e", "d", "c", "b", "a"]
+    assert store.get(CHANNEL).marker == "e" and store.get(CHANNEL).complete
+    for vid in "edcba":
+        store.mark_done(CHANNEL, f"https://www.youtube.com/watch?v={vid}")
+
+    listing = Listing(["e", "d", "c", "b", "a"])
+    assert refresh(store, monkeypatch, CHANNEL, listing) == []
+    assert listing.listed == ["e"]
+
+    listing = Listing(["f", "e", "d", "c", "b", "a"])
+    assert refresh(store, monkeypatch, CHANNEL, listing) == ["f"]
+    assert listing.listed == ["f", "e"]
+    assert store.get(CHANNEL).marker == "f"
+
+
+def test_each_channel_tab_stops_on_its_own(store, monkeypatch):
+    refresh(store, monkeypatch, CHANNEL, Listing(["e", "d", "c"], ["s3", "s2", "s1"]))
+    listing = Listing(["e", "d", "c"], ["s4", "s3", "s2", "s1"])
+    assert refresh(store, monkeypatch, CHANNEL, listing) == ["e", "d", "c", "s3", "s2", "s1", "s4"]
+    assert listing.listed == ["e", "s4", "s3", "s2", "s1"]
+
+
+def test_deleted_marker_stops_at_a_run_of_known_entries(store, monkeypatch):
+    refresh(store, monkeypatch, CHANNEL, Listing(["f", "e", "d", "c", "b", "a"]))
+    # "f", the marker, was deleted from the channel
+    listing = Listing(["g", "e", "d", "c", "b", "a"])
+    assert refresh(store, monkeypatch, CHANNEL, listing)[-1] == "g"
+    assert listing.listed == ["g", "e", "d", "c"]
+    assert store.get(CHANNEL).marker == "g"
+
+
+def test_failed_listing_saves_no_marker_and_forces_a_full_relist(store, monkeypatch):
+    refresh(store, monkeypatch, CHANNEL, Listing(["c", "b", "a"]))
+    with pytest.raises(OSError):
+        refresh(store, monkeypatch, CHANNEL, Listing(["e", "d", "c", "b", "a"], fail_at="d"))
+    source = store.get(CHANNEL)
+    # The page that arrived is kept, the marker is not moved past the gap
+    assert (source.marker, source.complete) == ("c", False)
+
+    listing = Listing(["e", "d", "c", "b", "a"])
+    assert refresh(store, monkeypatch, CHANNEL, listing) == ["c", "b", "a", "e", "d"]
+    assert listing.listed == ["e", "d", "c", "b", "a"]
+    assert (store.get(CHANNEL).marker, store.get(CHANNEL).complete) == ("e", True)
+
+
+def test_playlists_are_always_listed_in_full(store, monkeypatch):
+    refresh(store, monkeypatch, PLAYLIST, Listing(["a", "b", "c", "d"]))
+    for vid in "abcd":
+        store.mark_done(PLAYLIST, f"https://www.youtube.com/watch?v={vid}")
+    listing = Listing(["a", "b", "c", "d", "e"])
+    assert refresh(store, monkeypatch, PLAYLIST, listing) == ["e"]
+    assert listing.listed == ["a", "b", "c", "d", "e"]
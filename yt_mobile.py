@@ -1,16 +1,21 @@
 import os
 os.environ["KIVY_GL_BACKEND"] = "angle_sdl2"
 
-import re
 import threading
-import yt_dlp
+import startup
+from progress import ProgressBus
 from kivy.clock import Clock
 from kivy.lang import Builder
 from kivymd.app import MDApp
-from kivymd.uix.filemanager import MDFileManager
 from kivy.metrics import dp, sp
 from kivy.core.window import Window
-from kivymd.uix.menu import MDDropdownMenu
+
+# Videos of a playlist probed to fill the quality menu
+PREVIEW_ENTRIES = 5
+
+# yt-dlp (via engine/batch), the file manager and the menus load after the
+# first frame or on first use; see startup.py
+startup.mark("imports")
 
 # KV UI
 KV = '''
@@ -23,11 +28,12 @@ BoxLayout:
     MDTextField:
         id: url_input
         hint_text: "Enter YouTube URL"
-        helper_text: "Paste the video or playlist link"
+        helper_text: "Paste a video or playlist link, or the path to a .txt file of links"
         helper_text_mode: "on_focus"
         size_hint_y: None
         height: dp(55)
         font_size: app.font_size
+        on_focus: app.url_focus_changed(self.focus)
 
     MDRaisedButton:
         text: "Choose Save Folder"
@@ -48,7 +54,7 @@ BoxLayout:
     MDDropDownItem:
         id: type_dropdown
         text: "Video"
-        on_release: app.menu_type.open()
+        on_release: app.open_type_menu()
 
     MDLabel:
         id: quality_label
@@ -58,7 +64,19 @@ BoxLayout:
     MDDropDownItem:
         id: quality_dropdown
         text: "Best"
-        on_release: app.menu_quality.open()
+        on_release: app.open_quality_menu()
+
+    BoxLayout:
+        size_hint_y: None
+        height: dp(40)
+        MDCheckbox:
+            id: sync_checkbox
+            size_hint_x: None
+            width: dp(40)
+        MDLabel:
+            text: "Only videos not synced before"
+            halign: "left"
+            font_size: app.font_size
 
     MDRaisedButton:
         text: "Download"
@@ -87,26 +105,39 @@ class YouTubeDownloaderApp(MDApp):
         self.theme_cls.primary_palette = "Green"
         self.save_path = os.getcwd()
         self.font_size = sp(16)
-        self.file_manager = MDFileManager(
-            exit_manager=self.file_manager_close,
-            select_path=self.select_path,
-            preview=False
-        )
+        # Built on first use
+        self.file_manager = None
+        self.menu_type = None
+        self.menu_quality = None
         self.screen = Builder.load_string(KV)
 
-        # Menus for type and quality
-        self.menu_type = MDDropdownMenu(
-            caller=self.screen.ids.type_dropdown,
-            items=[{"text": t, "on_release": lambda x=t: self.set_type(x)} for t in ["Video", "Audio"]],
-            width_mult=3,
-        )
+        # Replaced by the heights the entered video offers; see url_focus_changed
         self.video_qualities = ["360p", "720p", "1080p", "Best"]
-        self.audio_qualities = ["128kbps", "192kbps", "320kbps"]
+        self.previewed_url = None
+        self.audio_qualities = ["All", "128kbps", "192kbps", "320kbps"]
         self.update_quality_menu("Video")
 
+        # Progress is coalesced by the bus and redrawn at a fixed rate
+        self.progress_bus = ProgressBus()
+        self.batch = None
+        Clock.schedule_interval(self.refresh_progress, self.progress_bus.interval)
+        # schedule_once fires after the first frame has been drawn
+        Clock.schedule_once(self.first_frame)
+
         Window.bind(on_resize=self.adjust_layout)
         return self.screen
 
+    def first_frame(self, dt):
+        startup.mark("first frame")
+        startup.warm_up(callback=self.resume_unfinished)
+
+    # Runs on the warm-up thread once yt-dlp is loaded
+    def resume_unfinished(self):
+        from engine import get_engine
+        # Pick up downloads interrupted by a crash or by closing the app
+        if get_engine().resume_unfinished(on_progress=self.progress_bus.hook, on_done=self.resumed_done):
+            Clock.schedule_once(lambda dt: self.update_progress(0, "Resuming unfinished downloads..."))
+
     # ---------- Layout ----------
     def adjust_layout(self, *args):
         width, _ = Window.size
@@ -115,6 +146,13 @@ class YouTubeDownloaderApp(MDApp):
 
     # ---------- File Manager ----------
     def file_manager_open(self):
+        if self.file_manager is None:
+            from kivymd.uix.filemanager import MDFileManager
+            self.file_manager = MDFileManager(
+                exit_manager=self.file_manager_close,
+                select_path=self.select_path,
+                preview=False
+            )
         self.file_manager.show(os.getcwd())
     def file_manager_close(self, *args):
         self.file_manager.close()
@@ -124,6 +162,21 @@ class YouTubeDownloaderApp(MDApp):
         self.file_manager_close()
 
     # ---------- Menus ----------
+    def make_menu(self, caller, values, on_select):
+        from kivymd.uix.menu import MDDropdownMenu
+        return MDDropdownMenu(
+            caller=caller,
+            items=[{"text": v, "on_release": lambda x=v: on_select(x)} for v in values],
+            width_mult=3,
+        )
+    def open_type_menu(self):
+        if self.menu_type is None:
+            self.menu_type = self.make_menu(self.screen.ids.type_dropdown, ["Video", "Audio"], self.set_type)
+        self.menu_type.open()
+    def open_quality_menu(self):
+        if self.menu_quality is None:
+            self.menu_quality = self.make_menu(self.screen.ids.quality_dropdown, self.qualities, self.set_quality)
+        self.menu_quality.open()
     def set_type(self, value):
         self.screen.ids.type_dropdown.set_item(value)
         self.menu_type.dismiss()
@@ -138,76 +191,140 @@ class YouTubeDownloaderApp(MDApp):
         else:
             qualities = self.audio_qualities
             self.screen.ids.quality_label.text = "Audio Quality"
-        self.menu_quality = MDDropdownMenu(
-            caller=self.screen.ids.quality_dropdown,
-            items=[{"text": q, "on_release": lambda x=q: self.set_quality(x)} for q in qualities],
-            width_mult=3,
-        )
+        # Rebuilt for the new list the next time it is opened
+        self.qualities = qualities
+        self.menu_quality = None
         self.screen.ids.quality_dropdown.set_item(qualities[-1])
 
+    # ---------- Quality preview ----------
+    def url_focus_changed(self, focused):
+        url = self.screen.ids.url_input.text.strip()
+        if focused or not url or url == self.previewed_url:
+            return
+        self.previewed_url = url
+        self.update_progress(0, "Fetching available qualities...")
+        threading.Thread(target=self.prefetch, args=(url,), name="ytdl-preview", daemon=True).start()
+
+    def prefetch(self, url):
+        try:
+            from prefetch import Prefetcher
+        except ImportError as e:
+            Clock.schedule_once(lambda dt, err=str(e): self.update_progress(0, f"Error: {err}"))
+            return
+        previews = []
+        # Streamed: the menu grows as each playlist entry comes in
+        for preview in Prefetcher().run([url], max_entries=PREVIEW_ENTRIES):
+            previews.append(preview)
+            Clock.schedule_once(lambda dt, found=list(previews): self.show_qualities(url, found))
+
+    def show_qualities(self, url, previews):
+        from prefetch import quality_options
+        if url != self.screen.ids.url_input.text.strip():
+            return  # URL changed meanwhile
+        found = [p for p in previews if p.error is None]
+        if not found:
+            self.update_progress(0, f"Error: {previews[-1].error}")
+            return
+        self.video_qualities = quality_options(found)
+        if self.screen.ids.type_dropdown.text == "Video":
+            self.update_quality_menu("Video")
+        self.update_progress(0, found[0].title if len(found) == 1 else f"{len(found)} videos checked")
+
     # ---------- Progress ----------
     def update_progress(self, value, status):
         self.screen.ids.progress_bar.value = value
         self.screen.ids.status_label.text = status
-    def progress_hook(self, d):
-        if d['status'] == 'downloading':
-            total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-            downloaded = d.get('downloaded_bytes', 0)
-            percent = int(downloaded / total * 100) if total else 0
-            Clock.schedule_once(lambda dt: self.update_progress(percent, f"Downloading... {percent}%"))
-        elif d['status'] == 'finished':
-            Clock.schedule_once(lambda dt: self.update_progress(100, "Processing..."))
+    def refresh_progress(self, dt):
+        states = self.progress_bus.drain()
+        batch = self.batch
+        if batch is not None and batch.total > 1:
+            # Playlist / batch: overall progress plus the latest active entry
+            if states:
+                percent = int(batch.percent)
+                status = f"{batch.completed + batch.failed}/{batch.total} done | {percent}%"
+                current = states[-1]
+                if current.status == 'downloading':
+                    status += f" | current {int(current.percent)}%"
+                self.update_progress(percent, status)
+            return
+        for state in states:
+            if state.status == 'downloading':
+                percent = int(state.percent)
+                self.update_progress(percent, f"Downloading... {percent}%")
+            elif state.status == 'finished':
+                self.update_progress(100, "Processing...")
 
     # ---------- Download ----------
     def start_download_thread(self):
-        threading.Thread(target=self.start_download).start()
+        # Listing and downloading run on the batch/engine threads
+        self.start_download()
 
     def start_download(self):
         url = self.screen.ids.url_input.text.strip()
         if not url:
-            Clock.schedule_once(lambda dt: self.update_progress(0, "Please enter URL"))
+            self.update_progress(0, "Please enter URL")
             return
 
         download_type = self.screen.ids.type_dropdown.text
         quality = self.screen.ids.quality_dropdown.text
-        ffmpeg_path = os.path.join(os.getcwd(), "ffmpeg.exe")
-
-        if download_type == "Video":
-            format_code = {
-                "360p": "bv*[vcodec^=avc1][height<=360]+ba/best[height<=360]",
-                "720p": "bv*[vcodec^=avc1][height<=720]+ba/best[height<=720]",
-                "1080p": "bv*[vcodec^=avc1][height<=1080]+ba/best[height<=1080]",
-                "Best": "bv*[vcodec^=avc1]+ba/best"
-            }.get(quality, "bv*[vcodec^=avc1]+ba/best")
-
-            ydl_opts = {
-                'outtmpl': os.path.join(self.save_path, '%(title)s.%(ext)s'),
-                'format': format_code,
-                'merge_output_format': 'mp4',
-                'progress_hooks': [self.progress_hook],
-                'ffmpeg_location': ffmpeg_path
-            }
-        else:  # Audio
-            bitrate = quality.replace("kbps", "")
-            ydl_opts = {
-                'outtmpl': os.path.join(self.save_path, '%(title)s.%(ext)s'),
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': bitrate,
-                }],
-                'progress_hooks': [self.progress_hook],
-                'ffmpeg_location': ffmpeg_path
-            }
+        # Mirror mode: a playlist/channel pasted again only fetches its new entries
+        sync = self.screen.ids.sync_checkbox.active
+        if download_type == "Audio" and quality == "All":
+            # One download, every bitrate encoded from a single decode
+            quality = "+".join("mp3:" + q.replace("kbps", "") for q in self.audio_qualities if q != "All")
 
+        self.update_progress(0, "Starting download...")
+        # Importing batch waits for the warm-up if it is still running; keep that off the UI thread
+        threading.Thread(target=self.submit_batch, args=(url, download_type, quality, sync),
+                         name="ytdl-submit", daemon=True).start()
+
+    def submit_batch(self, url, download_type, quality, sync=False):
         try:
-            self.update_progress(0, "Starting download...")
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            Clock.schedule_once(lambda dt: self.update_progress(100, "Download completed!"))
-        except Exception as e:
+            from batch import Batch
+            from sync import get_sync_store
+        except ImportError as e:
             Clock.schedule_once(lambda dt, err=str(e): self.update_progress(0, f"Error: {err}"))
+            return
+        self.batch = Batch([url], self.save_path, download_type, quality,
+                           on_progress=self.progress_bus.hook,
+                           on_entry_done=self.entry_done,
+                           on_done=self.download_done,
+                           sync=get_sync_store() if sync else None).start()
+
+    # Called from engine worker threads
+    def entry_done(self, job):
+        self.progress_bus.forget(job.id)
+
+    def resumed_done(self, job):
+        from engine import FINISHED
+        self.progress_bus.forget(job.id)
+        if job.status == FINISHED:
+            Clock.schedule_once(lambda dt: self.update_progress(100, "Resumed download completed!"))
+        else:
+            Clock.schedule_once(lambda dt, err=str(job.error): self.update_progress(0, f"Error: {err}"))
+
+    def download_done(self, batch):
+        from engine import FINISHED, CANCELLED
+        from memory import peak_note
+        if batch.error is not None and not batch.jobs:
+            Clock.schedule_once(lambda dt, err=str(batch.error): self.update_progress(0, f"Error: {err}"))
+        elif batch.total > 1:
+            status = f"Completed {batch.completed}/{batch.total}"
+            if batch.failed:
+                status += f", {batch.failed} failed"
+            Clock.schedule_once(lambda dt: self.update_progress(100, status))
+        elif not batch.jobs:
+            Clock.schedule_once(lambda dt: self.update_progress(0, "Nothing to download."))
+        else:
+            job = batch.jobs[0]
+            if job.status == FINISHED:
+                # Low-memory mode (phones) also shows how much RAM the job needed
+                note = peak_note(job) if batch.low_memory else ""
+                Clock.schedule_once(lambda dt: self.update_progress(100, f"Download completed!{note}"))
+            elif job.status == CANCELLED:
+                Clock.schedule_once(lambda dt: self.update_progress(0, "Download cancelled."))
+            else:
+                Clock.schedule_once(lambda dt, err=str(job.error): self.update_progress(0, f"Error: {err}"))
 
 if __name__ == "__main__":
     YouTubeDownloaderApp().run()